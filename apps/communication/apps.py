@@ -0,0 +1,12 @@
+# apps/communication/apps.py
+from django.apps import AppConfig
+from django.utils.translation import gettext_lazy as _
+
+
+class CommunicationConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.communication'
+    verbose_name = _('Comunicação')
+    
+    def ready(self):
+        import apps.communication.signals  # noqa: F401
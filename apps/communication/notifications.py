@@ -0,0 +1,206 @@
+# apps/communication/notifications.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Validade dos contadores de não lidas no cache; incrementos e decrementos
+# mantêm o valor exato e reconcile_unread_counts corrige divergências
+UNREAD_COUNT_TIMEOUT = getattr(settings, 'UNREAD_COUNT_TIMEOUT', 60 * 60 * 24)
+
+UNREAD_COUNT_NAME = 'notifications:unread'
+
+
+def _counter_tenant(tenant=None):
+    """
+    Tenant dos contadores: o informado, o atual ou o do schema ativo
+    """
+    from apps.tenants.context import get_current_tenant
+    from apps.tenants.utils import tenant_from_connection
+    
+    return tenant or get_current_tenant() or tenant_from_connection()
+
+
+def unread_count_keys(tenant, user_ids):
+    """
+    {user_id: chave do contador} no namespace do tenant (vazio sem tenant
+    resolvido)
+    """
+    from apps.tenants.utils import tenant_cache_key
+    
+    tenant = _counter_tenant(tenant)
+    if tenant is None:
+        return {}
+    prefix = tenant_cache_key(tenant, UNREAD_COUNT_NAME)
+    return {user_id: f"{prefix}:{user_id}" for user_id in user_ids}
+
+
+def unread_count_key(tenant, user_id):
+    """
+    Chave do contador no namespace do tenant (None sem tenant resolvido)
+    """
+    return unread_count_keys(tenant, [user_id]).get(user_id)
+
+
+def _recount_version_key(key):
+    return f"{key}:recount"
+
+
+def get_unread_count(user, tenant=None):
+    """
+    Notificações não lidas do usuário, lidas do cache.
+    
+    Na falta do contador (primeiro acesso, expiração ou invalidação) a
+    contagem é feita uma vez no banco e publicada no cache. Variações que
+    chegam durante a contagem não encontram o contador e avançam a versão
+    de recontagem (_apply_delta): se ela mudou, a contagem pode não incluir
+    a variação e não é publicada (ou é descartada logo depois do add).
+    """
+    from apps.core.models import Notification
+    
+    user_id = getattr(user, 'id', user)
+    key = unread_count_key(tenant, user_id)
+    count = cache.get(key) if key else None
+    if count is not None:
+        return count
+    
+    version = cache.get(_recount_version_key(key)) if key else None
+    count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    if key and cache.get(_recount_version_key(key)) == version:
+        cache.add(key, count, UNREAD_COUNT_TIMEOUT)
+        if cache.get(_recount_version_key(key)) != version:
+            cache.delete(key)
+    return count
+
+
+def _apply_delta(key, delta):
+    try:
+        if cache.incr(key, delta) < 0:
+            cache.delete(key)
+    except ValueError:
+        # Sem contador no cache: a próxima leitura recalcula, e uma
+        # recontagem em andamento não publica um valor sem esta variação
+        version_key = _recount_version_key(key)
+        if not cache.add(version_key, 1, UNREAD_COUNT_TIMEOUT):
+            try:
+                cache.incr(version_key)
+            except ValueError:
+                cache.add(version_key, 1, UNREAD_COUNT_TIMEOUT)
+
+
+def adjust_unread_counts(deltas, tenant=None):
+    """
+    Aplica variações {user_id: delta} aos contadores após o commit
+    """
+    user_keys = unread_count_keys(tenant, [user_id for user_id, delta in deltas.items() if delta])
+    keys = {key: deltas[user_id] for user_id, key in user_keys.items()}
+    if not keys:
+        return
+    
+    def apply():
+        for key, delta in keys.items():
+            _apply_delta(key, delta)
+    
+    transaction.on_commit(apply)
+
+
+def invalidate_unread_counts(user_ids, tenant=None):
+    """
+    Descarta os contadores dos usuários após o commit (recálculo na próxima leitura)
+    """
+    keys = set(unread_count_keys(tenant, set(user_ids)).values())
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(list(keys)))
+
+
+# Destinatários expandidos por INSERT em lote
+FANOUT_CHUNK_SIZE = getattr(settings, 'NOTIFICATION_FANOUT_CHUNK_SIZE', 1000)
+
+
+def _recipient_queryset(recipients):
+    """
+    Aceita um queryset de usuários, um tipo de usuário ('parent') ou uma lista de tipos
+    """
+    from apps.users.models import User
+    
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    if not hasattr(recipients, 'values_list'):
+        recipients = User.objects.filter(user_type__in=list(recipients), is_active=True)
+    return recipients
+
+
+def notify(recipients, title, message, channels=('system',), type='info',
+           tenant=None, scheduled_for=None, chunk_size=None):
+    """
+    Cria a mesma notificação para muitos destinatários, em cada canal.
+    
+    Os destinatários são lidos do banco em blocos (só os ids) e as
+    notificações gravadas com bulk_create, um bloco por transação, junto com
+    os contadores de não lidas. Para envios imediatos, um único dispatch do
+    tenant é enfileirado depois do commit do último bloco. Notificações do
+    canal 'system' não têm envio externo e já são gravadas como enviadas.
+    
+    Retorna o número de notificações criadas.
+    """
+    from django.utils import timezone
+    from apps.communication.tasks import dispatch_notifications
+    from apps.core.models import Notification
+    from apps.tenants.context import get_current_tenant
+    
+    tenant = tenant or get_current_tenant()
+    if tenant is None:
+        raise ValueError('notify() requer um tenant (argumento ou contexto atual)')
+    
+    chunk_size = chunk_size or FANOUT_CHUNK_SIZE
+    channels = list(dict.fromkeys(channels))
+    deliver_now = scheduled_for is None or scheduled_for <= timezone.now()
+    needs_dispatch = deliver_now and any(channel != 'system' for channel in channels)
+    
+    recipient_ids = (
+        _recipient_queryset(recipients)
+        .order_by()
+        .values_list('pk', flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+    
+    created = 0
+    chunk = []
+    
+    def flush(chunk):
+        now = timezone.now()
+        objs = [
+            Notification(
+                tenant_id=tenant.id,
+                recipient_id=recipient_id,
+                title=title,
+                message=message,
+                type=type,
+                channel=channel,
+                scheduled_for=scheduled_for,
+                sent_at=now if channel == 'system' else None,
+            )
+            for recipient_id in chunk
+            for channel in channels
+        ]
+        with transaction.atomic():
+            Notification.objects.bulk_create(objs, batch_size=chunk_size)
+            adjust_unread_counts({recipient_id: len(channels) for recipient_id in chunk}, tenant=tenant)
+        return len(objs)
+    
+    for recipient_id in recipient_ids:
+        chunk.append(recipient_id)
+        if len(chunk) >= chunk_size:
+            created += flush(chunk)
+            chunk = []
+    if chunk:
+        created += flush(chunk)
+    
+    if needs_dispatch and created:
+        tenant_id = str(tenant.id)
+        transaction.on_commit(lambda: dispatch_notifications.delay(tenant_id=tenant_id))
+    
+    logger.info(f"Notification fan-out '{title}': {created} notifications on {channels}")
+    return created
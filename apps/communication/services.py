@@ -0,0 +1,119 @@
+# apps/communication/services.py
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.utils.module_loading import import_string
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationSender:
+    """
+    Envia um lote de notificações de um mesmo canal.
+    
+    send_batch recebe as notificações (com recipient carregado) e retorna os
+    ids das que foram entregues; as demais são tentadas de novo pelo
+    dispatcher até NOTIFICATION_MAX_ATTEMPTS.
+    """
+    channel = None
+    
+    def send_batch(self, notifications):
+        raise NotImplementedError
+
+
+class SystemNotificationSender(NotificationSender):
+    """
+    Notificações internas: ficam disponíveis no sistema, não há envio externo
+    """
+    channel = 'system'
+    
+    def send_batch(self, notifications):
+        return [notification.id for notification in notifications]
+
+
+class EmailNotificationSender(NotificationSender):
+    """
+    Envia o lote de e-mails pelas conexões persistentes do pool SMTP
+    """
+    channel = 'email'
+    
+    def send_batch(self, notifications):
+        from shared.services.email import send_messages
+        
+        deliverable = []
+        messages = []
+        for notification in notifications:
+            email = getattr(notification.recipient, 'email', None)
+            if not email:
+                logger.warning(f"Notification {notification.id} recipient has no email")
+                continue
+            deliverable.append(notification)
+            messages.append(EmailMessage(
+                subject=notification.title,
+                body=notification.message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email],
+            ))
+        
+        _, sent_indexes = send_messages(messages)
+        return [deliverable[index].id for index in sent_indexes]
+
+
+class SMSNotificationSender(NotificationSender):
+    """
+    Envia o lote de SMS pelo SMSSender assíncrono (limite por tenant).
+    
+    Notificações de tenants com sms_notifications desativado são
+    consideradas tratadas e não são enviadas.
+    """
+    channel = 'sms'
+    
+    def send_batch(self, notifications):
+        from apps.tenants.models import TenantSettings
+        from shared.services.sms import SMSMessage, SMSSender
+        
+        tenant_ids = {notification.tenant_id for notification in notifications}
+        enabled = set(
+            TenantSettings.objects.filter(tenant_id__in=tenant_ids, sms_notifications=True)
+            .values_list('tenant_id', flat=True)
+        )
+        
+        handled = []
+        messages = []
+        for notification in notifications:
+            if notification.tenant_id not in enabled:
+                logger.info(f"Notification {notification.id} skipped: SMS disabled for tenant")
+                handled.append(notification.id)
+                continue
+            phone = getattr(notification.recipient, 'phone', None)
+            if not phone:
+                logger.warning(f"Notification {notification.id} recipient has no phone")
+                continue
+            messages.append(SMSMessage(
+                notification.tenant_id, phone, notification.message, reference=notification.id
+            ))
+        
+        if messages:
+            results = SMSSender().send(messages)
+            handled.extend(result.message.reference for result in results if result.ok)
+        return handled
+
+
+DEFAULT_NOTIFICATION_SENDERS = {
+    'system': 'apps.communication.services.SystemNotificationSender',
+    'email': 'apps.communication.services.EmailNotificationSender',
+    'sms': 'apps.communication.services.SMSNotificationSender',
+}
+
+_senders = {}
+
+
+def get_notification_sender(channel):
+    """
+    Sender configurado para o canal (NOTIFICATION_SENDERS), ou None
+    """
+    if channel not in _senders:
+        paths = {**DEFAULT_NOTIFICATION_SENDERS, **getattr(settings, 'NOTIFICATION_SENDERS', {})}
+        path = paths.get(channel)
+        _senders[channel] = import_string(path)() if path else None
+    return _senders[channel]
@@ -0,0 +1,35 @@
+# apps/communication/signals.py
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from apps.communication.notifications import adjust_unread_counts
+from apps.core.models import Notification
+
+
+def _counts_as_unread(notification):
+    """Notificação ativa e não lida: entra no contador do destinatário"""
+    return notification.is_active and notification.deleted_at is None and not notification.is_read
+
+
+@receiver(post_init, sender=Notification)
+def remember_unread_state(sender, instance, **kwargs):
+    instance._counted_unread = _counts_as_unread(instance)
+
+
+@receiver(post_save, sender=Notification)
+def count_saved_notification(sender, instance, created, **kwargs):
+    """
+    Ajusta o contador de não lidas do destinatário: +1 na criação e a
+    diferença quando um save muda a situação (soft delete, restauração,
+    lida/não lida)
+    """
+    counted = _counts_as_unread(instance)
+    before = False if created else instance._counted_unread
+    if counted != before:
+        adjust_unread_counts({instance.recipient_id: 1 if counted else -1}, tenant=instance.tenant_id)
+    instance._counted_unread = counted
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if instance._counted_unread:
+        adjust_unread_counts({instance.recipient_id: -1}, tenant=instance.tenant_id)
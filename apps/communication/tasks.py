@@ -0,0 +1,213 @@
+# apps/communication/tasks.py
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from apps.communication.services import get_notification_sender
+from collections import defaultdict
+from datetime import timedelta
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Notificações reservadas por transação e tempo máximo de uma execução
+NOTIFICATION_DISPATCH_BATCH_SIZE = getattr(settings, 'NOTIFICATION_DISPATCH_BATCH_SIZE', 200)
+NOTIFICATION_DISPATCH_MAX_SECONDS = getattr(settings, 'NOTIFICATION_DISPATCH_MAX_SECONDS', 50)
+
+# Reserva de um lote (também o intervalo até a próxima tentativa de uma
+# notificação que falhou) e tentativas antes de desistir
+NOTIFICATION_CLAIM_SECONDS = getattr(settings, 'NOTIFICATION_CLAIM_SECONDS', 60 * 5)
+NOTIFICATION_MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+
+
+def claim_batch(tenant, batch_size):
+    """
+    Reserva um lote de notificações pendentes do tenant.
+    
+    As linhas são travadas com SELECT ... FOR UPDATE SKIP LOCKED só o
+    tempo de gravar a reserva (claimed_until) e contar a tentativa; o envio
+    acontece depois do commit, sem segurar locks nem a transação durante
+    chamadas a SMTP/SMS. Enquanto a reserva vale, pending_send não devolve
+    as linhas a outros workers; se o worker cair, elas voltam à fila quando
+    a reserva expira.
+    """
+    from apps.core.models import Notification
+    
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            Notification.objects.pending_send()
+            .filter(tenant_id=tenant.id)
+            .select_related('recipient')
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by(F('scheduled_for').asc(nulls_first=True), 'created_at')[:batch_size]
+        )
+        if batch:
+            Notification._base_manager.filter(pk__in=[notification.id for notification in batch]).update(
+                claimed_until=now + timedelta(seconds=NOTIFICATION_CLAIM_SECONDS),
+                send_attempts=F('send_attempts') + 1,
+            )
+    for notification in batch:
+        notification.send_attempts += 1
+    return batch
+
+
+def claim_and_send_batch(tenant, batch_size):
+    """
+    Reserva um lote de notificações do tenant e envia, agrupado por canal.
+    
+    As entregues recebem sent_at em um único UPDATE. As que falharam ficam
+    reservadas até claimed_until e são tentadas de novo depois; canais sem
+    sender e notificações que esgotaram NOTIFICATION_MAX_ATTEMPTS recebem
+    failed_at e saem da fila. Retorna (reservadas, enviadas, desistidas).
+    """
+    from apps.core.models import Notification
+    
+    batch = claim_batch(tenant, batch_size)
+    if not batch:
+        return 0, 0, 0
+    
+    by_channel = defaultdict(list)
+    for notification in batch:
+        by_channel[notification.channel].append(notification)
+    
+    sent_ids = []
+    undeliverable = set()
+    for channel, notifications in by_channel.items():
+        sender = get_notification_sender(channel)
+        if sender is None:
+            logger.warning(f"No sender configured for notification channel '{channel}'")
+            undeliverable.update(notification.id for notification in notifications)
+            continue
+        try:
+            sent_ids.extend(sender.send_batch(notifications))
+        except Exception as e:
+            logger.error(f"Error sending {len(notifications)} '{channel}' notifications: {str(e)}")
+    
+    now = timezone.now()
+    sent = set(sent_ids)
+    if sent:
+        Notification._base_manager.filter(pk__in=sent).update(sent_at=now, claimed_until=None)
+    
+    failed_ids = [
+        notification.id for notification in batch
+        if notification.id not in sent and (
+            notification.id in undeliverable
+            or notification.send_attempts >= NOTIFICATION_MAX_ATTEMPTS
+        )
+    ]
+    if failed_ids:
+        Notification._base_manager.filter(pk__in=failed_ids).update(failed_at=now, claimed_until=None)
+        logger.warning(f"{len(failed_ids)} notifications of tenant {tenant.id} gave up after failed sends")
+    
+    return len(batch), len(sent), len(failed_ids)
+
+
+# Cursor da varredura de todos os tenants (apps.tenants.utils)
+NOTIFICATION_DISPATCH_TASK = 'notification_dispatch'
+
+
+@shared_task
+def dispatch_notifications(tenant_id=None, batch_size=None, max_seconds=None):
+    """
+    Envia as notificações pendentes em lotes até esvaziar a fila.
+    
+    Com `tenant_id` (enfileirado por notify) envia só as do tenant; sem ele,
+    a varredura periódica percorre os tenants ativos no schema de cada um
+    (tenant_schema), começando depois do último tenant esvaziado na execução
+    anterior. Pode rodar em vários workers ao mesmo tempo: cada um reserva
+    lotes diferentes. Notificações que falharam só voltam à fila quando a
+    reserva expira.
+    """
+    from apps.tenants.utils import advance_tenant_cursor, serving_tenants, tenant_schema
+    
+    batch_size = batch_size or NOTIFICATION_DISPATCH_BATCH_SIZE
+    deadline = time.monotonic() + (max_seconds or NOTIFICATION_DISPATCH_MAX_SECONDS)
+    
+    if tenant_id is None:
+        tenants = serving_tenants(NOTIFICATION_DISPATCH_TASK)
+    else:
+        tenants = serving_tenants(tenant_id=tenant_id)
+    
+    claimed = sent = failed = 0
+    for tenant in tenants:
+        if time.monotonic() >= deadline:
+            break
+        with tenant_schema(tenant):
+            while time.monotonic() < deadline:
+                batch_claimed, batch_sent, batch_failed = claim_and_send_batch(tenant, batch_size)
+                if not batch_claimed:
+                    break
+                claimed += batch_claimed
+                sent += batch_sent
+                failed += batch_failed
+            else:
+                break
+        if tenant_id is None:
+            advance_tenant_cursor(NOTIFICATION_DISPATCH_TASK, tenant)
+    
+    if claimed:
+        logger.info(f"Notifications dispatched: {sent}/{claimed} sent, {failed} failed")
+    return {'claimed': claimed, 'sent': sent, 'failed': failed}
+
+
+
+def reconcile_unread_chunk(tenant, user_ids):
+    """
+    Descarta os contadores em cache dos usuários que divergem da contagem
+    no banco. Retorna quantos foram descartados.
+    """
+    from django.core.cache import cache
+    from django.db.models import Count
+    from apps.communication.notifications import unread_count_keys
+    from apps.core.models import Notification
+    
+    keys = unread_count_keys(tenant, user_ids)
+    cached = cache.get_many(list(keys.values()))
+    if not cached:
+        return 0
+    
+    counted = dict(
+        Notification.objects
+        .filter(recipient_id__in=[user_id for user_id, key in keys.items() if key in cached], is_read=False)
+        .order_by()
+        .values_list('recipient_id')
+        .annotate(unread=Count('pk'))
+    )
+    stale = [key for user_id, key in keys.items() if key in cached and cached[key] != counted.get(user_id, 0)]
+    if stale:
+        cache.delete_many(stale)
+    return len(stale)
+
+
+@shared_task
+def reconcile_unread_counts(chunk_size=1000):
+    """
+    Confere os contadores de não lidas em cache com o banco, tenant a
+    tenant, e descarta os divergentes (recontados na próxima leitura).
+    
+    Os contadores são mantidos por variações após o commit; uma variação
+    perdida (worker que caiu, cache indisponível) deixaria o valor errado
+    até expirar.
+    """
+    from apps.tenants.utils import serving_tenants, tenant_schema
+    from apps.users.models import User
+    
+    discarded = 0
+    for tenant in serving_tenants():
+        with tenant_schema(tenant):
+            user_ids = User.objects.order_by().values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+            chunk = []
+            for user_id in user_ids:
+                chunk.append(user_id)
+                if len(chunk) >= chunk_size:
+                    discarded += reconcile_unread_chunk(tenant, chunk)
+                    chunk = []
+            if chunk:
+                discarded += reconcile_unread_chunk(tenant, chunk)
+    
+    if discarded:
+        logger.warning(f"Discarded {discarded} stale unread notification counters")
+    return {'discarded': discarded}
@@ -0,0 +1,8 @@
+# apps/communication/urls.py
+from django.urls import path
+from .views import UnreadNotificationCountView
+
+urlpatterns = [
+    path('api/notifications/unread-count/', UnreadNotificationCountView.as_view(),
+         name='notification-unread-count'),
+]
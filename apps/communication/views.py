@@ -0,0 +1,19 @@
+# apps/communication/views.py
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .notifications import get_unread_count
+
+
+class UnreadNotificationCountView(APIView):
+    """
+    Contador de notificações não lidas para o badge do frontend.
+    
+    Lido do cache: o polling do badge não consulta a tabela de notificações.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        response = Response({'unread': get_unread_count(request.user)})
+        response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -0,0 +1,186 @@
+# apps/core/audit.py
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from celery.signals import worker_process_shutdown, worker_shutdown
+from collections import defaultdict
+import atexit
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Entradas que disparam um flush imediato
+AUDIT_LOG_FLUSH_SIZE = getattr(settings, 'AUDIT_LOG_FLUSH_SIZE', 200)
+
+# Intervalo máximo (segundos) entre flushes
+AUDIT_LOG_FLUSH_INTERVAL = getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL', 2.0)
+
+# Limite do buffer; acima dele as entradas são gravadas de forma síncrona
+AUDIT_LOG_BUFFER_SIZE = getattr(settings, 'AUDIT_LOG_BUFFER_SIZE', 10000)
+
+
+class AuditLogBuffer:
+    """
+    Buffer em processo para os registros de SystemLog.
+    
+    As entradas são enfileiradas na requisição e gravadas por uma thread de
+    fundo com INSERTs em lote, quando o buffer atinge `flush_size` ou a cada
+    `flush_interval` segundos. Com o buffer cheio a entrada é gravada
+    imediatamente, então nenhuma entrada é descartada por falta de espaço.
+    O buffer é esvaziado no encerramento do processo (atexit e shutdown dos
+    workers do Celery).
+    """
+    
+    def __init__(self, flush_size=None, flush_interval=None, max_size=None):
+        self.flush_size = flush_size or AUDIT_LOG_FLUSH_SIZE
+        self.flush_interval = flush_interval or AUDIT_LOG_FLUSH_INTERVAL
+        self.max_size = max_size or AUDIT_LOG_BUFFER_SIZE
+        self._reset()
+    
+    def _reset(self):
+        # Após um fork o processo filho recomeça com buffer, lock e thread próprios
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._entries = []
+        self._thread = None
+    
+    def add(self, entry):
+        """
+        Enfileira uma entrada (SystemLog não salvo).
+        
+        Retorna False quando o buffer está cheio e a entrada foi gravada de
+        forma síncrona.
+        """
+        if self._pid != os.getpid():
+            self._reset()
+        
+        schema_name = getattr(connection, 'schema_name', None)
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                full = True
+            else:
+                full = False
+                self._entries.append((schema_name, entry))
+                pending = len(self._entries)
+            self._ensure_thread()
+        
+        if full:
+            insert_log_entries([entry])
+            return False
+        
+        if pending >= self.flush_size:
+            self._wakeup.set()
+        return True
+    
+    def flush(self):
+        """
+        Grava todas as entradas pendentes; retorna quantas foram gravadas
+        """
+        if self._pid != os.getpid():
+            return 0
+        
+        with self._lock:
+            entries, self._entries = self._entries, []
+        if not entries:
+            return 0
+        
+        by_schema = defaultdict(list)
+        for schema_name, entry in entries:
+            by_schema[schema_name].append(entry)
+        
+        written = 0
+        for schema_name, schema_entries in by_schema.items():
+            written += self._write(schema_name, schema_entries)
+        return written
+    
+    def _write(self, schema_name, entries):
+        from apps.tenants.utils import schema_context
+        
+        # Flushes síncronos (atexit, buffer cheio) rodam na conexão de quem
+        # chamou: o schema dela é restaurado ao final
+        with schema_context(schema_name):
+            try:
+                with transaction.atomic():
+                    insert_log_entries(entries)
+                return len(entries)
+            except Exception as e:
+                logger.error(f"Audit log batch insert failed ({len(entries)} entries): {str(e)}")
+            
+            # Grava uma a uma para não perder o lote por causa de uma entrada inválida
+            written = 0
+            for entry in entries:
+                try:
+                    with transaction.atomic():
+                        insert_log_entries([entry])
+                    written += 1
+                except Exception as e:
+                    logger.error(f"Audit log entry lost ({entry.action}): {str(e)}")
+            return written
+    
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name='audit-log-writer', daemon=True
+            )
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Audit log flush failed: {str(e)}")
+            finally:
+                close_old_connections()
+
+
+audit_log_buffer = AuditLogBuffer()
+
+
+def insert_log_entries(entries):
+    """
+    INSERT das entradas preservando o created_at atribuído ao enfileirar.
+    
+    bulk_create passa por pre_save, onde auto_now_add trocaria o valor pelo
+    horário da gravação; os flags ficam desligados durante o INSERT
+    (preserve_timestamps), como na carga de backups.
+    """
+    from apps.core.models import SystemLog, preserve_timestamps
+    
+    with preserve_timestamps(SystemLog):
+        SystemLog._base_manager.bulk_create(entries)
+
+
+def enqueue_log(entry, sync=False):
+    """
+    Registra uma entrada de auditoria pelo buffer (ou direto, se desativado)
+    """
+    if not entry.created_at:
+        entry.created_at = entry.updated_at = timezone.now()
+    
+    if sync or not getattr(settings, 'AUDIT_LOG_ASYNC', True):
+        insert_log_entries([entry])
+        return entry
+    
+    audit_log_buffer.add(entry)
+    return entry
+
+
+def flush_audit_log(**kwargs):
+    """
+    Esvazia o buffer de auditoria (chamado no encerramento dos processos)
+    """
+    try:
+        audit_log_buffer.flush()
+    except Exception as e:
+        logger.error(f"Audit log flush at shutdown failed: {str(e)}")
+
+
+atexit.register(flush_audit_log)
+worker_process_shutdown.connect(flush_audit_log, weak=False)
+worker_shutdown.connect(flush_audit_log, weak=False)
@@ -0,0 +1,100 @@
+# apps/core/management/commands/index_report.py
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = 'Relatório de uso e inchaço dos índices de cada modelo'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help='Modelos (app_label.Model) a incluir')
+        parser.add_argument('--schema', help='Schema a inspecionar (padrão: o atual)')
+        parser.add_argument('--unused', action='store_true',
+                            help='Mostra apenas índices sem nenhuma leitura')
+    
+    def handle(self, *args, **options):
+        if options['schema'] and hasattr(connection, 'set_schema'):
+            connection.set_schema(options['schema'])
+        
+        if options['models']:
+            selected = [apps.get_model(label) for label in options['models']]
+        else:
+            selected = [model for model in apps.get_models() if model._meta.managed]
+        tables = {model._meta.db_table: model._meta.label for model in selected}
+        
+        has_pgstattuple = self._has_extension('pgstattuple')
+        
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT t.relname, t.n_live_tup, t.n_dead_tup,
+                       pg_total_relation_size(t.relid),
+                       i.indexrelname, i.idx_scan, i.idx_tup_read,
+                       pg_relation_size(i.indexrelid),
+                       pg_get_expr(x.indpred, x.indrelid) IS NOT NULL,
+                       i.indexrelid
+                FROM pg_stat_user_tables t
+                JOIN pg_stat_user_indexes i ON i.relid = t.relid
+                JOIN pg_index x ON x.indexrelid = i.indexrelid
+                WHERE t.schemaname = current_schema() AND t.relname = ANY(%s)
+                ORDER BY t.relname, i.indexrelname
+                """,
+                [list(tables)]
+            )
+            rows = cursor.fetchall()
+        
+        current = None
+        for (table, live, dead, table_size, index, scans, tuples_read,
+             index_size, partial, index_oid) in rows:
+            if options['unused'] and scans:
+                continue
+            
+            if table != current:
+                current = table
+                dead_ratio = dead / (live + dead) * 100 if live + dead else 0
+                self.stdout.write('')
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"{tables[table]} ({table}): {live} linhas ativas, "
+                    f"{dead} mortas ({dead_ratio:.1f}%), {self._size(table_size)}"
+                ))
+            
+            bloat = self._index_bloat(index_oid) if has_pgstattuple else None
+            line = (
+                f"  {index:<45} {'parcial' if partial else 'total':<8} "
+                f"{self._size(index_size):>10} leituras={scans:<10} tuplas={tuples_read:<12}"
+            )
+            if bloat is not None:
+                line += f" inchaço={bloat:.0f}%"
+            self.stdout.write(self.style.WARNING(line) if not scans else line)
+        
+        if not has_pgstattuple:
+            self.stdout.write('')
+            self.stdout.write('Instale a extensão pgstattuple para estimar o inchaço dos índices')
+    
+    def _has_extension(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = %s)', [name])
+            return cursor.fetchone()[0]
+    
+    def _index_bloat(self, index_oid):
+        """
+        Espaço livre estimado nas folhas do índice (btree), via pgstatindex
+        """
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT avg_leaf_density FROM pgstatindex(%s::regclass)', [index_oid])
+                density = cursor.fetchone()[0]
+        except Exception:
+            return None
+        if density is None or density != density:
+            return None
+        # Índices btree novos ficam ~90% cheios (fillfactor padrão)
+        return max(0, 90 - density)
+    
+    def _size(self, size):
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024:
+                return f"{size:.0f}{unit}"
+            size /= 1024
+        return f"{size:.1f}TB"
@@ -0,0 +1,19 @@
+# apps/core/management/commands/partition_system_log.py
+from django.core.management.base import BaseCommand
+from apps.core.models import SystemLog
+from apps.core.partitions import convert_to_partitioned, is_partitioned
+from shared.tasks.cleanup_tasks import SYSTEM_LOG_PARTITIONS_AHEAD
+
+
+class Command(BaseCommand):
+    help = 'Converte a tabela de SystemLog em partições mensais por created_at'
+    
+    def handle(self, *args, **options):
+        table = SystemLog._meta.db_table
+        if is_partitioned(table):
+            self.stdout.write(f'{table} já é particionada')
+            return
+        
+        self.stdout.write(f'Convertendo {table} (a tabela fica bloqueada durante a cópia)...')
+        convert_to_partitioned(table, 'created_at', months_ahead=SYSTEM_LOG_PARTITIONS_AHEAD)
+        self.stdout.write(self.style.SUCCESS(f'{table} convertida em partições mensais'))
@@ -1,6 +1,8 @@
 # apps/core/managers.py
 from django.db import models
 from django.utils import timezone
+from apps.tenants.context import get_current_tenant
+from collections import defaultdict
 
 
 class SoftDeleteManager(models.Manager):
@@ -22,30 +24,38 @@ class SoftDeleteManager(models.Manager):
 class TenantAwareManager(SoftDeleteManager):
     """
     Manager que adiciona isolamento por tenant
-    """
-    def __init__(self, *args, **kwargs):
-        self._tenant = None
-        super().__init__(*args, **kwargs)
     
-    def set_tenant(self, tenant):
-        """Define o tenant atual para filtros automáticos"""
-        self._tenant = tenant
-        return self
+    O tenant vem do ContextVar definido pelo TenantMiddleware (ou por
+    tenant_scope), lido a cada queryset; o manager não guarda estado, então
+    é seguro com views assíncronas concorrentes e trabalho em outras threads.
+    """
+    def _scope(self, qs):
+        tenant = get_current_tenant()
+        if tenant is not None:
+            qs = qs.filter(tenant_id=tenant.id)
+        return qs
     
     def get_queryset(self):
-        qs = super().get_queryset()
-        if self._tenant:
-            qs = qs.filter(tenant=self._tenant)
-        return qs
+        return self._scope(super().get_queryset())
+    
+    def with_deleted(self):
+        """Retorna todos os registros do tenant atual, incluindo os deletados"""
+        return self._scope(super().with_deleted())
+    
+    def deleted_only(self):
+        """Retorna apenas os registros deletados do tenant atual"""
+        return self._scope(super().deleted_only())
     
     def for_tenant(self, tenant):
         """Filtra explicitamente por tenant"""
-        return self.get_queryset().filter(tenant=tenant)
+        # tenant_id aceita tanto o modelo Tenant quanto um TenantSnapshot
+        return super().get_queryset().filter(tenant_id=tenant.id)
     
     def create(self, **kwargs):
         """Override para adicionar tenant automaticamente"""
-        if self._tenant and 'tenant' not in kwargs:
-            kwargs['tenant'] = self._tenant
+        tenant = get_current_tenant()
+        if tenant is not None and 'tenant' not in kwargs and 'tenant_id' not in kwargs:
+            kwargs['tenant_id'] = tenant.id
         return super().create(**kwargs)
 
 
@@ -63,25 +73,38 @@ class NotificationManager(TenantAwareManager):
         return self.get_queryset().filter(recipient=user)
     
     def pending_send(self):
-        """Notificações pendentes de envio"""
+        """
+        Notificações pendentes de envio (sem agendamento ou já vencidas),
+        fora de reserva de outro worker e sem desistência registrada
+        """
+        now = timezone.now()
         return self.get_queryset().filter(
+            models.Q(scheduled_for__isnull=True) | models.Q(scheduled_for__lte=now),
+            models.Q(claimed_until__isnull=True) | models.Q(claimed_until__lte=now),
             sent_at__isnull=True,
-            scheduled_for__lte=timezone.now()
+            failed_at__isnull=True,
         )
     
     def by_channel(self, channel):
         return self.get_queryset().filter(channel=channel)
     
     def mark_as_read(self, user=None):
-        """Marca notificações como lidas"""
-        qs = self.get_queryset()
+        """Marca notificações como lidas, mantendo os contadores de não lidas"""
+        from apps.communication.notifications import adjust_unread_counts, invalidate_unread_counts
+        
+        qs = self.get_queryset().filter(is_read=False)
         if user:
-            qs = qs.filter(recipient=user)
+            updated = qs.filter(recipient=user).update(is_read=True, read_at=timezone.now())
+            adjust_unread_counts({user.id: -updated})
+            return updated
         
-        return qs.filter(is_read=False).update(
-            is_read=True,
-            read_at=timezone.now()
-        )
+        recipients = defaultdict(list)
+        for tenant_id, recipient_id in qs.values_list('tenant_id', 'recipient_id').distinct():
+            recipients[tenant_id].append(recipient_id)
+        updated = qs.update(is_read=True, read_at=timezone.now())
+        for tenant_id, user_ids in recipients.items():
+            invalidate_unread_counts(user_ids, tenant=tenant_id)
+        return updated
 
 
 class SystemLogManager(SoftDeleteManager):
@@ -100,8 +123,12 @@ class SystemLogManager(SoftDeleteManager):
     def by_action(self, action):
         return self.get_queryset().filter(action=action)
     
-    def errors(self):
-        return self.get_queryset().filter(level__in=['error', 'critical'])
+    def errors(self, days=None):
+        """Logs de erro; com `days` a consulta fica restrita às partições recentes"""
+        qs = self.get_queryset().filter(level__in=['error', 'critical'])
+        if days is not None:
+            qs = qs.filter(created_at__gte=timezone.now() - timezone.timedelta(days=days))
+        return qs
     
     def recent(self, days=7):
         """Logs recentes"""
@@ -109,18 +136,27 @@ class SystemLogManager(SoftDeleteManager):
         return self.get_queryset().filter(created_at__gte=since)
     
     def create_log(self, level, action, description, tenant=None, user=None, 
-                   ip_address=None, user_agent=None, extra_data=None):
-        """Cria um log do sistema"""
-        return self.create(
+                   ip_address=None, user_agent=None, extra_data=None, sync=False):
+        """
+        Registra um log do sistema.
+        
+        A entrada vai para o buffer de auditoria e é gravada em lote fora da
+        requisição; use sync=True quando o registro precisa existir no banco
+        ao retornar.
+        """
+        from apps.core.audit import enqueue_log
+        
+        entry = self.model(
             level=level,
             action=action,
             description=description,
-            tenant=tenant,
-            user=user,
+            tenant_id=getattr(tenant, 'id', tenant),
+            user_id=getattr(user, 'id', user),
             ip_address=ip_address,
-            user_agent=user_agent,
+            user_agent=user_agent or '',
             extra_data=extra_data or {}
         )
+        return enqueue_log(entry, sync=sync)
 
 
 class ConfigurationManager(TenantAwareManager):
@@ -129,6 +165,12 @@ class ConfigurationManager(TenantAwareManager):
     """
     def get_value(self, key, default=None):
         """Obtém o valor de uma configuração"""
+        tenant = get_current_tenant()
+        if tenant is not None:
+            # Lido do bundle de configurações do tenant (uma ida ao cache por requisição)
+            from apps.tenants.utils import load_tenant_settings_bundle
+            return load_tenant_settings_bundle(tenant).values.get(key, default)
+        
         try:
             config = self.get_queryset().get(key=key)
             return config.value
@@ -150,6 +192,12 @@ class ConfigurationManager(TenantAwareManager):
     def get_json_value(self, key, default=None):
         """Obtém valor JSON de uma configuração"""
         import json
+        tenant = get_current_tenant()
+        if tenant is not None:
+            # JSON já convertido no carregamento do bundle
+            from apps.tenants.utils import load_tenant_settings_bundle
+            return load_tenant_settings_bundle(tenant).get_json(key, default)
+        
         value = self.get_value(key)
         if value is None:
             return default
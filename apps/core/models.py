@@ -1,8 +1,14 @@
 # apps/core/models.py
 from django.db import models
+from django.db.models.signals import class_prepared
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import RegexValidator
+from apps.core.managers import NotificationManager, SystemLogManager
+from shared.services.storage import TenantUploadTo, tenant_file_storage
+from contextlib import contextmanager
+import threading
 import uuid
 
 
@@ -17,6 +23,43 @@ class TimestampedModel(models.Model):
         abstract = True
 
 
+# Campos com auto_now/auto_now_add desligados: [usos, auto_now, auto_now_add]
+_timestamp_overrides = {}
+_timestamp_lock = threading.Lock()
+
+
+@contextmanager
+def preserve_timestamps(model):
+    """
+    Desliga auto_now/auto_now_add dos campos do modelo durante o bloco, para
+    gravar as datas já atribuídas (carga de backups, buffer de auditoria).
+    
+    Os campos são compartilhados pelo processo: usos simultâneos são
+    contados e o último a sair religa os flags originais.
+    """
+    with _timestamp_lock:
+        fields = [
+            field for field in model._meta.concrete_fields
+            if field in _timestamp_overrides
+            or getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        ]
+        for field in fields:
+            if field not in _timestamp_overrides:
+                _timestamp_overrides[field] = [0, field.auto_now, field.auto_now_add]
+                field.auto_now = field.auto_now_add = False
+            _timestamp_overrides[field][0] += 1
+    try:
+        yield
+    finally:
+        with _timestamp_lock:
+            for field in fields:
+                override = _timestamp_overrides[field]
+                override[0] -= 1
+                if not override[0]:
+                    field.auto_now, field.auto_now_add = override[1], override[2]
+                    del _timestamp_overrides[field]
+
+
 class UUIDModel(models.Model):
     """
     Modelo abstrato que adiciona UUID como chave primária
@@ -38,10 +81,29 @@ class SoftDeleteModel(models.Model):
         abstract = True
 
 
+# Linhas visíveis pelos managers padrão (SoftDeleteManager/TenantAwareManager)
+LIVE_ROWS = models.Q(is_active=True, deleted_at__isnull=True)
+
+
+class LiveRowsIndex(models.Index):
+    """
+    Índice parcial restrito às linhas ativas (não excluídas)
+    """
+    suffix = 'lv'
+    
+    def __init__(self, *, fields, name=None, **kwargs):
+        kwargs.setdefault('condition', LIVE_ROWS)
+        # O nome definitivo é gerado por set_name_with_model
+        super().__init__(fields=fields, name=name or 'live_rows_idx', **kwargs)
+
+
 class BaseModel(UUIDModel, TimestampedModel, SoftDeleteModel):
     """
     Modelo base que combina UUID, timestamps e soft delete
     """
+    # Caminhos de acesso dos querysets padrão, indexados só sobre linhas ativas
+    live_index_fields = (('-created_at',),)
+    
     class Meta:
         abstract = True
 
@@ -57,6 +119,8 @@ class TenantAwareModel(BaseModel):
         db_index=True
     )
     
+    live_index_fields = (('tenant', '-created_at'),)
+    
     class Meta:
         abstract = True
         indexes = [
@@ -65,6 +129,32 @@ class TenantAwareModel(BaseModel):
         ]
 
 
+@receiver(class_prepared)
+def add_live_rows_indexes(sender, **kwargs):
+    """
+    Adiciona os índices parciais de linhas ativas aos modelos concretos.
+    
+    Feito aqui porque os Meta.indexes da base abstrata não são herdados por
+    modelos que declaram o próprio Meta. Campos herdados de outra tabela
+    (herança multi-tabela) não podem ser indexados e são ignorados.
+    """
+    if not issubclass(sender, BaseModel) or sender._meta.abstract or sender._meta.proxy:
+        return
+    
+    local_fields = {field.name for field in sender._meta.local_fields}
+    if not {'is_active', 'deleted_at'} <= local_fields:
+        return
+    
+    existing = {index.name for index in sender._meta.indexes}
+    for fields in sender.live_index_fields:
+        if not {name.lstrip('-') for name in fields} <= local_fields:
+            continue
+        index = LiveRowsIndex(fields=list(fields))
+        index.set_name_with_model(sender)
+        if index.name not in existing:
+            sender._meta.indexes.append(index)
+
+
 class Address(BaseModel):
     """
     Modelo para endereços reutilizável
@@ -154,7 +244,11 @@ class FileUpload(BaseModel):
     """
     Modelo base para uploads de arquivos
     """
-    file = models.FileField(_('Arquivo'), upload_to='uploads/%Y/%m/%d/')
+    file = models.FileField(
+        _('Arquivo'),
+        upload_to=TenantUploadTo('uploads/%Y/%m/%d/'),
+        storage=tenant_file_storage
+    )
     original_name = models.CharField(_('Nome Original'), max_length=255)
     file_size = models.PositiveIntegerField(_('Tamanho do Arquivo'))
     content_type = models.CharField(_('Tipo de Conteúdo'), max_length=100)
@@ -199,6 +293,12 @@ class Notification(TenantAwareModel):
     read_at = models.DateTimeField(_('Lida em'), null=True, blank=True)
     scheduled_for = models.DateTimeField(_('Agendada para'), null=True, blank=True)
     sent_at = models.DateTimeField(_('Enviada em'), null=True, blank=True)
+    # Controle do dispatcher: reserva em andamento, tentativas e desistência
+    claimed_until = models.DateTimeField(_('Reservada até'), null=True, blank=True)
+    send_attempts = models.PositiveSmallIntegerField(_('Tentativas de Envio'), default=0)
+    failed_at = models.DateTimeField(_('Falhou em'), null=True, blank=True)
+    
+    objects = NotificationManager()
     
     class Meta:
         verbose_name = _('Notificação')
@@ -207,15 +307,43 @@ class Notification(TenantAwareModel):
         indexes = [
             models.Index(fields=['recipient', 'is_read']),
             models.Index(fields=['tenant', 'scheduled_for']),
+            # Fila do dispatcher: apenas notificações ainda não enviadas
+            models.Index(
+                fields=['scheduled_for', 'created_at'],
+                name='notification_pending_idx',
+                condition=models.Q(sent_at__isnull=True, failed_at__isnull=True) & LIVE_ROWS
+            ),
         ]
     
     def __str__(self):
         return f"{self.title} - {self.recipient}"
+    
+    def mark_as_read(self):
+        """
+        Marca a notificação como lida (uma única vez) e atualiza o contador
+        """
+        from django.utils import timezone
+        from apps.communication.notifications import adjust_unread_counts
+        
+        read_at = timezone.now()
+        updated = Notification._base_manager.filter(pk=self.pk, is_read=False).update(
+            is_read=True, read_at=read_at
+        )
+        if updated:
+            self.is_read, self.read_at = True, read_at
+            # O decremento já foi feito: um save posterior não conta de novo
+            self._counted_unread = False
+            adjust_unread_counts({self.recipient_id: -1}, tenant=self.tenant_id)
+        return bool(updated)
 
 
 class SystemLog(BaseModel):
     """
-    Logs do sistema para auditoria
+    Logs do sistema para auditoria.
+    
+    A tabela é particionada por mês em created_at (comando
+    partition_system_log); filtre por created_at para consultar só as
+    partições recentes.
     """
     LOG_LEVELS = [
         ('debug', _('Debug')),
@@ -246,6 +374,8 @@ class SystemLog(BaseModel):
     user_agent = models.TextField(_('User Agent'), blank=True)
     extra_data = models.JSONField(_('Dados Extras'), default=dict, blank=True)
     
+    objects = SystemLogManager()
+    
     class Meta:
         verbose_name = _('Log do Sistema')
         verbose_name_plural = _('Logs do Sistema')
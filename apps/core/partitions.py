@@ -0,0 +1,210 @@
+# apps/core/partitions.py
+from django.db import connection, transaction
+from django.utils import timezone
+from datetime import date
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+PARTITION_SUFFIX = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+def month_start(value, offset=0):
+    """
+    Primeiro dia do mês de `value`, deslocado em `offset` meses
+    """
+    month = value.year * 12 + value.month - 1 + offset
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def is_partitioned(table):
+    """
+    Verifica se a tabela já é particionada (no schema atual)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT EXISTS(
+                SELECT 1 FROM pg_partitioned_table pt
+                JOIN pg_class c ON c.oid = pt.partrelid
+                WHERE c.oid = to_regclass(%s)
+            )
+            """,
+            [table]
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions(table):
+    """
+    Partições mensais da tabela, como {primeiro dia do mês: nome}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            """,
+            [table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    
+    partitions = {}
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def create_partition(table, column, month):
+    """
+    Cria a partição do mês, movendo para ela linhas que estejam na partição default.
+    
+    A partição é criada fora da tabela, recebe as linhas do intervalo e só
+    então é anexada, então a operação funciona mesmo com a partição default
+    já contendo dados do mês.
+    """
+    qn = connection.ops.quote_name
+    name = partition_name(table, month)
+    start, end = month, month_start(month, 1)
+    
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [table + '_default'])
+        default_exists = cursor.fetchone()[0]
+        cursor.execute(
+            f'CREATE TABLE {qn(name)} '
+            f'(LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+        if default_exists:
+            cursor.execute(
+                f'WITH moved AS ('
+                f'DELETE FROM {qn(table + "_default")} '
+                f'WHERE {qn(column)} >= %s AND {qn(column)} < %s RETURNING *'
+                f') INSERT INTO {qn(name)} SELECT * FROM moved',
+                [start, end]
+            )
+        cursor.execute(
+            f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [start, end]
+        )
+    
+    logger.info(f"Partition {name} created")
+    return name
+
+
+def ensure_partitions(table, column, months_ahead=3, today=None):
+    """
+    Garante as partições do mês atual e dos próximos `months_ahead` meses
+    """
+    today = today or timezone.now().date()
+    existing = list_partitions(table)
+    
+    created = []
+    for offset in range(months_ahead + 1):
+        month = month_start(today, offset)
+        if month not in existing:
+            created.append(create_partition(table, column, month))
+    return created
+
+
+def drop_expired_partitions(table, retention_months, today=None):
+    """
+    Remove as partições inteiramente anteriores à janela de retenção.
+    
+    Cada partição é desanexada e removida com DROP TABLE: a limpeza é uma
+    operação de catálogo, sem DELETE linha a linha nem inchaço da tabela.
+    """
+    qn = connection.ops.quote_name
+    cutoff = month_start(today or timezone.now().date(), -retention_months)
+    
+    dropped = []
+    for month, name in sorted(list_partitions(table).items()):
+        if month >= cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}')
+            cursor.execute(f'DROP TABLE {qn(name)}')
+        dropped.append(name)
+        logger.info(f"Partition {name} dropped (retention {retention_months} months)")
+    return dropped
+
+
+def convert_to_partitioned(table, column, pk_column='id', months_ahead=3):
+    """
+    Converte uma tabela comum em tabela particionada por mês em `column`.
+    
+    A tabela original é renomeada, a nova tabela particionada recebe as
+    colunas e defaults, uma partição por mês existente nos dados (mais a
+    partição default), os dados copiados e, por fim, os índices e chaves
+    estrangeiras da original. A chave primária passa a incluir `column`,
+    como exigido pelo Postgres. Tudo roda em uma única transação.
+    """
+    qn = connection.ops.quote_name
+    legacy = f"{table}_legacy"
+    
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(
+            """
+            SELECT indexdef FROM pg_indexes
+            WHERE tablename = %s AND schemaname = current_schema()
+              AND indexname NOT IN (
+                  SELECT conname FROM pg_constraint
+                  WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u')
+              )
+            """,
+            [table, table]
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = to_regclass(%s) AND contype = 'f'
+            """,
+            [table]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            f'SELECT MIN({qn(column)}), MAX({qn(column)}) FROM {qn(table)}'
+        )
+        first, last = cursor.fetchone()
+        
+        cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}')
+        cursor.execute(
+            f'CREATE TABLE {qn(table)} '
+            f'(LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({qn(column)})'
+        )
+        cursor.execute(f'CREATE TABLE {qn(table + "_default")} PARTITION OF {qn(table)} DEFAULT')
+        
+        today = timezone.now().date()
+        month = month_start(first or today)
+        last_month = month_start(max(last.date() if last else today, today), months_ahead)
+        while month <= last_month:
+            cursor.execute(
+                f'CREATE TABLE {qn(partition_name(table, month))} PARTITION OF {qn(table)} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [month, month_start(month, 1)]
+            )
+            month = month_start(month, 1)
+        
+        cursor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}')
+        cursor.execute(f'DROP TABLE {qn(legacy)}')
+        
+        cursor.execute(f'ALTER TABLE {qn(table)} ADD PRIMARY KEY ({qn(pk_column)}, {qn(column)})')
+        for definition in indexes:
+            cursor.execute(re.sub(r' ON (\S+\.)?\S+ USING ', f' ON {qn(table)} USING ', definition, count=1))
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}')
+    
+    logger.info(f"Table {table} converted to monthly partitions on {column}")
@@ -2,6 +2,7 @@
 from django.db import models
 from django.core.validators import RegexValidator
 from apps.users.models import User
+from shared.services.storage import TenantUploadTo, tenant_file_storage
 
 
 class Patient(models.Model):
@@ -99,7 +100,13 @@ class Patient(models.Model):
     )
     
     # Arquivos
-    photo = models.ImageField(upload_to='patients/photos/', blank=True, null=True, verbose_name='Foto')
+    photo = models.ImageField(
+        upload_to=TenantUploadTo('patients/photos/'),
+        storage=tenant_file_storage,
+        blank=True,
+        null=True,
+        verbose_name='Foto'
+    )
     
     # Datas
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
@@ -148,7 +155,11 @@ class PatientDocument(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='documents')
     title = models.CharField(max_length=200, verbose_name='Título')
     document_type = models.CharField(max_length=30, choices=DOCUMENT_TYPE_CHOICES, verbose_name='Tipo de Documento')
-    file = models.FileField(upload_to='patients/documents/', verbose_name='Arquivo')
+    file = models.FileField(
+        upload_to=TenantUploadTo('patients/documents/'),
+        storage=tenant_file_storage,
+        verbose_name='Arquivo'
+    )
     description = models.TextField(blank=True, null=True, verbose_name='Descrição')
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Enviado por')
     is_confidential = models.BooleanField(default=False, verbose_name='Confidencial')
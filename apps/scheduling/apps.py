@@ -0,0 +1,12 @@
+# apps/scheduling/apps.py
+from django.apps import AppConfig
+from django.utils.translation import gettext_lazy as _
+
+
+class SchedulingConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.scheduling'
+    verbose_name = _('Agendamentos')
+    
+    def ready(self):
+        import apps.scheduling.signals  # noqa: F401
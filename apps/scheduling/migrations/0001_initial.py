@@ -0,0 +1,121 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:01
+
+import apps.core.models
+import apps.scheduling.models
+from django.conf import settings
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('tenants', '__first__'),
+        ('patients', '__first__'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Constraints de exclusão misturam igualdade (terapeuta, sala) com
+        # sobreposição de períodos: o GiST precisa dos operadores do btree_gist
+        BtreeGistExtension(),
+        migrations.CreateModel(
+            name='Appointment',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('deleted_at', models.DateTimeField(blank=True, null=True, verbose_name='Deletado em')),
+                ('room', models.CharField(blank=True, max_length=50, verbose_name='Sala')),
+                ('start_time', models.DateTimeField(verbose_name='Início')),
+                ('end_time', models.DateTimeField(verbose_name='Fim')),
+                ('status', models.CharField(choices=[('scheduled', 'Agendada'), ('confirmed', 'Confirmada'), ('completed', 'Realizada'), ('cancelled', 'Cancelada'), ('no_show', 'Falta')], default='scheduled', max_length=20, verbose_name='Status')),
+                ('notes', models.TextField(blank=True, verbose_name='Observações')),
+                ('occurrence_date', models.DateField(blank=True, null=True, verbose_name='Data da Ocorrência')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to='patients.patient')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tenants.tenant')),
+                ('therapist', models.ForeignKey(limit_choices_to={'user_type': 'therapist'}, on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to=settings.AUTH_USER_MODEL)),
+                ('treatment_plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='appointments', to='patients.treatmentplan')),
+            ],
+            options={
+                'verbose_name': 'Agendamento',
+                'verbose_name_plural': 'Agendamentos',
+                'ordering': ['start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecurrenceRule',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('deleted_at', models.DateTimeField(blank=True, null=True, verbose_name='Deletado em')),
+                ('weekdays', models.JSONField(default=list, help_text='Dias da semana das sessões (0=Segunda, 6=Domingo)', verbose_name='Dias da Semana')),
+                ('start_time', models.TimeField(verbose_name='Horário')),
+                ('interval_weeks', models.PositiveSmallIntegerField(default=1, verbose_name='Intervalo (semanas)')),
+                ('room', models.CharField(blank=True, max_length=50, verbose_name='Sala')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tenants.tenant')),
+                ('treatment_plan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recurrence', to='patients.treatmentplan')),
+            ],
+            options={
+                'verbose_name': 'Regra de Recorrência',
+                'verbose_name_plural': 'Regras de Recorrência',
+            },
+        ),
+        migrations.CreateModel(
+            name='AppointmentReminder',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('deleted_at', models.DateTimeField(blank=True, null=True, verbose_name='Deletado em')),
+                ('send_at', models.DateTimeField(verbose_name='Enviar em')),
+                ('bucket', models.DateTimeField(verbose_name='Bucket')),
+                ('appointment_start', models.DateTimeField(verbose_name='Início da Sessão')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Enviado em')),
+                ('appointment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reminder', to='scheduling.appointment')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tenants.tenant')),
+            ],
+            options={
+                'verbose_name': 'Lembrete de Agendamento',
+                'verbose_name_plural': 'Lembretes de Agendamento',
+                'indexes': [models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['bucket'], name='appointment_reminder_due_idx'), apps.core.models.LiveRowsIndex(condition=models.Q(('deleted_at__isnull', True), ('is_active', True)), fields=['tenant', '-created_at'], name='scheduling__tenant__40f67c_lv')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'start_time'], name='scheduling__patient_8469ca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=apps.core.models.LiveRowsIndex(condition=models.Q(('deleted_at__isnull', True), ('is_active', True)), fields=['tenant', '-created_at'], name='scheduling__tenant__4718be_lv'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=apps.core.models.LiveRowsIndex(condition=models.Q(('deleted_at__isnull', True), ('is_active', True)), fields=['therapist', 'start_time'], name='scheduling__therapi_267761_lv'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.CheckConstraint(check=models.Q(('end_time__gt', models.F('start_time'))), name='appointment_end_after_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('occurrence_date__isnull', False), ('deleted_at__isnull', True), ('is_active', True)), fields=('treatment_plan', 'occurrence_date'), name='appointment_unique_occurrence'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ('scheduled', 'confirmed')), ('deleted_at__isnull', True), ('is_active', True)), expressions=[('therapist', '='), (apps.scheduling.models.TsTzRange('start_time', 'end_time'), '&&')], name='appointment_therapist_overlap'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ('scheduled', 'confirmed')), ('deleted_at__isnull', True), ('is_active', True), models.Q(('room', ''), _negated=True)), expressions=[('room', '='), (apps.scheduling.models.TsTzRange('start_time', 'end_time'), '&&')], name='appointment_room_overlap'),
+        ),
+    ]
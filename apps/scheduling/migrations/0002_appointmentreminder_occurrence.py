@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '__first__'),
+        ('scheduling', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointmentreminder',
+            name='occurrence_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Data da Ocorrência'),
+        ),
+        migrations.AddField(
+            model_name='appointmentreminder',
+            name='treatment_plan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='session_reminders', to='patients.treatmentplan'),
+        ),
+        migrations.AlterField(
+            model_name='appointmentreminder',
+            name='appointment',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reminder', to='scheduling.appointment'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointmentreminder',
+            constraint=models.CheckConstraint(check=models.Q(('appointment__isnull', False), models.Q(('occurrence_date__isnull', False), ('treatment_plan__isnull', False)), _connector='OR'), name='appointment_reminder_target'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointmentreminder',
+            constraint=models.UniqueConstraint(condition=models.Q(('appointment__isnull', True)), fields=('treatment_plan', 'occurrence_date'), name='appointment_reminder_unique_occurrence'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('scheduling', '0002_appointmentreminder_occurrence'),
+    ]
+    
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appointmentreminder',
+            name='appointment_reminder_due_idx',
+        ),
+        migrations.AddField(
+            model_name='appointmentreminder',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Falhou em'),
+        ),
+        migrations.AddField(
+            model_name='appointmentreminder',
+            name='send_attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas de Envio'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentreminder',
+            index=models.Index(condition=models.Q(('failed_at__isnull', True), ('sent_at__isnull', True)), fields=['bucket'], name='appointment_reminder_due_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:19
+
+import apps.scheduling.models
+import django.contrib.postgres.constraints
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('scheduling', '0003_appointmentreminder_attempts'),
+    ]
+    
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='appointment',
+            name='appointment_therapist_overlap',
+        ),
+        migrations.RemoveConstraint(
+            model_name='appointment',
+            name='appointment_room_overlap',
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ('scheduled', 'confirmed')), ('deleted_at__isnull', True), ('is_active', True)), expressions=[('tenant', '='), ('therapist', '='), (apps.scheduling.models.TsTzRange('start_time', 'end_time'), '&&')], name='appointment_therapist_overlap'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ('scheduled', 'confirmed')), ('deleted_at__isnull', True), ('is_active', True), models.Q(('room', ''), _negated=True)), expressions=[('tenant', '='), ('room', '='), (apps.scheduling.models.TsTzRange('start_time', 'end_time'), '&&')], name='appointment_room_overlap'),
+        ),
+    ]
@@ -0,0 +1,208 @@
+# apps/scheduling/models.py
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+from apps.core.models import LIVE_ROWS, TenantAwareModel
+
+
+class TsTzRange(models.Func):
+    """
+    tstzrange(início, fim), meio-aberto: sessões encostadas não se sobrepõem
+    """
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+# Agendamentos que ocupam a agenda (ver Appointment.ACTIVE_STATUSES)
+OCCUPIED_SLOT = models.Q(status__in=('scheduled', 'confirmed')) & LIVE_ROWS
+
+
+class Appointment(TenantAwareModel):
+    """
+    Sessão agendada entre paciente e terapeuta.
+    
+    Sobreposições são impedidas pelo banco: constraints de exclusão (GiST)
+    sobre terapeuta + período e sala + período, válidas apenas para sessões
+    ativas. Requerem a extensão btree_gist (BtreeGistExtension na migração).
+    """
+    STATUS_CHOICES = [
+        ('scheduled', _('Agendada')),
+        ('confirmed', _('Confirmada')),
+        ('completed', _('Realizada')),
+        ('cancelled', _('Cancelada')),
+        ('no_show', _('Falta')),
+    ]
+    
+    # Situações que ocupam a agenda e recebem lembrete
+    ACTIVE_STATUSES = ('scheduled', 'confirmed')
+    
+    patient = models.ForeignKey(
+        'patients.Patient',
+        on_delete=models.CASCADE,
+        related_name='appointments'
+    )
+    therapist = models.ForeignKey(
+        'users.User',
+        on_delete=models.CASCADE,
+        limit_choices_to={'user_type': 'therapist'},
+        related_name='appointments'
+    )
+    treatment_plan = models.ForeignKey(
+        'patients.TreatmentPlan',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='appointments'
+    )
+    room = models.CharField(_('Sala'), max_length=50, blank=True)
+    start_time = models.DateTimeField(_('Início'))
+    end_time = models.DateTimeField(_('Fim'))
+    status = models.CharField(_('Status'), max_length=20, choices=STATUS_CHOICES, default='scheduled')
+    notes = models.TextField(_('Observações'), blank=True)
+    # Data original da sessão recorrente que este agendamento substitui
+    # (remarcação, cancelamento); vazio em agendamentos avulsos
+    occurrence_date = models.DateField(_('Data da Ocorrência'), null=True, blank=True)
+    
+    live_index_fields = TenantAwareModel.live_index_fields + (('therapist', 'start_time'),)
+    
+    class Meta:
+        verbose_name = _('Agendamento')
+        verbose_name_plural = _('Agendamentos')
+        ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['patient', 'start_time']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(end_time__gt=models.F('start_time')),
+                name='appointment_end_after_start'
+            ),
+            models.UniqueConstraint(
+                fields=['treatment_plan', 'occurrence_date'],
+                name='appointment_unique_occurrence',
+                condition=models.Q(occurrence_date__isnull=False) & LIVE_ROWS
+            ),
+            ExclusionConstraint(
+                name='appointment_therapist_overlap',
+                expressions=[
+                    ('tenant', RangeOperators.EQUAL),
+                    ('therapist', RangeOperators.EQUAL),
+                    (TsTzRange('start_time', 'end_time'), RangeOperators.OVERLAPS),
+                ],
+                condition=OCCUPIED_SLOT,
+            ),
+            ExclusionConstraint(
+                name='appointment_room_overlap',
+                expressions=[
+                    ('tenant', RangeOperators.EQUAL),
+                    ('room', RangeOperators.EQUAL),
+                    (TsTzRange('start_time', 'end_time'), RangeOperators.OVERLAPS),
+                ],
+                condition=OCCUPIED_SLOT & ~models.Q(room=''),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient} - {self.start_time:%d/%m/%Y %H:%M}"
+    
+    @property
+    def is_open(self):
+        """Sessão ativa que ainda ocupa a agenda"""
+        return self.is_active and self.deleted_at is None and self.status in self.ACTIVE_STATUSES
+
+
+class RecurrenceRule(TenantAwareModel):
+    """
+    Regra de recorrência das sessões de um plano terapêutico.
+    
+    As sessões não são gravadas: são geradas sob demanda para a janela
+    consultada (apps.scheduling.recurrence). Período, duração e terapeuta
+    vêm do próprio TreatmentPlan; só as exceções (remarcações,
+    cancelamentos) viram Appointment, com occurrence_date.
+    """
+    treatment_plan = models.OneToOneField(
+        'patients.TreatmentPlan',
+        on_delete=models.CASCADE,
+        related_name='recurrence'
+    )
+    weekdays = models.JSONField(
+        default=list,
+        help_text='Dias da semana das sessões (0=Segunda, 6=Domingo)',
+        verbose_name=_('Dias da Semana')
+    )
+    start_time = models.TimeField(_('Horário'))
+    interval_weeks = models.PositiveSmallIntegerField(_('Intervalo (semanas)'), default=1)
+    room = models.CharField(_('Sala'), max_length=50, blank=True)
+    
+    class Meta:
+        verbose_name = _('Regra de Recorrência')
+        verbose_name_plural = _('Regras de Recorrência')
+    
+    def __str__(self):
+        return f"{self.treatment_plan} - {self.start_time:%H:%M}"
+
+
+class AppointmentReminder(TenantAwareModel):
+    """
+    Lembrete pendente de uma sessão, arquivado no bucket do horário de envio.
+    
+    A sessão é um agendamento gravado (`appointment`) ou uma sessão
+    recorrente virtual (`treatment_plan` + `occurrence_date`, sem
+    appointment), resolvida pela regra no momento do envio. Há no máximo um
+    lembrete por agendamento e por sessão virtual: remarcar atualiza a linha
+    e cancelar a remove, então a mesma sessão nunca gera dois envios. Cada
+    plano tem só o lembrete da sua próxima sessão virtual; o seguinte é
+    arquivado quando este é enviado.
+    """
+    appointment = models.OneToOneField(
+        Appointment,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='reminder'
+    )
+    treatment_plan = models.ForeignKey(
+        'patients.TreatmentPlan',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='session_reminders'
+    )
+    occurrence_date = models.DateField(_('Data da Ocorrência'), null=True, blank=True)
+    send_at = models.DateTimeField(_('Enviar em'))
+    bucket = models.DateTimeField(_('Bucket'))
+    # Início da sessão quando o lembrete foi calculado
+    appointment_start = models.DateTimeField(_('Início da Sessão'))
+    sent_at = models.DateTimeField(_('Enviado em'), null=True, blank=True)
+    # Tentativas que falharam e desistência (esgotadas ou sessão já iniciada)
+    send_attempts = models.PositiveSmallIntegerField(_('Tentativas de Envio'), default=0)
+    failed_at = models.DateTimeField(_('Falhou em'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Lembrete de Agendamento')
+        verbose_name_plural = _('Lembretes de Agendamento')
+        indexes = [
+            models.Index(
+                fields=['bucket'],
+                name='appointment_reminder_due_idx',
+                condition=models.Q(sent_at__isnull=True, failed_at__isnull=True)
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    models.Q(appointment__isnull=False)
+                    | models.Q(treatment_plan__isnull=False, occurrence_date__isnull=False)
+                ),
+                name='appointment_reminder_target'
+            ),
+            models.UniqueConstraint(
+                fields=['treatment_plan', 'occurrence_date'],
+                name='appointment_reminder_unique_occurrence',
+                condition=models.Q(appointment__isnull=True)
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.appointment or self.treatment_plan_id} - {self.send_at:%d/%m/%Y %H:%M}"
@@ -0,0 +1,279 @@
+# apps/scheduling/recurrence.py
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from datetime import datetime, timedelta
+from collections import defaultdict
+import heapq
+
+
+class Occurrence:
+    """
+    Sessão de um plano em uma data: virtual (gerada pela regra) ou
+    materializada (`appointment` preenchido)
+    """
+    __slots__ = ('plan_id', 'patient_id', 'therapist_id', 'occurrence_date',
+                 'start_time', 'end_time', 'room', 'appointment')
+    
+    def __init__(self, plan_id, patient_id, therapist_id, occurrence_date,
+                 start_time, end_time, room='', appointment=None):
+        self.plan_id = plan_id
+        self.patient_id = patient_id
+        self.therapist_id = therapist_id
+        self.occurrence_date = occurrence_date
+        self.start_time = start_time
+        self.end_time = end_time
+        self.room = room
+        self.appointment = appointment
+    
+    @classmethod
+    def from_appointment(cls, appointment):
+        return cls(
+            appointment.treatment_plan_id, appointment.patient_id, appointment.therapist_id,
+            appointment.occurrence_date, appointment.start_time, appointment.end_time,
+            appointment.room, appointment,
+        )
+    
+    @property
+    def is_virtual(self):
+        return self.appointment is None
+    
+    def __repr__(self):
+        kind = 'virtual' if self.is_virtual else 'appointment'
+        return f"<Occurrence {kind} plan={self.plan_id} {self.start_time:%Y-%m-%d %H:%M}>"
+
+
+def rule_weekdays(rule, plan):
+    """
+    Dias da semana da regra; sem dias definidos, sessions_per_week dias
+    espaçados a partir do dia da semana de início do plano
+    """
+    if rule.weekdays:
+        return set(rule.weekdays)
+    sessions = max(1, min(plan.sessions_per_week, 7))
+    first = plan.start_date.weekday()
+    return {(first + (index * 7) // sessions) % 7 for index in range(sessions)}
+
+
+def rule_dates(rule, plan, start_date, end_date):
+    """
+    Gera as datas das sessões do plano entre start_date e end_date (inclusive)
+    """
+    weekdays = rule_weekdays(rule, plan)
+    interval = max(rule.interval_weeks, 1)
+    # Segunda-feira da semana de início: referência do intervalo em semanas
+    anchor = plan.start_date - timedelta(days=plan.start_date.weekday())
+    
+    day = max(plan.start_date, start_date)
+    last = min(plan.end_date, end_date)
+    while day <= last:
+        if day.weekday() in weekdays and ((day - anchor).days // 7) % interval == 0:
+            yield day
+        day += timedelta(days=1)
+
+
+def session_bounds(rule, plan, day, tz=None):
+    """
+    Início e fim da sessão da regra no dia, no fuso do tenant
+    """
+    if tz is None:
+        from apps.tenants.utils import tenant_timezone
+        tz = tenant_timezone(rule.tenant_id)
+    start = timezone.make_aware(datetime.combine(day, rule.start_time), tz)
+    return start, start + timedelta(minutes=plan.session_duration)
+
+
+def expand_rule(rule, start_date, end_date, exceptions=(), tz=None):
+    """
+    Gera as sessões virtuais da regra na janela, em ordem, pulando as datas
+    que têm exceção materializada
+    """
+    plan = rule.treatment_plan
+    for day in rule_dates(rule, plan, start_date, end_date):
+        if day in exceptions:
+            continue
+        start, end = session_bounds(rule, plan, day, tz)
+        yield Occurrence(plan.pk, plan.patient_id, plan.therapist_id, day, start, end, rule.room)
+
+
+def iter_occurrences(tenant_id, start_date, end_date, therapist_ids=None, plan_ids=None, include_appointments=True):
+    """
+    Sessões do tenant entre start_date e end_date (inclusive), em ordem de
+    início.
+    
+    Custa duas consultas, independente do tamanho dos planos: as regras dos
+    planos ativos que cruzam a janela e os agendamentos da janela (avulsos
+    e exceções), ambos restritos ao tenant e a linhas ativas (os managers
+    padrão não filtram nenhum dos dois). As sessões virtuais são geradas por
+    regra, no fuso do tenant, e intercaladas com os agendamentos gravados;
+    com include_appointments=False só as virtuais são produzidas.
+    """
+    from apps.core.models import LIVE_ROWS
+    from apps.scheduling.models import Appointment, RecurrenceRule
+    from apps.tenants.utils import tenant_timezone
+    
+    rules = RecurrenceRule._base_manager.filter(
+        LIVE_ROWS,
+        tenant_id=tenant_id,
+        treatment_plan__is_active=True,
+        treatment_plan__start_date__lte=end_date,
+        treatment_plan__end_date__gte=start_date,
+    ).select_related('treatment_plan')
+    if therapist_ids is not None:
+        rules = rules.filter(treatment_plan__therapist_id__in=list(therapist_ids))
+    if plan_ids is not None:
+        rules = rules.filter(treatment_plan_id__in=list(plan_ids))
+    rules = list(rules)
+    
+    tz = tenant_timezone(tenant_id)
+    window_start = timezone.make_aware(datetime.combine(start_date, datetime.min.time()), tz)
+    window_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), datetime.min.time()), tz)
+    
+    in_window = Q(start_time__gte=window_start, start_time__lt=window_end)
+    if therapist_ids is not None:
+        in_window &= Q(therapist_id__in=list(therapist_ids))
+    if plan_ids is not None:
+        in_window &= Q(treatment_plan_id__in=list(plan_ids))
+    replaced = Q(
+        treatment_plan_id__in=[rule.treatment_plan_id for rule in rules],
+        occurrence_date__range=(start_date, end_date),
+    )
+    appointments = (
+        Appointment._base_manager
+        .filter(LIVE_ROWS, tenant_id=tenant_id)
+        .filter((in_window | replaced) if rules else in_window)
+        .order_by('start_time')
+    )
+    
+    # Exceções ativas (remarcadas, canceladas, realizadas) substituem a
+    # sessão virtual; excluídas não, e a regra volta a gerar a data
+    exceptions = defaultdict(set)
+    booked = []
+    for appointment in appointments:
+        if appointment.occurrence_date is not None:
+            exceptions[appointment.treatment_plan_id].add(appointment.occurrence_date)
+        if include_appointments and appointment.is_open and window_start <= appointment.start_time < window_end:
+            booked.append(Occurrence.from_appointment(appointment))
+    
+    streams = [
+        expand_rule(rule, start_date, end_date, exceptions.get(rule.treatment_plan_id, ()), tz)
+        for rule in rules
+    ]
+    streams.append(iter(booked))
+    return heapq.merge(*streams, key=lambda occurrence: occurrence.start_time)
+
+
+def occurrence_exceptions(rule, start_date, end_date=None):
+    """
+    Datas do plano, a partir de start_date, com exceção ativa gravada
+    """
+    from apps.core.models import LIVE_ROWS
+    from apps.scheduling.models import Appointment
+    
+    dates = Appointment._base_manager.filter(
+        LIVE_ROWS,
+        tenant_id=rule.tenant_id,
+        treatment_plan_id=rule.treatment_plan_id,
+        occurrence_date__gte=start_date,
+    )
+    if end_date is not None:
+        dates = dates.filter(occurrence_date__lte=end_date)
+    return set(dates.values_list('occurrence_date', flat=True))
+
+
+def _rule_is_live(rule):
+    return rule.is_active and rule.deleted_at is None and rule.treatment_plan.is_active
+
+
+def next_occurrence(rule, after=None, now=None):
+    """
+    Próxima sessão virtual da regra que ainda não começou, em data
+    posterior a `after`; None quando o plano não tem mais sessões.
+    
+    Datas com exceção gravada são puladas: a exceção tem lembrete próprio.
+    """
+    from apps.tenants.utils import tenant_timezone
+    
+    if not _rule_is_live(rule):
+        return None
+    plan = rule.treatment_plan
+    tz = tenant_timezone(rule.tenant_id)
+    now = now or timezone.now()
+    
+    start_date = timezone.localdate(now, tz)
+    if after is not None:
+        start_date = max(start_date, after + timedelta(days=1))
+    exceptions = occurrence_exceptions(rule, start_date)
+    
+    for day in rule_dates(rule, plan, start_date, plan.end_date):
+        if day in exceptions:
+            continue
+        start, end = session_bounds(rule, plan, day, tz)
+        if start > now:
+            return Occurrence(plan.pk, plan.patient_id, plan.therapist_id, day, start, end, rule.room)
+    return None
+
+
+def resolve_occurrence(rule, day):
+    """
+    Sessão virtual da regra na data, ou None se a data deixou de ser sessão
+    (regra ou plano alterados, exceção gravada)
+    """
+    if rule is None or not _rule_is_live(rule):
+        return None
+    plan = rule.treatment_plan
+    if not any(rule_dates(rule, plan, day, day)) or occurrence_exceptions(rule, day, day):
+        return None
+    start, end = session_bounds(rule, plan, day)
+    return Occurrence(plan.pk, plan.patient_id, plan.therapist_id, day, start, end, rule.room)
+
+
+def materialize_occurrence(plan, occurrence_date, **changes):
+    """
+    Grava a sessão do plano na data como Appointment, com as alterações.
+    
+    Reaproveita a exceção já gravada para a data, se houver; conflitos de
+    horário viram AppointmentConflict (ver save_appointment).
+    """
+    from apps.core.models import LIVE_ROWS
+    from apps.scheduling.models import Appointment
+    from apps.scheduling.services import save_appointment
+    
+    rule = plan.recurrence
+    if not any(rule_dates(rule, plan, occurrence_date, occurrence_date)):
+        raise ValidationError(f'{occurrence_date} não é uma data de sessão do plano')
+    
+    appointment = Appointment._base_manager.filter(
+        LIVE_ROWS, tenant_id=rule.tenant_id, treatment_plan=plan, occurrence_date=occurrence_date
+    ).first()
+    if appointment is None:
+        start, end = session_bounds(rule, plan, occurrence_date)
+        appointment = Appointment(
+            tenant_id=rule.tenant_id,
+            patient_id=plan.patient_id,
+            therapist_id=plan.therapist_id,
+            treatment_plan=plan,
+            room=rule.room,
+            start_time=start,
+            end_time=end,
+            occurrence_date=occurrence_date,
+        )
+    
+    for field, value in changes.items():
+        setattr(appointment, field, value)
+    return save_appointment(appointment)
+
+
+def move_occurrence(plan, occurrence_date, start_time, end_time=None, **changes):
+    """
+    Remarca uma sessão recorrente
+    """
+    end_time = end_time or start_time + timedelta(minutes=plan.session_duration)
+    return materialize_occurrence(plan, occurrence_date, start_time=start_time, end_time=end_time, **changes)
+
+
+def cancel_occurrence(plan, occurrence_date):
+    """
+    Cancela uma sessão recorrente
+    """
+    return materialize_occurrence(plan, occurrence_date, status='cancelled')
@@ -0,0 +1,562 @@
+# apps/scheduling/services.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from collections import defaultdict
+from apps.scheduling.recurrence import iter_occurrences
+from shared.exceptions.custom import AppointmentConflict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Intervalos livres por terapeuta e dia ficam no cache por este tempo
+AVAILABILITY_CACHE_TIMEOUT = getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 60 * 60)
+
+
+def subtract_intervals(free, busy):
+    """
+    Remove os intervalos `busy` dos intervalos `free`.
+    
+    Ambas as listas vêm ordenadas pelo início; `free` é disjunta e `busy`
+    pode ter sobreposições. Uma única varredura, O(len(free) + len(busy)).
+    """
+    result = []
+    index = 0
+    for start, end in free:
+        while index < len(busy) and busy[index][1] <= start:
+            index += 1
+        
+        cursor = start
+        position = index
+        while position < len(busy) and busy[position][0] < end:
+            busy_start, busy_end = busy[position]
+            if busy_start > cursor:
+                result.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            if cursor >= end:
+                break
+            position += 1
+        
+        if cursor < end:
+            result.append((cursor, end))
+    return result
+
+
+def split_slots(intervals, duration, not_before=None):
+    """
+    Divide intervalos livres em horários consecutivos de `duration`
+    """
+    slots = []
+    for start, end in intervals:
+        if not_before is not None and start < not_before:
+            start = not_before
+        while start + duration <= end:
+            slots.append((start, start + duration))
+            start += duration
+    return slots
+
+
+def _work_signature(therapist):
+    """
+    Identifica a jornada do terapeuta; guardada junto dos intervalos em
+    cache, faz com que alterar dias ou horários de trabalho descarte as
+    entradas antigas
+    """
+    days = ''.join(str(day) for day in sorted(therapist.work_days or []))
+    start = therapist.work_start_time.strftime('%H%M') if therapist.work_start_time else ''
+    end = therapist.work_end_time.strftime('%H%M') if therapist.work_end_time else ''
+    return f"{days}-{start}-{end}"
+
+
+def _availability_prefix(tenant_id):
+    from apps.tenants.utils import tenant_cache_key
+    
+    # A geração do tenant entra na chave: mudar TenantSettings invalida tudo
+    return tenant_cache_key(tenant_id, 'availability')
+
+
+def _availability_key(prefix, therapist_id, day):
+    return f"{prefix}:{therapist_id}:{day.isoformat()}"
+
+
+def _as_time(value):
+    if isinstance(value, str):
+        return datetime.strptime(value[:5], '%H:%M').time()
+    return value
+
+
+class AvailabilityEngine:
+    """
+    Horários livres de vários terapeutas em um intervalo de datas.
+    
+    A jornada de cada dia é a interseção do funcionamento da clínica
+    (TenantSettings) com a do terapeuta (User.work_*); os agendamentos são
+    subtraídos por varredura de intervalos ordenados. O custo é fixo em
+    consultas: terapeutas, configurações do tenant (bundle em cache), uma
+    leitura em lote do cache e, para os dias ausentes do cache, a consulta
+    de agendamentos e as duas da expansão das sessões recorrentes. Os
+    intervalos livres de cada terapeuta/dia são guardados no cache e
+    divididos em horários na leitura.
+    """
+    
+    def __init__(self, tenant=None):
+        from apps.tenants.context import get_current_tenant
+        from apps.tenants.utils import load_tenant_settings_bundle, tenant_timezone
+        
+        tenant = tenant or get_current_tenant()
+        if tenant is None:
+            raise ValueError('AvailabilityEngine requer um tenant (argumento ou contexto atual)')
+        self.tenant_id = getattr(tenant, 'id', tenant)
+        # Jornadas, dias e horários das regras são do fuso da clínica
+        self.tz = tenant_timezone(tenant)
+        
+        bundle = load_tenant_settings_bundle(self.tenant_id)
+        self.working_days = set(bundle.get('working_days') or range(7))
+        self.opens = _as_time(bundle.get('working_hours_start', '08:00'))
+        self.closes = _as_time(bundle.get('working_hours_end', '18:00'))
+        self.duration = bundle.get('appointment_duration', 50)
+        self.advance_days = bundle.get('advance_booking_days', 30)
+    
+    def booking_days(self, start_date, end_date=None):
+        """
+        Dias consultáveis: a partir de hoje e dentro da antecedência máxima
+        """
+        today = timezone.localdate(timezone=self.tz)
+        start_date = max(start_date, today)
+        last = today + timedelta(days=self.advance_days)
+        end_date = min(end_date or start_date, last)
+        return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    
+    def work_window(self, therapist, day):
+        """
+        Jornada do terapeuta no dia, ou None se não há atendimento
+        """
+        if day.weekday() not in self.working_days:
+            return None
+        if therapist.work_days and day.weekday() not in therapist.work_days:
+            return None
+        
+        opens = max(self.opens, therapist.work_start_time or self.opens)
+        closes = min(self.closes, therapist.work_end_time or self.closes)
+        if opens >= closes:
+            return None
+        
+        return (
+            timezone.make_aware(datetime.combine(day, opens), self.tz),
+            timezone.make_aware(datetime.combine(day, closes), self.tz),
+        )
+    
+    def free_intervals(self, therapists, days):
+        """
+        {therapist_id: {dia: [(início, fim), ...]}} com os intervalos livres
+        """
+        from apps.scheduling.models import Appointment, OCCUPIED_SLOT
+        
+        prefix = _availability_prefix(self.tenant_id)
+        signatures = {therapist.id: _work_signature(therapist) for therapist in therapists}
+        keys = {
+            (therapist.id, day): _availability_key(prefix, therapist.id, day)
+            for therapist in therapists
+            for day in days
+        }
+        cached = cache.get_many(list(keys.values())) if keys else {}
+        
+        result = defaultdict(dict)
+        missing = defaultdict(list)
+        for (therapist_id, day), key in keys.items():
+            entry = cached.get(key)
+            if entry is not None and entry[0] == signatures[therapist_id]:
+                result[therapist_id][day] = entry[1]
+            else:
+                missing[therapist_id].append(day)
+        
+        if not missing:
+            return result
+        
+        windows = {}
+        range_start = range_end = None
+        for therapist in therapists:
+            for day in missing.get(therapist.id, ()):
+                window = self.work_window(therapist, day)
+                if window is None:
+                    result[therapist.id][day] = []
+                    continue
+                windows[(therapist.id, day)] = window
+                range_start = window[0] if range_start is None else min(range_start, window[0])
+                range_end = window[1] if range_end is None else max(range_end, window[1])
+        
+        busy = defaultdict(list)
+        if windows:
+            bookings = (
+                Appointment.objects
+                .filter(
+                    OCCUPIED_SLOT,
+                    tenant_id=self.tenant_id,
+                    therapist_id__in=list({therapist_id for therapist_id, day in windows}),
+                    start_time__lt=range_end,
+                    end_time__gt=range_start,
+                )
+                .order_by('therapist_id', 'start_time')
+                .values_list('therapist_id', 'start_time', 'end_time')
+            )
+            for therapist_id, start, end in bookings:
+                busy[therapist_id].append((start, end))
+            
+            # Sessões recorrentes ainda não materializadas também ocupam a agenda
+            for occurrence in iter_occurrences(
+                self.tenant_id,
+                timezone.localdate(range_start, self.tz), timezone.localdate(range_end, self.tz),
+                therapist_ids={therapist_id for therapist_id, day in windows},
+                include_appointments=False,
+            ):
+                busy[occurrence.therapist_id].append((occurrence.start_time, occurrence.end_time))
+            for intervals in busy.values():
+                intervals.sort()
+        
+        by_therapist = defaultdict(list)
+        for (therapist_id, day), window in windows.items():
+            by_therapist[therapist_id].append((window, day))
+        
+        for therapist_id, day_windows in by_therapist.items():
+            day_windows.sort()
+            free = subtract_intervals([window for window, day in day_windows], busy[therapist_id])
+            per_day = {day: [] for window, day in day_windows}
+            for start, end in free:
+                per_day[timezone.localdate(start, self.tz)].append((start, end))
+            result[therapist_id].update(per_day)
+        
+        to_cache = {}
+        for therapist_id, days_missing in missing.items():
+            for day in days_missing:
+                to_cache[keys[(therapist_id, day)]] = (signatures[therapist_id], result[therapist_id][day])
+        cache.set_many(to_cache, AVAILABILITY_CACHE_TIMEOUT)
+        
+        return result
+    
+    def slots(self, therapists, start_date, end_date=None, duration=None):
+        """
+        {therapist_id: {dia: [(início, fim), ...]}} com os horários livres de
+        `duration` minutos (padrão: appointment_duration do tenant)
+        """
+        therapists = list(therapists)
+        days = self.booking_days(start_date, end_date)
+        if not therapists or not days:
+            return {}
+        
+        length = timedelta(minutes=duration or self.duration)
+        now = timezone.now()
+        free = self.free_intervals(therapists, days)
+        return {
+            therapist.id: {
+                day: split_slots(free[therapist.id].get(day, []), length, not_before=now)
+                for day in days
+            }
+            for therapist in therapists
+        }
+
+
+def get_available_slots(therapists, start_date, end_date=None, duration=None, tenant=None):
+    """
+    Horários livres de N terapeutas (queryset, instâncias ou ids) em um intervalo de datas
+    """
+    from apps.users.models import User
+    
+    if not hasattr(therapists, 'only'):
+        therapists = User.objects.filter(pk__in=[getattr(therapist, 'pk', therapist) for therapist in therapists])
+    therapists = therapists.only('id', 'work_days', 'work_start_time', 'work_end_time')
+    
+    return AvailabilityEngine(tenant).slots(therapists, start_date, end_date, duration)
+
+
+def invalidate_availability(tenant_id, therapist_id, days):
+    """
+    Descarta os intervalos livres em cache do terapeuta nos dias informados
+    """
+    prefix = _availability_prefix(tenant_id)
+    cache.delete_many([_availability_key(prefix, therapist_id, day) for day in set(days)])
+
+
+def appointment_days(start_time, end_time, tz=None):
+    """
+    Dias (no fuso `tz`, o do tenant) ocupados por uma sessão
+    """
+    first = timezone.localdate(start_time, tz)
+    last = timezone.localdate(end_time - timedelta(microseconds=1), tz) if end_time > start_time else first
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def invalidate_therapist_availability(tenant_id, therapist_ids):
+    """
+    Descarta a disponibilidade em cache dos terapeutas em todo o horizonte
+    de agendamento (mudanças em planos e regras de recorrência)
+    """
+    from apps.tenants.utils import get_tenant_setting, tenant_timezone
+    
+    today = timezone.localdate(timezone=tenant_timezone(tenant_id))
+    horizon = get_tenant_setting(tenant_id, 'advance_booking_days', 30)
+    days = [today + timedelta(days=offset) for offset in range(horizon + 1)]
+    prefix = _availability_prefix(tenant_id)
+    cache.delete_many([
+        _availability_key(prefix, therapist_id, day)
+        for therapist_id in set(therapist_ids)
+        for day in days
+    ])
+
+
+def invalidate_appointment_slots(tenant_id, slots):
+    """
+    Invalida, após o commit, a disponibilidade dos (terapeuta, início, fim) informados
+    """
+    from apps.tenants.utils import tenant_timezone
+    
+    tz = tenant_timezone(tenant_id)
+    days = defaultdict(set)
+    for therapist_id, start_time, end_time in slots:
+        days[therapist_id].update(appointment_days(start_time, end_time, tz))
+    
+    def invalidate():
+        for therapist_id, therapist_days in days.items():
+            invalidate_availability(tenant_id, therapist_id, therapist_days)
+    
+    # Após o commit, para que outra leitura não recoloque no cache a agenda antiga
+    transaction.on_commit(invalidate)
+
+
+# Constraints de exclusão de Appointment e a mensagem de cada uma
+CONFLICT_CONSTRAINTS = {
+    'appointment_therapist_overlap': _('O terapeuta já tem um agendamento neste horário.'),
+    'appointment_room_overlap': _('A sala já está ocupada neste horário.'),
+}
+
+VIRTUAL_CONFLICT_MESSAGE = _('O terapeuta tem uma sessão recorrente neste horário.')
+
+
+@contextmanager
+def appointment_conflict_errors():
+    """
+    Converte violações das constraints de sobreposição em AppointmentConflict (409).
+    
+    O bloco roda em um savepoint, então a transação externa (ATOMIC_REQUESTS)
+    continua utilizável depois do erro.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as e:
+        constraint = getattr(getattr(e.__cause__, 'diag', None), 'constraint_name', None)
+        if constraint not in CONFLICT_CONSTRAINTS:
+            raise
+        raise AppointmentConflict(CONFLICT_CONSTRAINTS[constraint]) from e
+
+
+def save_appointment(appointment):
+    """
+    Grava (cria ou remarca) um agendamento; conflitos viram AppointmentConflict.
+    
+    Conflitos com agendamentos gravados são checados pela constraint no
+    próprio INSERT/UPDATE, sem janela entre checar e gravar quando várias
+    recepcionistas agendam ao mesmo tempo. As sessões recorrentes virtuais
+    não estão na tabela e são verificadas antes, pela expansão das regras do
+    terapeuta no dia.
+    """
+    if virtual_conflicts([(0, appointment)]):
+        raise AppointmentConflict(VIRTUAL_CONFLICT_MESSAGE)
+    with appointment_conflict_errors():
+        appointment.save()
+    return appointment
+
+
+def _overlapping_pairs(items, key):
+    """
+    Pares (i, j) de itens que se sobrepõem com a mesma chave, por ordenação
+    """
+    pairs = []
+    groups = defaultdict(list)
+    for index, item in items:
+        value = key(item)
+        if value:
+            groups[value].append((item.start_time, item.end_time, index))
+    
+    for intervals in groups.values():
+        intervals.sort()
+        active = []
+        for start, end, index in intervals:
+            active = [(other_end, other) for other_end, other in active if other_end > start]
+            pairs.extend((other, index) for other_end, other in active)
+            active.append((end, index))
+    return pairs
+
+
+def therapist_slot_key(appointment):
+    """Chave da agenda do terapeuta, como na constraint appointment_therapist_overlap"""
+    return (appointment.tenant_id, appointment.therapist_id)
+
+
+def room_slot_key(appointment):
+    """Chave da agenda da sala (None sem sala), como em appointment_room_overlap"""
+    return (appointment.tenant_id, appointment.room) if appointment.room else None
+
+
+def _open_proposals(appointments):
+    """
+    (índice, agendamento) dos agendamentos propostos que ocupam a agenda
+    """
+    return [(index, appointment) for index, appointment in appointments if appointment.is_open]
+
+
+def match_booked_conflicts(proposed, rows):
+    """
+    Conflitos dos agendamentos propostos [(índice, agendamento)] com as
+    linhas gravadas (id, tenant_id, therapist_id, room, início, fim)
+    """
+    by_therapist = defaultdict(list)
+    by_room = defaultdict(list)
+    for row in rows:
+        by_therapist[(row[1], row[2])].append(row)
+        if row[3]:
+            by_room[(row[1], row[3])].append(row)
+    
+    conflicts = []
+    for index, appointment in proposed:
+        candidates = [('therapist', by_therapist.get((appointment.tenant_id, appointment.therapist_id), []))]
+        if appointment.room:
+            candidates.append(('room', by_room.get((appointment.tenant_id, appointment.room), [])))
+        for reason, candidate_rows in candidates:
+            for pk, tenant_id, therapist_id, room, start_time, end_time in candidate_rows:
+                if pk != appointment.pk and start_time < appointment.end_time and end_time > appointment.start_time:
+                    conflicts.append({'index': index, 'reason': reason, 'appointment': pk})
+    return conflicts
+
+
+def match_virtual_conflicts(proposed, occurrences):
+    """
+    Conflitos dos agendamentos propostos com sessões recorrentes virtuais
+    do mesmo terapeuta; a sessão que o próprio agendamento substitui
+    (mesmo plano e occurrence_date) não conta
+    """
+    by_therapist = defaultdict(list)
+    for occurrence in occurrences:
+        by_therapist[occurrence.therapist_id].append(occurrence)
+    
+    conflicts = []
+    for index, appointment in proposed:
+        for occurrence in by_therapist.get(appointment.therapist_id, ()):
+            if (occurrence.plan_id == appointment.treatment_plan_id
+                    and occurrence.occurrence_date == appointment.occurrence_date):
+                continue
+            if occurrence.start_time < appointment.end_time and occurrence.end_time > appointment.start_time:
+                conflicts.append({
+                    'index': index,
+                    'reason': 'recurrence',
+                    'treatment_plan': occurrence.plan_id,
+                    'occurrence_date': occurrence.occurrence_date,
+                })
+    return conflicts
+
+
+def virtual_conflicts(proposed):
+    """
+    Verifica agendamentos propostos [(índice, agendamento)] contra as
+    sessões recorrentes ainda não materializadas.
+    
+    As regras dos terapeutas envolvidos são expandidas uma vez por tenant,
+    na janela de dias (no fuso do tenant) que cobre todo o lote.
+    """
+    from apps.tenants.utils import tenant_timezone
+    
+    by_tenant = defaultdict(list)
+    for item in _open_proposals(proposed):
+        by_tenant[item[1].tenant_id].append(item)
+    
+    conflicts = []
+    for tenant_id, items in by_tenant.items():
+        tz = tenant_timezone(tenant_id)
+        days = [
+            day for index, appointment in items
+            for day in appointment_days(appointment.start_time, appointment.end_time, tz)
+        ]
+        occurrences = iter_occurrences(
+            tenant_id, min(days), max(days),
+            therapist_ids={appointment.therapist_id for index, appointment in items},
+            include_appointments=False,
+        )
+        conflicts.extend(match_virtual_conflicts(items, occurrences))
+    return conflicts
+
+
+def find_conflicts(appointments):
+    """
+    Verifica um lote de agendamentos propostos (instâncias não gravadas ou
+    remarcadas) contra a agenda existente, as sessões recorrentes virtuais
+    e entre si.
+    
+    A agenda é lida em uma única consulta e as regras expandidas uma vez
+    por tenant, independente do tamanho do lote. Retorna uma lista de
+    dicionários {'index', 'reason', e 'appointment', 'with_index' ou
+    'treatment_plan'/'occurrence_date'}; lista vazia quando o lote pode ser
+    gravado.
+    """
+    from apps.scheduling.models import Appointment, OCCUPIED_SLOT
+    
+    proposed = _open_proposals(enumerate(appointments))
+    if not proposed:
+        return []
+    
+    conflicts = []
+    for reason, key in (('therapist', therapist_slot_key), ('room', room_slot_key)):
+        for index, other in _overlapping_pairs(proposed, key):
+            conflicts.append({'index': index, 'reason': reason, 'with_index': other})
+    
+    condition = Q()
+    for index, appointment in proposed:
+        resource = Q(therapist_id=appointment.therapist_id)
+        if appointment.room:
+            resource |= Q(room=appointment.room)
+        condition |= resource & Q(start_time__lt=appointment.end_time, end_time__gt=appointment.start_time)
+    
+    existing = list(
+        Appointment._base_manager
+        .filter(OCCUPIED_SLOT, condition, tenant_id__in={appointment.tenant_id for index, appointment in proposed})
+        .exclude(pk__in=[appointment.pk for index, appointment in proposed if not appointment._state.adding])
+        .values_list('id', 'tenant_id', 'therapist_id', 'room', 'start_time', 'end_time')
+    )
+    conflicts.extend(match_booked_conflicts(proposed, existing))
+    conflicts.extend(virtual_conflicts(proposed))
+    
+    return sorted(conflicts, key=lambda conflict: conflict['index'])
+
+
+def book_appointments(appointments):
+    """
+    Grava um lote de agendamentos novos, tudo ou nada.
+    
+    O lote é validado com find_conflicts (uma consulta) e gravado com um
+    único bulk_create; a constraint continua sendo a garantia final caso
+    outro agendamento entre no meio. Lembretes e disponibilidade são
+    atualizados como no save individual.
+    """
+    from apps.scheduling.models import Appointment
+    from apps.scheduling.tasks import schedule_reminders
+    
+    appointments = list(appointments)
+    conflicts = find_conflicts(appointments)
+    if conflicts:
+        raise AppointmentConflict({'conflicts': conflicts})
+    
+    with appointment_conflict_errors():
+        created = Appointment.objects.bulk_create(appointments)
+        schedule_reminders(created)
+    
+    by_tenant = defaultdict(list)
+    for appointment in created:
+        by_tenant[appointment.tenant_id].append(
+            (appointment.therapist_id, appointment.start_time, appointment.end_time)
+        )
+    for tenant_id, slots in by_tenant.items():
+        invalidate_appointment_slots(tenant_id, slots)
+    return created
@@ -0,0 +1,92 @@
+# apps/scheduling/signals.py
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from apps.scheduling.models import Appointment, RecurrenceRule
+from apps.scheduling.services import invalidate_appointment_slots, invalidate_therapist_availability
+from apps.scheduling.tasks import reschedule_plan_reminder, schedule_reminders
+
+
+@receiver(pre_save, sender=Appointment)
+def track_previous_slot(sender, instance, **kwargs):
+    """
+    Guarda terapeuta e horário anteriores para invalidar a disponibilidade antiga
+    """
+    instance._previous_slot = None
+    if not instance._state.adding:
+        instance._previous_slot = sender._base_manager.filter(
+            pk=instance.pk
+        ).values_list('therapist_id', 'start_time', 'end_time').first()
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, raw=False, **kwargs):
+    """
+    Recalcula o lembrete e invalida a disponibilidade do terapeuta
+    """
+    if raw:
+        return
+    schedule_reminders([instance])
+    
+    slots = [(instance.therapist_id, instance.start_time, instance.end_time)]
+    previous = getattr(instance, '_previous_slot', None)
+    if previous is not None and previous != slots[0]:
+        slots.append(previous)
+    invalidate_appointment_slots(instance.tenant_id, slots)
+    _exception_changed(instance)
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    invalidate_appointment_slots(instance.tenant_id, [(instance.therapist_id, instance.start_time, instance.end_time)])
+    _exception_changed(instance)
+
+
+def _exception_changed(appointment):
+    """
+    Exceções de sessão recorrente (gravadas, excluídas ou restauradas)
+    mudam qual é a próxima sessão virtual do plano
+    """
+    if appointment.occurrence_date is not None and appointment.treatment_plan_id is not None:
+        plan_id = appointment.treatment_plan_id
+        transaction.on_commit(lambda: reschedule_plan_reminder(plan_id))
+
+
+@receiver(post_save, sender=RecurrenceRule)
+@receiver(post_delete, sender=RecurrenceRule)
+def recurrence_changed(sender, instance, **kwargs):
+    """
+    Regras alteradas mudam as sessões virtuais de todo o horizonte do
+    terapeuta e o lembrete da próxima sessão do plano
+    """
+    therapist_id = instance.treatment_plan.therapist_id
+    plan_id = instance.treatment_plan_id
+    transaction.on_commit(lambda: invalidate_therapist_availability(instance.tenant_id, [therapist_id]))
+    transaction.on_commit(lambda: reschedule_plan_reminder(plan_id))
+
+
+@receiver(pre_save, sender='patients.TreatmentPlan')
+def track_previous_therapist(sender, instance, **kwargs):
+    instance._previous_therapist_id = None
+    if not instance._state.adding:
+        instance._previous_therapist_id = sender._base_manager.filter(
+            pk=instance.pk
+        ).values_list('therapist_id', flat=True).first()
+
+
+@receiver(post_save, sender='patients.TreatmentPlan')
+def treatment_plan_changed(sender, instance, raw=False, **kwargs):
+    """
+    Período, terapeuta ou status do plano mudam as sessões geradas pela regra
+    """
+    if raw:
+        return
+    tenant_id = RecurrenceRule._base_manager.filter(
+        treatment_plan_id=instance.pk
+    ).values_list('tenant_id', flat=True).first()
+    if tenant_id is None:
+        return
+    
+    therapist_ids = {instance.therapist_id, getattr(instance, '_previous_therapist_id', None)} - {None}
+    transaction.on_commit(lambda: invalidate_therapist_availability(tenant_id, therapist_ids))
+    transaction.on_commit(lambda: reschedule_plan_reminder(instance.pk))
@@ -0,0 +1,408 @@
+# apps/scheduling/tasks.py
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from datetime import datetime, timedelta
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Largura dos buckets de envio (também o intervalo do tick no beat)
+REMINDER_BUCKET_SECONDS = getattr(settings, 'REMINDER_BUCKET_SECONDS', 60 * 5)
+
+REMINDER_BATCH_SIZE = getattr(settings, 'REMINDER_BATCH_SIZE', 200)
+REMINDER_MAX_SECONDS = getattr(settings, 'REMINDER_MAX_SECONDS', 240)
+
+# Tentativas de envio de um lembrete antes de desistir
+REMINDER_MAX_ATTEMPTS = getattr(settings, 'REMINDER_MAX_ATTEMPTS', 3)
+
+# Tarefa/cursor do tick nas marcas por tenant (apps.tenants.utils)
+REMINDER_TASK = 'appointment_reminders'
+
+
+def reminder_bucket(moment):
+    """
+    Início do bucket que contém `moment`.
+    
+    Calculado sobre o timestamp: aritmética no horário local de um datetime
+    com fuso erra na hora repetida do fim do horário de verão.
+    """
+    seconds = int(moment.timestamp())
+    return datetime.fromtimestamp(seconds - seconds % REMINDER_BUCKET_SECONDS, tz=moment.tzinfo)
+
+
+def reminder_send_time(start_time, tenant_id):
+    """
+    Horário de envio do lembrete de uma sessão, conforme
+    reminder_hours_before do tenant.
+    
+    Sessões marcadas dentro da janela do lembrete recebem-no imediatamente;
+    sessões já iniciadas não têm lembrete (None).
+    """
+    from apps.tenants.utils import get_tenant_setting
+    
+    now = timezone.now()
+    if start_time <= now:
+        return None
+    hours = get_tenant_setting(tenant_id, 'reminder_hours_before', 24)
+    return max(start_time - timedelta(hours=hours), now)
+
+
+def reminder_change(appointment, reminder, send_at, now):
+    """
+    O que fazer com o lembrete do agendamento: 'drop' (remover o pendente),
+    'upsert' (gravar com `send_at`) ou None (manter como está).
+    
+    `send_at` é None para sessões canceladas, excluídas ou já iniciadas.
+    """
+    if send_at is None:
+        if reminder is not None and reminder.sent_at is None:
+            return 'drop'
+        return None
+    
+    if reminder is not None and reminder.appointment_start == appointment.start_time:
+        # Mesma sessão: já enviado, desistido, inalterado ou já vencido
+        if (reminder.sent_at is not None or reminder.failed_at is not None
+                or reminder.send_at == send_at or reminder.send_at <= now):
+            return None
+    return 'upsert'
+
+
+def reminder_retry_bucket(reminder, now):
+    """
+    Bucket da nova tentativa de um lembrete cujo envio falhou (send_attempts
+    já contando a falha), um bucket mais adiante a cada tentativa; None para
+    desistir: tentativas esgotadas ou sessão que começaria antes disso
+    """
+    if reminder.send_attempts >= REMINDER_MAX_ATTEMPTS:
+        return None
+    bucket = reminder_bucket(now) + timedelta(seconds=REMINDER_BUCKET_SECONDS * reminder.send_attempts)
+    if bucket >= reminder.appointment_start:
+        return None
+    return bucket
+
+
+def schedule_reminders(appointments):
+    """
+    Calcula o envio dos lembretes e arquiva cada um no seu bucket.
+    
+    Chamado ao criar ou alterar agendamentos (inclusive em lote). Sessões
+    canceladas, excluídas ou já iniciadas perdem o lembrete pendente; um
+    lembrete já enviado só volta à fila se a sessão foi remarcada.
+    """
+    from apps.scheduling.models import AppointmentReminder
+    from apps.tenants.utils import mark_tenant_work
+    
+    appointments = list(appointments)
+    if not appointments:
+        return
+    
+    existing = {
+        reminder.appointment_id: reminder
+        for reminder in AppointmentReminder._base_manager.filter(
+            appointment_id__in=[appointment.pk for appointment in appointments]
+        ).only('appointment_id', 'send_at', 'appointment_start', 'sent_at', 'failed_at')
+    }
+    
+    now = timezone.now()
+    upserts = []
+    drop = []
+    for appointment in appointments:
+        send_at = reminder_send_time(appointment.start_time, appointment.tenant_id) if appointment.is_open else None
+        change = reminder_change(appointment, existing.get(appointment.pk), send_at, now)
+        if change == 'drop':
+            drop.append(appointment.pk)
+        if change != 'upsert':
+            continue
+        
+        upserts.append(AppointmentReminder(
+            tenant_id=appointment.tenant_id,
+            appointment_id=appointment.pk,
+            send_at=send_at,
+            bucket=reminder_bucket(send_at),
+            appointment_start=appointment.start_time,
+            sent_at=None,
+            send_attempts=0,
+            failed_at=None,
+        ))
+    
+    if drop:
+        AppointmentReminder._base_manager.filter(appointment_id__in=drop, sent_at__isnull=True).delete()
+    if upserts:
+        AppointmentReminder._base_manager.bulk_create(
+            upserts,
+            update_conflicts=True,
+            unique_fields=['appointment'],
+            update_fields=[
+                'send_at', 'bucket', 'appointment_start', 'sent_at', 'send_attempts', 'failed_at', 'updated_at',
+            ],
+        )
+        for tenant_id in {reminder.tenant_id for reminder in upserts}:
+            mark_tenant_work(REMINDER_TASK, tenant_id)
+
+
+def cancel_reminders(appointment_ids):
+    """
+    Remove os lembretes pendentes dos agendamentos
+    """
+    from apps.scheduling.models import AppointmentReminder
+    
+    AppointmentReminder._base_manager.filter(
+        appointment_id__in=list(appointment_ids), sent_at__isnull=True
+    ).delete()
+
+
+def schedule_occurrence_reminder(rule):
+    """
+    Arquiva o lembrete da próxima sessão virtual da regra.
+    
+    As sessões recorrentes não são gravadas, então cada plano tem um único
+    lembrete virtual pendente (treatment_plan + occurrence_date), sempre o
+    da próxima sessão ainda não lembrada (enviada ou desistida): o pendente
+    anterior é descartado e recalculado. Chamado quando a regra, o plano ou uma exceção mudam e
+    depois de cada envio.
+    """
+    from django.db.models import Max, Q
+    from apps.scheduling.models import AppointmentReminder, RecurrenceRule
+    from apps.scheduling.recurrence import next_occurrence
+    from apps.tenants.utils import mark_tenant_work
+    
+    with transaction.atomic():
+        # Serializa recálculos concorrentes do mesmo plano
+        list(RecurrenceRule._base_manager.select_for_update().filter(pk=rule.pk).values_list('pk'))
+        
+        reminders = AppointmentReminder._base_manager.filter(
+            appointment__isnull=True, treatment_plan_id=rule.treatment_plan_id
+        )
+        done = Q(sent_at__isnull=False) | Q(failed_at__isnull=False)
+        last_sent = reminders.filter(done).aggregate(last=Max('occurrence_date'))['last']
+        reminders.exclude(done).delete()
+        
+        occurrence = next_occurrence(rule, after=last_sent)
+        if occurrence is None:
+            return None
+        send_at = reminder_send_time(occurrence.start_time, rule.tenant_id)
+        mark_tenant_work(REMINDER_TASK, rule.tenant_id)
+        return AppointmentReminder._base_manager.create(
+            tenant_id=rule.tenant_id,
+            treatment_plan_id=rule.treatment_plan_id,
+            occurrence_date=occurrence.occurrence_date,
+            send_at=send_at,
+            bucket=reminder_bucket(send_at),
+            appointment_start=occurrence.start_time,
+        )
+
+
+def reschedule_plan_reminder(plan_id):
+    """
+    Recalcula o lembrete virtual do plano (sem regra, só remove o pendente)
+    """
+    from apps.scheduling.models import AppointmentReminder, RecurrenceRule
+    
+    rule = RecurrenceRule._base_manager.select_related('treatment_plan').filter(treatment_plan_id=plan_id).first()
+    if rule is None:
+        AppointmentReminder._base_manager.filter(
+            appointment__isnull=True, treatment_plan_id=plan_id, sent_at__isnull=True, failed_at__isnull=True
+        ).delete()
+        return None
+    return schedule_occurrence_reminder(rule)
+
+
+def _reminder_channels(tenant_id):
+    from apps.tenants.utils import get_tenant_setting
+    
+    channels = ['system']
+    if get_tenant_setting(tenant_id, 'email_notifications', True):
+        channels.append('email')
+    if get_tenant_setting(tenant_id, 'sms_notifications', False):
+        channels.append('sms')
+    return channels
+
+
+def _send_reminder(tenant, patient, therapist, start_time):
+    """
+    Notifica os responsáveis pelo paciente; retorna o número de notificações
+    """
+    from apps.communication.notifications import notify
+    from apps.tenants.utils import tenant_timezone
+    from apps.users.models import User
+    
+    start = timezone.localtime(start_time, tenant_timezone(tenant))
+    therapist_name = therapist.get_full_name() or therapist.username
+    return notify(
+        User.objects.filter(children=patient.pk, is_active=True),
+        title='Lembrete de sessão',
+        message=(
+            f"{patient.name} tem sessão com {therapist_name} "
+            f"em {start:%d/%m/%Y} às {start:%H:%M}."
+        ),
+        channels=_reminder_channels(tenant.id),
+        tenant=tenant,
+    )
+
+
+def _reminder_session(reminder):
+    """
+    (paciente, terapeuta, início) da sessão do lembrete, ou None se o
+    lembrete ficou defasado: sessão cancelada ou remarcada sem passar por
+    schedule_reminders, ou data que deixou de ser sessão do plano
+    """
+    from apps.scheduling.recurrence import resolve_occurrence
+    
+    appointment = reminder.appointment
+    if appointment is not None:
+        if not appointment.is_open or appointment.start_time != reminder.appointment_start:
+            return None
+        return appointment.patient, appointment.therapist, appointment.start_time
+    
+    plan = reminder.treatment_plan
+    rule = getattr(plan, 'recurrence', None) if plan is not None else None
+    occurrence = resolve_occurrence(rule, reminder.occurrence_date)
+    if occurrence is None or occurrence.start_time != reminder.appointment_start:
+        return None
+    return plan.patient, plan.therapist, occurrence.start_time
+
+
+def claim_and_send_reminders(tenant, bucket, batch_size):
+    """
+    Reserva e envia um lote de lembretes do tenant no bucket atual (e em
+    buckets atrasados). Chamado com o schema do tenant ativo.
+    
+    Só o índice parcial de lembretes pendentes é lido, então o custo
+    depende dos lembretes vencidos, não do total de agendamentos. As linhas
+    são travadas com SKIP LOCKED e marcadas como enviadas na mesma
+    transação que grava as notificações: ticks concorrentes não duplicam
+    envios. Lembretes de sessões virtuais são resolvidos pela regra no
+    envio; os defasados são recalculados em vez de enviados, e cada envio
+    virtual arquiva o lembrete da sessão seguinte do plano.
+    
+    Lembretes atrasados de sessões que já começaram não são enviados:
+    recebem failed_at. Um envio que falha conta a tentativa e passa para um
+    bucket adiante (reminder_retry_bucket), até desistir.
+    Retorna (reservados, enviados, desistidos).
+    """
+    from apps.scheduling.models import AppointmentReminder
+    
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            AppointmentReminder._base_manager
+            .filter(tenant_id=tenant.id, sent_at__isnull=True, failed_at__isnull=True, bucket__lte=bucket)
+            .select_related(
+                'tenant', 'appointment__patient', 'appointment__therapist',
+                'treatment_plan__patient', 'treatment_plan__therapist', 'treatment_plan__recurrence',
+            )
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('bucket')[:batch_size]
+        )
+        if not batch:
+            return 0, 0, 0
+        
+        sent_ids = []
+        expired = []
+        failed = []
+        stale = []
+        plans = set()
+        for reminder in batch:
+            if reminder.appointment_start <= now:
+                expired.append(reminder.pk)
+                if reminder.appointment is None:
+                    plans.add(reminder.treatment_plan_id)
+                continue
+            
+            session = _reminder_session(reminder)
+            if session is None:
+                if reminder.appointment is not None:
+                    stale.append(reminder.appointment)
+                else:
+                    plans.add(reminder.treatment_plan_id)
+                continue
+            try:
+                with transaction.atomic():
+                    _send_reminder(reminder.tenant, *session)
+                sent_ids.append(reminder.pk)
+                if reminder.appointment is None:
+                    plans.add(reminder.treatment_plan_id)
+            except Exception as e:
+                logger.error(f"Error sending reminder {reminder.pk}: {str(e)}")
+                reminder.send_attempts += 1
+                retry_bucket = reminder_retry_bucket(reminder, now)
+                if retry_bucket is None:
+                    reminder.failed_at = now
+                    if reminder.appointment is None:
+                        plans.add(reminder.treatment_plan_id)
+                else:
+                    reminder.bucket = retry_bucket
+                failed.append(reminder)
+        
+        if sent_ids:
+            AppointmentReminder._base_manager.filter(pk__in=sent_ids).update(sent_at=now)
+        if failed:
+            AppointmentReminder._base_manager.bulk_update(failed, ['send_attempts', 'bucket', 'failed_at'])
+        if expired:
+            AppointmentReminder._base_manager.filter(pk__in=expired).update(failed_at=now)
+        given_up = len(expired) + sum(1 for reminder in failed if reminder.failed_at is not None)
+        if given_up:
+            logger.warning(f"{given_up} reminders of tenant {tenant.id} gave up (failed sends or session started)")
+        if stale:
+            schedule_reminders(stale)
+        for plan_id in plans:
+            reschedule_plan_reminder(plan_id)
+    
+    return len(batch), len(sent_ids), given_up
+
+
+def next_reminder_bucket(tenant):
+    """
+    Bucket do próximo lembrete pendente do tenant, ou None
+    """
+    from django.db.models import Min
+    from apps.scheduling.models import AppointmentReminder
+    
+    return AppointmentReminder._base_manager.filter(
+        tenant_id=tenant.id, sent_at__isnull=True, failed_at__isnull=True
+    ).aggregate(next=Min('bucket'))['next']
+
+
+@shared_task
+def send_appointment_reminders(batch_size=None, max_seconds=None):
+    """
+    Tick dos lembretes: processa o bucket corrente de cada tenant, no
+    schema do tenant (tenant_schema), em lotes até esvaziá-lo.
+    
+    Só tenants ativos com lembretes vencidos são visitados: ao terminar um
+    tenant o tick grava o bucket do próximo pendente (record_tenant_work),
+    e arquivar lembretes invalida essa marca. A visita começa depois do
+    último tenant concluído no tick anterior, então um tick que estoura o
+    prazo não deixa sempre os mesmos tenants sem envio.
+    """
+    from apps.tenants.utils import (
+        advance_tenant_cursor, due_tenant_work, record_tenant_work, serving_tenants, tenant_schema,
+    )
+    
+    batch_size = batch_size or REMINDER_BATCH_SIZE
+    deadline = time.monotonic() + (max_seconds or REMINDER_MAX_SECONDS)
+    bucket = reminder_bucket(timezone.now())
+    
+    claimed = sent = failed = 0
+    for tenant, version in due_tenant_work(REMINDER_TASK, serving_tenants(REMINDER_TASK), bucket):
+        if time.monotonic() >= deadline:
+            break
+        with tenant_schema(tenant):
+            while time.monotonic() < deadline:
+                batch_claimed, batch_sent, batch_failed = claim_and_send_reminders(tenant, bucket, batch_size)
+                if not batch_claimed:
+                    break
+                claimed += batch_claimed
+                sent += batch_sent
+                failed += batch_failed
+            else:
+                break
+            record_tenant_work(REMINDER_TASK, tenant, version, next_reminder_bucket(tenant))
+        advance_tenant_cursor(REMINDER_TASK, tenant)
+    
+    if claimed:
+        logger.info(f"Appointment reminders for bucket {bucket:%H:%M}: {sent}/{claimed} sent, {failed} failed")
+    return {'claimed': claimed, 'sent': sent, 'failed': failed}
@@ -0,0 +1,12 @@
+# apps/tenants/apps.py
+from django.apps import AppConfig
+from django.utils.translation import gettext_lazy as _
+
+
+class TenantsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.tenants'
+    verbose_name = _('Tenants')
+    
+    def ready(self):
+        import apps.tenants.signals  # noqa: F401
@@ -0,0 +1,716 @@
+# apps/tenants/backup.py
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.serializers.python import Serializer as PythonSerializer
+from django.db import connection, models, transaction
+from django.utils import timezone
+from apps.core.models import preserve_timestamps
+from apps.tenants.models import Tenant
+from apps.tenants.utils import tenant_app_labels, tenant_schema, tenant_schema_name
+from shared.services.storage import get_export_storage, tenant_export_prefix, overwrite_file
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
+import gzip
+import io
+import json
+import time
+import tempfile
+import uuid
+import logging
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional; gzip é sempre suportado
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT_VERSION = '2.0'
+MANIFEST_NAME = 'manifest.json'
+
+# Linhas lidas por ida ao cursor do servidor e linhas por arquivo de parte
+EXPORT_CHUNK_SIZE = getattr(settings, 'TENANT_EXPORT_CHUNK_SIZE', 2000)
+EXPORT_PART_ROWS = getattr(settings, 'TENANT_EXPORT_PART_ROWS', 50000)
+
+# Limite em memória do buffer de cada parte antes de ir para disco
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+
+COMPRESSION_EXTENSIONS = {
+    'gzip': 'ndjson.gz',
+    'zstd': 'ndjson.zst',
+}
+
+# Linhas por lote (e por transação) na importação
+IMPORT_BATCH_SIZE = getattr(settings, 'TENANT_IMPORT_BATCH_SIZE', 5000)
+
+# Modelos que identificam o tenant de origem e não são copiados em um clone
+CLONE_EXCLUDED_MODELS = ('tenants.tenantdomain', 'tenants.tenantinvitation')
+
+# Tipos de campo que o COPY carrega sem adaptação especial
+COPY_FIELD_TYPES = {
+    'BigIntegerField', 'BooleanField', 'CharField', 'DateField', 'DateTimeField',
+    'DecimalField', 'FileField', 'FloatField', 'ForeignKey', 'GenericIPAddressField',
+    'IntegerField', 'JSONField', 'OneToOneField', 'PositiveBigIntegerField',
+    'PositiveIntegerField', 'PositiveSmallIntegerField', 'SlugField',
+    'SmallIntegerField', 'TextField', 'TimeField', 'UUIDField',
+}
+
+
+def get_tenant_models():
+    """
+    Modelos com dados do tenant, em ordem de dependência (FKs primeiro).
+    
+    Inclui o próprio Tenant, os modelos com FK `tenant` e, com
+    tenant_schemas, os modelos locais dos TENANT_APPS (isolados pelo schema).
+    """
+    tenant_apps = tenant_app_labels()
+    
+    selected = []
+    for model in apps.get_models():
+        if model._meta.proxy or not model._meta.managed:
+            continue
+        if model is Tenant or _tenant_field(model) or model._meta.app_label in tenant_apps:
+            selected.append(model)
+    
+    return _sort_by_dependencies(selected)
+
+
+def _tenant_field(model):
+    """
+    Campo FK para Tenant do modelo, se existir
+    """
+    for field in model._meta.concrete_fields:
+        if field.is_relation and field.name == 'tenant' and field.related_model is Tenant:
+            return field
+    return None
+
+
+def _sort_by_dependencies(models):
+    """
+    Ordenação topológica pelas FKs entre os modelos selecionados
+    """
+    remaining = set(models)
+    ordered = []
+    
+    while remaining:
+        ready = [
+            model for model in remaining
+            if not any(
+                field.related_model in remaining and field.related_model is not model
+                for field in model._meta.concrete_fields if field.is_relation
+            )
+        ]
+        if not ready:
+            # Ciclo de FKs: segue em ordem estável, a importação remapeia as chaves
+            ready = [min(remaining, key=lambda m: m._meta.label)]
+        for model in sorted(ready, key=lambda m: m._meta.label):
+            ordered.append(model)
+            remaining.discard(model)
+    
+    return ordered
+
+
+def tenant_queryset(model, tenant):
+    """
+    Queryset com os registros do tenant para o modelo
+    """
+    qs = model._base_manager.all()
+    if model is Tenant:
+        return qs.filter(pk=tenant.id)
+    if _tenant_field(model):
+        return qs.filter(tenant_id=tenant.id)
+    # Modelos sem FK de tenant ficam isolados no schema do tenant
+    return qs
+
+
+class _RecordSerializer(PythonSerializer):
+    """
+    Serializer 'python' do Django que devolve registros um a um.
+    
+    Inclui os campos herdados de modelos pai (herança multi-tabela), para
+    que cada registro possa ser restaurado sem a tabela pai no pacote.
+    """
+    
+    def serialize_one(self, obj):
+        self.options = {}
+        self.stream = None
+        self.selected_fields = None
+        self.use_natural_foreign_keys = False
+        self.use_natural_primary_keys = False
+        self.start_object(obj)
+        for field in obj._meta.concrete_fields:
+            if field.serialize:
+                if field.remote_field is None:
+                    self.handle_field(obj, field)
+                else:
+                    self.handle_fk_field(obj, field)
+        for field in obj._meta.many_to_many:
+            if field.serialize:
+                self.handle_m2m_field(obj, field)
+        record = self.get_dump_object(obj)
+        self._current = None
+        return record
+
+
+class TenantExporter:
+    """
+    Exportação completa e em streaming dos dados de um tenant.
+    
+    Cada modelo vira uma seção com uma ou mais partes NDJSON comprimidas
+    (gzip ou zstd) gravadas direto no storage. A leitura usa cursores do
+    servidor com paginação por chave, e cada parte passa por um arquivo
+    temporário com limite em memória, então o consumo de memória não depende
+    do tamanho do tenant. O manifesto é regravado após cada parte e serve de
+    checkpoint para retomar uma exportação interrompida.
+    
+    Cada execução lê um único snapshot do banco (transação REPEATABLE READ
+    somente leitura), então as seções são consistentes entre si: nenhuma
+    FK aponta para um registro criado ou apagado durante a exportação. Uma
+    exportação retomada continua em um snapshot novo.
+    """
+    
+    def __init__(self, tenant, export_id=None, compression='gzip', storage=None,
+                 chunk_size=None, part_rows=None):
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError('Compressão zstd requer o pacote zstandard')
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f'Compressão não suportada: {compression}')
+        
+        self.tenant = tenant
+        self.export_id = export_id or uuid.uuid4().hex
+        self.compression = compression
+        self.storage = storage or get_export_storage()
+        self.chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+        self.part_rows = part_rows or EXPORT_PART_ROWS
+        self.prefix = tenant_export_prefix(tenant, self.export_id)
+        self.serializer = _RecordSerializer()
+    
+    def run(self):
+        """
+        Executa (ou retoma) a exportação e retorna o manifesto
+        """
+        manifest = self._load_manifest()
+        if manifest['completed']:
+            return manifest
+        
+        nested = connection.in_atomic_block
+        with tenant_schema(self.tenant), transaction.atomic():
+            if nested:
+                logger.warning(f"Tenant export {self.export_id} running inside a transaction: snapshot not pinned")
+            else:
+                self._pin_snapshot()
+            for model in get_tenant_models():
+                section = self._get_section(manifest, model)
+                if section['done']:
+                    continue
+                self._export_model(manifest, section, model)
+        
+        manifest['completed'] = True
+        manifest['finished_at'] = timezone.now().isoformat()
+        self._save_manifest(manifest)
+        
+        total = sum(section['rows'] for section in manifest['sections'])
+        logger.info(f"Tenant export finished: {self.tenant.slug} ({total} rows) at {self.prefix}")
+        return manifest
+    
+    def _pin_snapshot(self):
+        """
+        Primeira instrução da transação: todas as leituras seguintes veem o
+        mesmo snapshot
+        """
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+    
+    def _export_model(self, manifest, section, model):
+        """
+        Exporta um modelo em partes, a partir do último pk registrado
+        """
+        qs = tenant_queryset(model, self.tenant).order_by('pk')
+        m2m = [field.name for field in model._meta.many_to_many if field.serialize]
+        if m2m:
+            qs = qs.prefetch_related(*m2m)
+        
+        last_pk = section['parts'][-1]['last_pk'] if section['parts'] else None
+        
+        while True:
+            part_qs = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+            part_qs = part_qs[:self.part_rows]
+            
+            rows, last_pk_in_part, name = self._write_part(model, section, part_qs)
+            if not rows:
+                break
+            
+            last_pk = last_pk_in_part
+            section['parts'].append({'name': name, 'rows': rows, 'last_pk': last_pk})
+            section['rows'] += rows
+            self._save_manifest(manifest)
+            
+            if rows < self.part_rows:
+                break
+        
+        section['done'] = True
+        self._save_manifest(manifest)
+    
+    def _write_part(self, model, section, queryset):
+        """
+        Serializa uma parte para um arquivo temporário comprimido e envia ao storage
+        """
+        label = model._meta.label_lower
+        name = (
+            f"{self.prefix}{section['index']:03d}-{label}-"
+            f"{len(section['parts']):05d}.{COMPRESSION_EXTENSIONS[self.compression]}"
+        )
+        
+        rows = 0
+        last_pk = None
+        with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as buffer:
+            with self._compressor(buffer) as stream:
+                for obj in queryset.iterator(chunk_size=self.chunk_size):
+                    record = self.serializer.serialize_one(obj)
+                    stream.write(json.dumps(record, cls=DjangoJSONEncoder).encode() + b'\n')
+                    rows += 1
+                    last_pk = obj.pk
+            
+            if rows:
+                buffer.seek(0)
+                name = overwrite_file(self.storage, name, File(buffer, name=name))
+        
+        return rows, (str(last_pk) if last_pk is not None else None), name
+    
+    @contextmanager
+    def _compressor(self, buffer):
+        if self.compression == 'zstd':
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(buffer, closefd=False)
+        else:
+            stream = gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6)
+        try:
+            yield stream
+        finally:
+            stream.close()
+    
+    def _get_section(self, manifest, model):
+        label = model._meta.label_lower
+        for section in manifest['sections']:
+            if section['model'] == label:
+                return section
+        
+        section = {
+            'model': label,
+            'index': len(manifest['sections']),
+            'rows': 0,
+            'parts': [],
+            'done': False,
+        }
+        manifest['sections'].append(section)
+        return section
+    
+    def _load_manifest(self):
+        name = self.prefix + MANIFEST_NAME
+        if self.storage.exists(name):
+            with self.storage.open(name) as f:
+                manifest = json.load(f)
+            logger.info(f"Resuming tenant export {self.export_id} for {self.tenant.slug}")
+            return manifest
+        
+        return {
+            'version': EXPORT_FORMAT_VERSION,
+            'export_id': self.export_id,
+            'tenant': {
+                'id': str(self.tenant.id),
+                'name': self.tenant.name,
+                'slug': self.tenant.slug,
+            },
+            'compression': self.compression,
+            'started_at': timezone.now().isoformat(),
+            'finished_at': None,
+            'completed': False,
+            'sections': [],
+        }
+    
+    def _save_manifest(self, manifest):
+        content = File(tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE))
+        content.write(json.dumps(manifest, indent=2).encode())
+        content.seek(0)
+        overwrite_file(self.storage, self.prefix + MANIFEST_NAME, content)
+        content.close()
+
+
+def export_tenant(tenant, export_id=None, compression='gzip'):
+    """
+    Exporta (ou retoma a exportação de) todos os dados do tenant
+    """
+    return TenantExporter(tenant, export_id=export_id, compression=compression).run()
+
+
+def _copy_value(field, value):
+    """
+    Valor no formato texto do COPY do Postgres
+    """
+    if value is None:
+        return '\\N'
+    if field.get_internal_type() == 'JSONField':
+        value = json.dumps(value, cls=field.encoder or DjangoJSONEncoder)
+    elif isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class _ModelPlan:
+    """
+    Como carregar um modelo: campos, FKs adiadas e forma de inserção
+    """
+    
+    def __init__(self, model, positions, remap_ids):
+        meta = model._meta
+        self.model = model
+        self.label = meta.label_lower
+        self.pk = meta.pk
+        
+        # pks gerados pelo banco só são conhecidos depois do INSERT
+        self.auto_pk = remap_ids and isinstance(meta.pk, models.AutoField)
+        self.fields = [field for field in meta.concrete_fields if not (self.auto_pk and field is meta.pk)]
+        self.m2m = [
+            field for field in meta.many_to_many
+            if field.serialize and field.remote_field.through._meta.auto_created
+        ]
+        
+        # FKs anuláveis para registros ainda não carregados (o próprio modelo ou
+        # seções posteriores) são gravadas depois, quando o destino já existe
+        position = positions.get(self.label, -1)
+        self.forward = {
+            field.name for field in self.fields
+            if field.is_relation and field.null
+            and positions.get(field.related_model._meta.label_lower, -1) >= position
+        }
+        
+        # Herança multi-tabela não é suportada por bulk_create nem por COPY
+        self.inherited = bool(meta.parents)
+        self.use_copy = (
+            connection.vendor == 'postgresql' and not self.auto_pk and not self.inherited
+            and all(field.get_internal_type() in COPY_FIELD_TYPES for field in self.fields)
+        )
+
+
+class TenantImporter:
+    """
+    Importação em lote de um pacote gerado pelo TenantExporter.
+    
+    As partes são lidas em streaming e cada modelo é carregado em lotes com
+    COPY (quando todos os campos são simples) ou bulk_create, sem passar
+    pelos save() dos modelos nem pelos signals. Cada lote roda na sua
+    própria transação curta, então as tabelas compartilhadas não ficam
+    bloqueadas durante a importação inteira.
+    
+    Com remap_ids (padrão) os registros recebem novos ids e as FKs são
+    reescritas, o que permite importar o pacote como um novo tenant (clone
+    ou migração de outro sistema convertida para o mesmo formato). Sem
+    remap_ids os ids originais são mantidos, para restaurar um tenant
+    removido. O tenant fica inativo até a carga terminar.
+    """
+    
+    def __init__(self, prefix, storage=None, slug=None, name=None, remap_ids=True,
+                 exclude=None, batch_size=None):
+        self.prefix = prefix
+        self.storage = storage or get_export_storage()
+        self.slug = slug
+        self.name = name
+        self.remap_ids = remap_ids
+        self.batch_size = batch_size or IMPORT_BATCH_SIZE
+        self.exclude = set(CLONE_EXCLUDED_MODELS if exclude is None and slug else exclude or ())
+        
+        self.mapping = defaultdict(dict)
+        self.positions = {}
+        self.fixups = []
+        self.pending_m2m = []
+        self.tenant = None
+        self.tenant_active = True
+    
+    def run(self):
+        """
+        Executa a importação e retorna o tenant criado
+        """
+        from apps.tenants.utils import invalidate_tenant_cache, reconcile_tenant_usage
+        
+        started = time.monotonic()
+        manifest = self._load_manifest()
+        self.compression = manifest.get('compression', 'gzip')
+        if self.compression == 'zstd' and zstandard is None:
+            raise ValueError('Compressão zstd requer o pacote zstandard')
+        
+        sections = []
+        for section in manifest['sections']:
+            if section['model'] in self.exclude:
+                continue
+            try:
+                model = apps.get_model(section['model'])
+            except LookupError:
+                logger.warning(f"Skipping unknown model {section['model']} in tenant import")
+                continue
+            sections.append((section, model))
+        self.positions = {section['model']: index for index, (section, _) in enumerate(sections)}
+        
+        tenant_section = next((s for s, model in sections if model is Tenant), None)
+        if tenant_section is None:
+            raise ValueError('Pacote de exportação sem o registro do tenant')
+        
+        slug = self.slug or manifest['tenant']['slug']
+        if Tenant._base_manager.filter(slug=slug).exists():
+            raise ValueError(f'Já existe um tenant com o slug {slug}')
+        
+        rows = self._load_section(tenant_section, Tenant)
+        self.tenant = Tenant._base_manager.get(pk=self._remap(Tenant, manifest['tenant']['id']))
+        self._ensure_schema()
+        
+        with tenant_schema(self.tenant):
+            for section, model in sections:
+                if model is not Tenant:
+                    rows += self._load_section(section, model)
+            
+            self._apply_fixups()
+            self._apply_pending_m2m()
+            if not self.remap_ids:
+                self._reset_sequences([model for _, model in sections])
+        
+        Tenant._base_manager.filter(pk=self.tenant.pk).update(is_active=self.tenant_active)
+        reconcile_tenant_usage(self.tenant)
+        invalidate_tenant_cache(self.tenant.id)
+        
+        logger.info(
+            f"Tenant import finished: {self.tenant.slug} ({rows} rows) "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+        return self.tenant
+    
+    def _load_section(self, section, model):
+        """
+        Carrega um modelo em lotes, cada lote na sua transação
+        """
+        plan = _ModelPlan(model, self.positions, self.remap_ids)
+        records = self._iter_records(section)
+        loaded = 0
+        
+        with preserve_timestamps(model):
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self._insert(plan, batch)
+                loaded += len(batch)
+        
+        return loaded
+    
+    def _insert(self, plan, batch):
+        rows = [self._build_row(plan, record) for record in batch]
+        
+        if plan.use_copy:
+            self._copy(plan, rows)
+        elif plan.inherited:
+            for _, values, _, _ in rows:
+                plan.model(**values).save_base(force_insert=True)
+        else:
+            objs = [plan.model(**values) for _, values, _, _ in rows]
+            plan.model._base_manager.bulk_create(objs, batch_size=self.batch_size)
+            if plan.auto_pk:
+                for (old_pk, _, _, _), obj in zip(rows, objs):
+                    self.mapping[plan.label][old_pk] = obj.pk
+        
+        through_rows = defaultdict(list)
+        for old_pk, values, deferred, m2m in rows:
+            new_pk = self.mapping[plan.label][old_pk] if plan.auto_pk else values[plan.pk.attname]
+            for field, old_target in deferred:
+                self.fixups.append((plan.model, field, new_pk, old_target))
+            for field, old_targets in m2m:
+                target_position = self.positions.get(field.related_model._meta.label_lower, -1)
+                for old_target in old_targets:
+                    if target_position >= self.positions[plan.label]:
+                        self.pending_m2m.append((field, new_pk, old_target))
+                    else:
+                        through_rows[field].append(self._through_row(field, new_pk, old_target))
+        
+        for field, objs in through_rows.items():
+            field.remote_field.through._base_manager.bulk_create(objs, batch_size=self.batch_size)
+    
+    def _build_row(self, plan, record):
+        """
+        Converte um registro do pacote em valores de coluna, com ids remapeados
+        """
+        fields = record['fields']
+        old_pk = str(record['pk'])
+        values = {}
+        deferred = []
+        
+        if not plan.auto_pk:
+            values[plan.pk.attname] = self._remap(plan.model, old_pk)
+        
+        for field in plan.fields:
+            if field.primary_key:
+                continue
+            if field.name not in fields:
+                values[field.attname] = field.get_default()
+                continue
+            
+            raw = fields[field.name]
+            if not field.is_relation:
+                values[field.attname] = field.to_python(raw)
+            elif raw is not None and field.name in plan.forward:
+                values[field.attname] = None
+                deferred.append((field, str(raw)))
+            elif field.target_field.primary_key:
+                values[field.attname] = self._remap(field.related_model, raw)
+            else:
+                values[field.attname] = field.target_field.to_python(raw)
+        
+        if plan.model is Tenant:
+            self.tenant_active = values['is_active']
+            values['is_active'] = False
+            if self.slug:
+                values['slug'] = self.slug
+            if self.name:
+                values['name'] = self.name
+        
+        m2m = [(field, fields.get(field.name) or []) for field in plan.m2m]
+        return old_pk, values, deferred, m2m
+    
+    def _remap(self, model, raw):
+        """
+        Novo valor de pk para um registro do pacote (ou o original, sem remap)
+        """
+        if raw is None:
+            return None
+        
+        label = model._meta.label_lower
+        pk = model._meta.pk
+        target_field = pk.target_field if pk.is_relation else pk
+        if not self.remap_ids or label not in self.positions:
+            return target_field.to_python(raw)
+        
+        key = str(raw)
+        if isinstance(target_field, models.UUIDField):
+            return self.mapping[label].setdefault(key, uuid.uuid4())
+        if isinstance(target_field, models.AutoField):
+            try:
+                return self.mapping[label][key]
+            except KeyError:
+                raise ValueError(f'Registro {label} {key} referenciado antes de ser importado')
+        return target_field.to_python(raw)
+    
+    def _copy(self, plan, rows):
+        """
+        Carrega o lote com COPY ... FROM STDIN
+        """
+        qn = connection.ops.quote_name
+        buffer = io.StringIO()
+        for _, values, _, _ in rows:
+            buffer.write('\t'.join(_copy_value(field, values[field.attname]) for field in plan.fields))
+            buffer.write('\n')
+        buffer.seek(0)
+        
+        columns = ', '.join(qn(field.column) for field in plan.fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {qn(plan.model._meta.db_table)} ({columns}) FROM STDIN',
+                buffer
+            )
+    
+    def _through_row(self, field, new_pk, old_target):
+        through = field.remote_field.through
+        return through(**{
+            f'{field.m2m_field_name()}_id': new_pk,
+            f'{field.m2m_reverse_field_name()}_id': self._remap(field.related_model, old_target),
+        })
+    
+    def _apply_fixups(self):
+        """
+        Grava as FKs adiadas agora que todos os destinos existem
+        """
+        grouped = defaultdict(list)
+        for model, field, pk, old_target in self.fixups:
+            obj = model(pk=pk)
+            setattr(obj, field.attname, self._remap(field.related_model, old_target))
+            grouped[(model, field.name)].append(obj)
+        
+        for (model, field_name), objs in grouped.items():
+            for start in range(0, len(objs), self.batch_size):
+                with transaction.atomic():
+                    model._base_manager.bulk_update(objs[start:start + self.batch_size], [field_name])
+        self.fixups = []
+    
+    def _apply_pending_m2m(self):
+        grouped = defaultdict(list)
+        for field, new_pk, old_target in self.pending_m2m:
+            grouped[field].append(self._through_row(field, new_pk, old_target))
+        
+        for field, objs in grouped.items():
+            with transaction.atomic():
+                field.remote_field.through._base_manager.bulk_create(objs, batch_size=self.batch_size)
+        self.pending_m2m = []
+    
+    def _reset_sequences(self, model_list):
+        """
+        Ajusta as sequências após inserir pks explícitos (restauração sem remap)
+        """
+        from django.core.management.color import no_style
+        
+        statements = connection.ops.sequence_reset_sql(no_style(), model_list)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+    
+    def _ensure_schema(self):
+        """
+        Cria o schema do tenant a partir do schema modelo, quando necessário
+        """
+        if not hasattr(connection, 'set_schema'):
+            return
+        
+        from apps.tenants.provisioning import (
+            TEMPLATE_SCHEMA, clone_schema, ensure_template_schema, schema_exists
+        )
+        
+        schema_name = tenant_schema_name(self.tenant)
+        if not schema_exists(schema_name):
+            ensure_template_schema()
+            clone_schema(TEMPLATE_SCHEMA, schema_name)
+    
+    def _iter_records(self, section):
+        """
+        Lê as partes da seção em streaming, um registro por linha
+        """
+        for part in section['parts']:
+            with self.storage.open(part['name'], 'rb') as raw:
+                if self.compression == 'zstd':
+                    stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw))
+                else:
+                    stream = gzip.GzipFile(fileobj=raw, mode='rb')
+                with stream:
+                    for line in stream:
+                        if line.strip():
+                            yield json.loads(line)
+    
+    def _load_manifest(self):
+        name = self.prefix + MANIFEST_NAME
+        if not self.storage.exists(name):
+            raise ValueError(f'Manifesto não encontrado em {self.prefix}')
+        with self.storage.open(name) as f:
+            manifest = json.load(f)
+        if not manifest.get('completed'):
+            raise ValueError(f'Exportação {manifest.get("export_id")} não foi concluída')
+        return manifest
+
+
+def import_tenant(prefix, slug=None, name=None, remap_ids=True, storage=None):
+    """
+    Importa um pacote de exportação como um novo tenant
+    """
+    return TenantImporter(prefix, storage=storage, slug=slug, name=name, remap_ids=remap_ids).run()
@@ -0,0 +1,62 @@
+# apps/tenants/context.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Tenant atual da requisição/tarefa. ContextVar é isolado por task asyncio e
+# propagado por sync_to_async/async_to_sync, ao contrário de threading.local
+_current_tenant = ContextVar('current_tenant', default=None)
+
+# Bundles de configuração memorizados no escopo atual (None = sem memorização)
+_settings_bundles = ContextVar('settings_bundles', default=None)
+
+
+def set_current_tenant(tenant):
+    """Define o tenant atual no contexto; retorna o token para reset"""
+    return _current_tenant.set(tenant)
+
+
+def get_current_tenant():
+    """Obtém o tenant atual do contexto"""
+    return _current_tenant.get()
+
+
+def clear_current_tenant(token=None):
+    """Limpa o tenant atual do contexto (restaurando o anterior se houver token)"""
+    if token is not None:
+        _current_tenant.reset(token)
+    else:
+        _current_tenant.set(None)
+
+
+@contextmanager
+def tenant_scope(tenant):
+    """
+    Executa um bloco com o tenant informado como tenant atual.
+    
+    Útil em tarefas Celery e scripts. Para enviar trabalho a outras threads
+    use contextvars.copy_context().run(...) (ou sync_to_async), que levam o
+    tenant junto.
+    """
+    token = _current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current_tenant.reset(token)
+
+
+def get_settings_bundles():
+    """Dicionário de bundles memorizados no escopo atual, ou None"""
+    return _settings_bundles.get()
+
+
+def begin_settings_scope():
+    """Inicia a memorização de bundles de configuração; retorna o token"""
+    return _settings_bundles.set({})
+
+
+def end_settings_scope(token=None):
+    """Encerra a memorização de bundles de configuração"""
+    if token is not None:
+        _settings_bundles.reset(token)
+    else:
+        _settings_bundles.set(None)
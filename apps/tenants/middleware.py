@@ -1,19 +1,27 @@
 # apps/tenants/middleware.py
 from django.http import Http404, HttpResponseRedirect
-from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.utils.deprecation import MiddlewareMixin
-from django.utils.cache import patch_cache_control
-from django.core.cache import cache
-from apps.tenants.models import Tenant, TenantDomain
-from apps.tenants.utils import get_tenant_from_request
-import threading
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.exceptions import SessionInterrupted
+from django.contrib.sessions.middleware import SessionMiddleware
+from apps.tenants.utils import tenant_routing_table
+from apps.tenants.context import (  # noqa: F401
+    set_current_tenant, get_current_tenant, clear_current_tenant,
+    begin_settings_scope, end_settings_scope, tenant_scope
+)
+from asgiref.sync import sync_to_async
+from importlib import import_module
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Thread local storage para o tenant atual
-_thread_locals = threading.local()
+# Última atividade registrada na sessão (timestamp em segundos)
+SESSION_LAST_SEEN_KEY = '_tenant_last_seen'
 
 
 class TenantMiddleware(MiddlewareMixin):
@@ -28,6 +36,25 @@ class TenantMiddleware(MiddlewareMixin):
         # Obter tenant baseado no domínio ou subdomínio
         tenant = self._get_tenant_from_request(request)
         
+        response = self._check_tenant(request, tenant)
+        if response is not None:
+            return response
+        
+        self._activate_tenant(request, tenant)
+    
+    def process_response(self, request, response):
+        """
+        Processa a resposta para adicionar headers específicos do tenant
+        """
+        end_settings_scope()
+        clear_current_tenant()
+        
+        return self._add_tenant_headers(request, response)
+    
+    def _check_tenant(self, request, tenant):
+        """
+        Retorna a resposta de erro quando o tenant não existe ou está inativo
+        """
         if not tenant:
             # Se não encontrou tenant, redireciona para página de erro ou landing
             if self._is_api_request(request):
@@ -53,26 +80,29 @@ class TenantMiddleware(MiddlewareMixin):
                 # Redireciona para página de tenant suspenso
                 return HttpResponseRedirect(reverse('tenant_suspended'))
         
-        # Configurar tenant na requisição e thread local
+        return None
+    
+    def _activate_tenant(self, request, tenant):
+        """
+        Configura o tenant na requisição e no contexto atual; retorna os tokens dos ContextVars
+        """
         request.tenant = tenant
-        set_current_tenant(tenant)
-        
-        # Adicionar informações do tenant no contexto
-        request.tenant_context = {
-            'name': tenant.name,
-            'slug': tenant.slug,
-            'logo': tenant.logo.url if tenant.logo else None,
-            'primary_color': tenant.primary_color,
-            'secondary_color': tenant.secondary_color,
-            'enabled_modules': tenant.enabled_modules,
-        }
+        tenant_token = set_current_tenant(tenant)
+        
+        # Bundles de configuração memorizados até o fim da requisição
+        settings_token = begin_settings_scope()
+        
+        # Contexto pré-calculado no snapshot (inclui a URL do logo)
+        request.tenant_context = tenant.context
         
         # Log da atividade
         logger.debug(f"Tenant set: {tenant.name} ({tenant.slug})")
+        
+        return tenant_token, settings_token
     
-    def process_response(self, request, response):
+    def _add_tenant_headers(self, request, response):
         """
-        Processa a resposta para adicionar headers específicos do tenant
+        Adiciona headers específicos do tenant
         """
         if hasattr(request, 'tenant'):
             # Adicionar headers customizados
@@ -100,53 +130,48 @@ class TenantMiddleware(MiddlewareMixin):
         """
         Obtém o tenant baseado na requisição
         """
-        # Cache key baseado no host
+        # Resolução pela tabela de roteamento em memória do processo;
+        # o cache só é consultado periodicamente para verificar a versão
         host = request.get_host().lower()
-        cache_key = f"tenant_domain:{host}"
-        
-        # Tentar obter do cache primeiro
-        tenant = cache.get(cache_key)
-        if tenant:
-            return tenant
-        
-        try:
-            # Buscar por domínio exato
-            domain = TenantDomain.objects.select_related('tenant').get(
-                domain=host,
-                is_verified=True,
-                tenant__is_active=True
-            )
-            tenant = domain.tenant
-            
-        except TenantDomain.DoesNotExist:
-            # Tentar buscar por subdomínio
-            if '.' in host:
-                subdomain = host.split('.')[0]
-                try:
-                    tenant = Tenant.objects.get(
-                        slug=subdomain,
-                        is_active=True
-                    )
-                except Tenant.DoesNotExist:
-                    tenant = None
-            else:
-                tenant = None
-        
-        # Cachear resultado por 5 minutos
-        if tenant:
-            cache.set(cache_key, tenant, 300)
-        
-        return tenant
+        return tenant_routing_table.resolve(host)
     
     def _is_api_request(self, request):
         """
         Verifica se é uma requisição API
         """
-        return (
-            request.path.startswith('/api/') or
-            request.content_type == 'application/json' or
-            'application/json' in request.META.get('HTTP_ACCEPT', '')
-        )
+        return is_api_request(request)
+
+
+class AsyncTenantMiddleware(TenantMiddleware):
+    """
+    Variante assíncrona nativa do TenantMiddleware para ASGI.
+    
+    A resolução do host é feita em memória no event loop; somente a
+    verificação periódica da versão da tabela de roteamento (cache/banco)
+    vai para uma thread. O tenant fica em um ContextVar, isolado por
+    requisição mesmo com views assíncronas concorrentes.
+    """
+    
+    sync_capable = False
+    async_capable = True
+    
+    async def __acall__(self, request):
+        if tenant_routing_table.is_stale():
+            await sync_to_async(tenant_routing_table.refresh)()
+        tenant = tenant_routing_table.lookup(request.get_host().lower())
+        
+        response = self._check_tenant(request, tenant)
+        if response is not None:
+            return response
+        
+        tenant_token, settings_token = self._activate_tenant(request, tenant)
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_settings_scope(settings_token)
+            clear_current_tenant(tenant_token)
+        
+        return self._add_tenant_headers(request, response)
 
 
 class TenantDatabaseMiddleware(MiddlewareMixin):
@@ -171,38 +196,137 @@ class TenantSecurityMiddleware(MiddlewareMixin):
         if hasattr(request, 'tenant'):
             tenant = request.tenant
             
-            # Verificar configurações de segurança do tenant
-            settings = getattr(tenant, 'settings', None)
-            if settings:
+            # Configurações de segurança já carregadas no snapshot do tenant
+            if tenant.session_timeout_minutes is not None:
                 # Configurar timeout de sessão
-                if hasattr(settings, 'session_timeout_minutes'):
-                    request.session.set_expiry(settings.session_timeout_minutes * 60)
+                self._enforce_session_timeout(request, tenant.session_timeout_minutes * 60)
+            
+            # Verificar autenticação de dois fatores obrigatória
+            if (tenant.two_factor_required and 
+                request.user.is_authenticated and 
+                not getattr(request.user, 'has_2fa_enabled', False)):
                 
-                # Verificar autenticação de dois fatores obrigatória
-                if (settings.two_factor_required and 
-                    request.user.is_authenticated and 
-                    not getattr(request.user, 'has_2fa_enabled', False)):
-                    
-                    # Redirecionar para configuração 2FA se necessário
-                    if not request.path.startswith('/auth/2fa/'):
-                        return HttpResponseRedirect(reverse('setup_2fa'))
-
-
-# Funções utilitárias para thread local storage
-def set_current_tenant(tenant):
-    """Define o tenant atual no thread local"""
-    _thread_locals.tenant = tenant
+                # Redirecionar para configuração 2FA se necessário
+                if not request.path.startswith('/auth/2fa/'):
+                    return HttpResponseRedirect(reverse('setup_2fa'))
+    
+    def _enforce_session_timeout(self, request, timeout):
+        """
+        Aplica o timeout de inatividade sem gravar a sessão a cada requisição.
+        
+        set_expiry() só é chamado quando o valor muda; a atividade é registrada
+        em um timestamp atualizado no máximo uma vez por SESSION_REFRESH_WINDOW
+        segundos, e é essa gravação que renova a expiração no session store.
+        """
+        session = getattr(request, 'session', None)
+        if session is None or session.is_empty():
+            # Sessões anônimas não são criadas só para controlar timeout
+            return
+        
+        now = int(time.time())
+        last_seen = session.get(SESSION_LAST_SEEN_KEY)
+        
+        if last_seen is not None and now - last_seen > timeout:
+            logger.info(f"Session expired by tenant timeout ({timeout}s)")
+            session.flush()
+            return
+        
+        if session.get('_session_expiry') != timeout:
+            session.set_expiry(timeout)
+        
+        window = min(getattr(settings, 'SESSION_REFRESH_WINDOW', 300), timeout // 2)
+        if last_seen is None or now - last_seen >= window:
+            session[SESSION_LAST_SEEN_KEY] = now
 
 
-def get_current_tenant():
-    """Obtém o tenant atual do thread local"""
-    return getattr(_thread_locals, 'tenant', None)
+class TenantSessionMiddleware(SessionMiddleware):
+    """
+    SessionMiddleware que pode usar outro backend para requisições de API.
+    
+    Com API_SESSION_ENGINE definido (por exemplo
+    'django.contrib.sessions.backends.signed_cookies' ou
+    'django.contrib.sessions.backends.cache'), o tráfego de API não lê nem
+    grava sessões no banco. As sessões de API usam um cookie próprio
+    (API_SESSION_COOKIE_NAME): o cookie de sessão das páginas, do outro
+    backend, nunca é lido nem sobrescrito por uma chamada de API.
+    """
+    
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        engine = getattr(settings, 'API_SESSION_ENGINE', None)
+        self.ApiSessionStore = import_module(engine).SessionStore if engine else None
+        self.api_cookie_name = getattr(settings, 'API_SESSION_COOKIE_NAME', 'api_sessionid')
+    
+    def process_request(self, request):
+        if self.ApiSessionStore is not None and is_api_request(request):
+            request._api_session = True
+            request.session = self.ApiSessionStore(request.COOKIES.get(self.api_cookie_name))
+        else:
+            super().process_request(request)
+    
+    def process_response(self, request, response):
+        if not getattr(request, '_api_session', False):
+            return super().process_response(request, response)
+        return self._save_api_session(request, response)
+    
+    def _save_api_session(self, request, response):
+        """
+        SessionMiddleware.process_response com o cookie de API
+        """
+        try:
+            accessed = request.session.accessed
+            modified = request.session.modified
+            empty = request.session.is_empty()
+        except AttributeError:
+            return response
+        
+        if self.api_cookie_name in request.COOKIES and empty:
+            response.delete_cookie(
+                self.api_cookie_name,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        
+        if accessed:
+            patch_vary_headers(response, ('Cookie',))
+        if (modified or settings.SESSION_SAVE_EVERY_REQUEST) and not empty and response.status_code < 500:
+            if request.session.get_expire_at_browser_close():
+                max_age = expires = None
+            else:
+                max_age = request.session.get_expiry_age()
+                expires = http_date(time.time() + max_age)
+            try:
+                request.session.save()
+            except UpdateError:
+                raise SessionInterrupted(
+                    "The request's session was deleted before the request completed."
+                )
+            response.set_cookie(
+                self.api_cookie_name,
+                request.session.session_key,
+                max_age=max_age,
+                expires=expires,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                path=settings.SESSION_COOKIE_PATH,
+                secure=settings.SESSION_COOKIE_SECURE or None,
+                httponly=settings.SESSION_COOKIE_HTTPONLY or None,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
 
 
-def clear_current_tenant():
-    """Limpa o tenant atual do thread local"""
-    if hasattr(_thread_locals, 'tenant'):
-        del _thread_locals.tenant
+def is_api_request(request):
+    """
+    Verifica se é uma requisição API
+    """
+    return (
+        request.path.startswith('/api/') or
+        request.content_type == 'application/json' or
+        'application/json' in request.META.get('HTTP_ACCEPT', '')
+    )
 
 
 # Decorator para views que requerem tenant
@@ -4,6 +4,7 @@ from django.utils.translation import gettext_lazy as _
 from django.core.validators import RegexValidator, URLValidator
 from django.contrib.postgres.fields import ArrayField
 from apps.core.models import BaseModel, Address, Phone, Document
+from shared.services.storage import TenantUploadTo, tenant_file_storage
 import uuid
 
 
@@ -68,7 +69,12 @@ class Tenant(BaseModel):
     max_storage_gb = models.PositiveIntegerField(_('Máximo de Storage (GB)'), default=5)
     
     # Customização
-    logo = models.ImageField(_('Logo'), upload_to='tenant_logos/', blank=True)
+    logo = models.ImageField(
+        _('Logo'),
+        upload_to=TenantUploadTo('tenant_logos/'),
+        storage=tenant_file_storage,
+        blank=True
+    )
     primary_color = models.CharField(
         _('Cor Primária'),
         max_length=7,
@@ -133,23 +139,15 @@ class Tenant(BaseModel):
         return self.domains.filter(is_primary=True).first()
     
     def get_current_usage(self):
-        """Retorna o uso atual de recursos"""
-        from apps.users.models import User
-        from apps.patients.models import Patient
-        
-        return {
-            'users': User.objects.filter(tenant=self).count(),
-            'patients': Patient.objects.filter(tenant=self).count(),
-            'storage_gb': 0,  # TODO: Implementar cálculo de storage
-        }
+        """Retorna o uso atual de recursos (lido do TenantUsage)"""
+        from apps.tenants.utils import get_tenant_usage
+        return get_tenant_usage(self)
     
     def check_limits(self, resource_type, additional=1):
         """Verifica se está dentro dos limites"""
-        usage = self.get_current_usage()
-        current = usage.get(resource_type, 0)
-        limit = getattr(self, f'max_{resource_type}', 0)
-        
-        return (current + additional) <= limit
+        from apps.tenants.utils import check_tenant_limits
+        allowed, _ = check_tenant_limits(self, resource_type, additional)
+        return allowed
 
 
 class TenantDomain(BaseModel):
@@ -185,6 +183,29 @@ class TenantDomain(BaseModel):
         super().save(*args, **kwargs)
 
 
+class TenantUsage(BaseModel):
+    """
+    Contadores de uso de recursos do tenant, mantidos incrementalmente
+    """
+    tenant = models.OneToOneField(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='usage'
+    )
+    users_count = models.PositiveIntegerField(_('Usuários'), default=0)
+    patients_count = models.PositiveIntegerField(_('Pacientes'), default=0)
+    storage_bytes = models.BigIntegerField(_('Storage (bytes)'), default=0)
+    reconciled_at = models.DateTimeField(_('Reconciliado em'), null=True, blank=True)
+    storage_reconciled_at = models.DateTimeField(_('Storage Reconciliado em'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Uso do Tenant')
+        verbose_name_plural = _('Uso dos Tenants')
+    
+    def __str__(self):
+        return f"Uso - {self.tenant_id}"
+
+
 class TenantAddress(Address):
     """
     Endereços dos tenants
@@ -297,6 +318,11 @@ class TenantSettings(BaseModel):
     auto_backup = models.BooleanField(_('Backup Automático'), default=True)
     backup_frequency_days = models.PositiveIntegerField(_('Frequência de Backup (dias)'), default=7)
     backup_retention_days = models.PositiveIntegerField(_('Retenção de Backup (dias)'), default=90)
+    deleted_retention_days = models.PositiveIntegerField(
+        _('Retenção de Registros Excluídos (dias)'),
+        default=30,
+        help_text=_('Registros excluídos são removidos definitivamente após este prazo')
+    )
     
     class Meta:
         verbose_name = _('Configurações do Tenant')
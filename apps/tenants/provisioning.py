@@ -0,0 +1,208 @@
+# apps/tenants/provisioning.py
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from apps.tenants.utils import create_tenant_with_defaults, tenant_schema_name
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Schema totalmente migrado usado como modelo para novos tenants
+TEMPLATE_SCHEMA = getattr(settings, 'TENANT_TEMPLATE_SCHEMA', '_tenant_template')
+
+
+def schema_exists(schema_name):
+    """
+    Verifica se o schema existe no banco
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS(SELECT 1 FROM pg_namespace WHERE nspname = %s)',
+            [schema_name]
+        )
+        return cursor.fetchone()[0]
+
+
+def template_is_behind():
+    """
+    Indica se o schema modelo tem migrações pendentes
+    """
+    from django.db.migrations.executor import MigrationExecutor
+    
+    previous_schema = getattr(connection, 'schema_name', None)
+    connection.set_schema(TEMPLATE_SCHEMA)
+    try:
+        executor = MigrationExecutor(connection)
+        return bool(executor.migration_plan(executor.loader.graph.leaf_nodes()))
+    finally:
+        if previous_schema:
+            connection.set_schema(previous_schema)
+        else:
+            connection.set_schema_to_public()
+
+
+def ensure_template_schema():
+    """
+    Cria e/ou migra o schema modelo para refletir as migrações atuais
+    """
+    if not schema_exists(TEMPLATE_SCHEMA):
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE SCHEMA {connection.ops.quote_name(TEMPLATE_SCHEMA)}')
+    elif not template_is_behind():
+        return False
+    
+    started = time.monotonic()
+    call_command('migrate_schemas', schema_name=TEMPLATE_SCHEMA, interactive=False, verbosity=0)
+    logger.info(f"Template schema {TEMPLATE_SCHEMA} migrated in {time.monotonic() - started:.1f}s")
+    return True
+
+
+def clone_schema(source, target):
+    """
+    Copia estrutura e dados do schema `source` para o novo schema `target`.
+    
+    Tabelas são recriadas com CREATE TABLE ... (LIKE ... INCLUDING ALL)
+    (colunas, defaults, identity, checks e índices); sequências de colunas
+    serial e chaves estrangeiras são recriadas apontando para o novo schema.
+    Os dados do modelo (django_migrations, contenttypes, permissões) são
+    copiados com INSERT ... SELECT. Tudo roda em uma única transação.
+    """
+    qn = connection.ops.quote_name
+    
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA {qn(target)}')
+        
+        # Sequências (colunas serial legadas; colunas identity vêm com o LIKE)
+        cursor.execute(
+            """
+            SELECT c.relname
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relkind = 'S'
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_depend d
+                  WHERE d.objid = c.oid AND d.deptype = 'i'
+              )
+            """,
+            [source]
+        )
+        sequences = [row[0] for row in cursor.fetchall()]
+        for sequence in sequences:
+            cursor.execute(f'CREATE SEQUENCE {qn(target)}.{qn(sequence)}')
+        
+        cursor.execute(
+            "SELECT tablename FROM pg_tables WHERE schemaname = %s ORDER BY tablename",
+            [source]
+        )
+        tables = [row[0] for row in cursor.fetchall()]
+        
+        for table in tables:
+            cursor.execute(
+                f'CREATE TABLE {qn(target)}.{qn(table)} '
+                f'(LIKE {qn(source)}.{qn(table)} INCLUDING ALL)'
+            )
+        
+        # Defaults que ainda apontam para sequências do schema modelo
+        cursor.execute(
+            """
+            SELECT table_name, column_name, column_default
+            FROM information_schema.columns
+            WHERE table_schema = %s AND column_default LIKE 'nextval(%%'
+            """,
+            [target]
+        )
+        for table, column, default in cursor.fetchall():
+            new_default = _retarget(default, source, target)
+            cursor.execute(
+                f'ALTER TABLE {qn(target)}.{qn(table)} '
+                f'ALTER COLUMN {qn(column)} SET DEFAULT {new_default}'
+            )
+        
+        for table in tables:
+            cursor.execute(
+                f'INSERT INTO {qn(target)}.{qn(table)} SELECT * FROM {qn(source)}.{qn(table)}'
+            )
+        
+        for sequence in sequences:
+            cursor.execute(
+                'SELECT setval(%s, (SELECT last_value FROM ' +
+                f'{qn(source)}.{qn(sequence)}), true)',
+                [f'{qn(target)}.{qn(sequence)}']
+            )
+        
+        # Sequências das colunas identity acompanham os dados copiados
+        cursor.execute(
+            """
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = %s AND is_identity = 'YES'
+            """,
+            [target]
+        )
+        for table, column in cursor.fetchall():
+            cursor.execute(
+                f'SELECT setval(pg_get_serial_sequence(%s, %s), '
+                f'COALESCE((SELECT MAX({qn(column)}) FROM {qn(target)}.{qn(table)}), 0) + 1, false)',
+                [f'{qn(target)}.{qn(table)}', column]
+            )
+        
+        # Chaves estrangeiras, com nomes totalmente qualificados
+        cursor.execute('SET LOCAL search_path TO pg_catalog')
+        cursor.execute(
+            """
+            SELECT cl.relname, con.conname, pg_get_constraintdef(con.oid)
+            FROM pg_constraint con
+            JOIN pg_class cl ON cl.oid = con.conrelid
+            JOIN pg_namespace n ON n.oid = cl.relnamespace
+            WHERE n.nspname = %s AND con.contype = 'f'
+            """,
+            [source]
+        )
+        for table, name, definition in cursor.fetchall():
+            cursor.execute(
+                f'ALTER TABLE {qn(target)}.{qn(table)} '
+                f'ADD CONSTRAINT {qn(name)} {_retarget(definition, source, target)}'
+            )
+
+
+def _retarget(sql, source, target):
+    """
+    Troca referências qualificadas ao schema de origem pelo schema de destino
+    """
+    qn = connection.ops.quote_name
+    return sql.replace(f'{qn(source)}.', f'{qn(target)}.').replace(f'{source}.', f'{target}.')
+
+
+def provision_tenant(name, slug=None, admin_email=None, **kwargs):
+    """
+    Cria um tenant clonando o schema modelo em vez de rodar as migrações
+    """
+    return provision_tenants([dict(name=name, slug=slug, admin_email=admin_email, **kwargs)])[0]
+
+
+def provision_tenants(specs):
+    """
+    Provisiona vários tenants em uma chamada.
+    
+    `specs` é uma lista de dicionários com os argumentos de
+    create_tenant_with_defaults. O schema modelo é verificado uma única vez
+    e cada tenant é criado (linhas + schema clonado) na sua própria
+    transação, então uma falha não desfaz os tenants anteriores.
+    """
+    ensure_template_schema()
+    
+    tenants = []
+    for spec in specs:
+        started = time.monotonic()
+        with transaction.atomic():
+            tenant = create_tenant_with_defaults(**spec)
+            clone_schema(TEMPLATE_SCHEMA, tenant_schema_name(tenant))
+        
+        logger.info(
+            f"Tenant provisioned from template: {tenant.slug} "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+        tenants.append(tenant)
+    
+    return tenants
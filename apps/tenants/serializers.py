@@ -1,6 +1,7 @@
 # apps/tenants/serializers.py
 from rest_framework import serializers
 from .models import Tenant, TenantConfiguration
+from .utils import get_tenant_usage
 
 
 class TenantSerializer(serializers.ModelSerializer):
@@ -18,7 +19,7 @@ class TenantSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'usage_stats']
     
     def get_usage_stats(self, obj):
-        return obj.get_usage_stats()
+        return get_tenant_usage(obj)
 
 
 class TenantConfigurationSerializer(serializers.ModelSerializer):
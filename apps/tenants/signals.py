@@ -0,0 +1,122 @@
+# apps/tenants/signals.py
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from apps.core.models import Configuration
+from apps.tenants.context import get_current_tenant
+from apps.tenants.models import Tenant, TenantDomain, TenantSettings
+from apps.tenants.utils import (
+    bump_routing_version, invalidate_tenant_cache, adjust_tenant_usage, tenant_from_connection
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Modelos contabilizados no TenantUsage
+USAGE_RESOURCES = {
+    'users.User': 'users',
+    'patients.Patient': 'patients',
+}
+
+
+@receiver(post_save, sender=TenantDomain)
+@receiver(post_delete, sender=TenantDomain)
+def invalidate_tenant_routing(sender, instance, **kwargs):
+    """
+    Invalida a tabela de roteamento quando domínios mudam
+    """
+    # Só após o commit, para que outros processos não reconstruam a tabela com dados antigos
+    transaction.on_commit(bump_routing_version)
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+@receiver(post_save, sender=TenantSettings)
+@receiver(post_delete, sender=TenantSettings)
+@receiver(post_save, sender=Configuration)
+@receiver(post_delete, sender=Configuration)
+def invalidate_tenant_namespace(sender, instance, **kwargs):
+    """
+    Invalida o namespace de cache do tenant (bundle de configurações,
+    uso, módulos) e, se a mudança afeta os snapshots, a tabela de roteamento
+    """
+    tenant_id = instance.id if sender is Tenant else instance.tenant_id
+    # Configuration não entra no snapshot: basta a geração do tenant
+    routing = sender is not Configuration
+    transaction.on_commit(lambda: invalidate_tenant_cache(tenant_id, routing=routing))
+
+
+def _usage_tenant_id(instance):
+    """
+    Tenant ao qual a instância pertence: campo tenant, tenant atual ou,
+    fora de requisições (Celery, scripts), o schema ativo na conexão
+    """
+    tenant_id = getattr(instance, 'tenant_id', None)
+    if tenant_id is None:
+        tenant_id = getattr(get_current_tenant(), 'id', None)
+    if tenant_id is None:
+        tenant_id = getattr(tenant_from_connection(), 'id', None)
+    if tenant_id is None:
+        logger.warning(
+            f"Tenant usage not updated for {instance._meta.label} {instance.pk}: no tenant resolved"
+        )
+    return tenant_id
+
+
+@receiver(pre_save, sender='users.User')
+@receiver(pre_save, sender='patients.Patient')
+def track_usage_state(sender, instance, update_fields=None, **kwargs):
+    """
+    Guarda o valor anterior de is_active para detectar soft delete e restauração
+    """
+    instance._usage_was_active = None
+    if instance._state.adding:
+        return
+    
+    try:
+        sender._meta.get_field('is_active')
+    except FieldDoesNotExist:
+        return
+    
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    
+    instance._usage_was_active = sender._base_manager.filter(
+        pk=instance.pk
+    ).values_list('is_active', flat=True).first()
+
+
+@receiver(post_save, sender='users.User')
+@receiver(post_save, sender='patients.Patient')
+def update_usage_on_save(sender, instance, created, **kwargs):
+    """
+    Atualiza o TenantUsage em criações, soft deletes e restaurações
+    """
+    tenant_id = _usage_tenant_id(instance)
+    if tenant_id is None:
+        return
+    
+    is_active = getattr(instance, 'is_active', True)
+    was_active = getattr(instance, '_usage_was_active', None)
+    
+    if created:
+        delta = 1 if is_active else 0
+    elif was_active is not None and was_active != is_active:
+        delta = 1 if is_active else -1
+    else:
+        delta = 0
+    
+    if delta:
+        adjust_tenant_usage(tenant_id, USAGE_RESOURCES[sender._meta.label], delta)
+
+
+@receiver(post_delete, sender='users.User')
+@receiver(post_delete, sender='patients.Patient')
+def update_usage_on_delete(sender, instance, **kwargs):
+    """
+    Atualiza o TenantUsage em exclusões definitivas
+    """
+    tenant_id = _usage_tenant_id(instance)
+    if tenant_id is not None and getattr(instance, 'is_active', True):
+        adjust_tenant_usage(tenant_id, USAGE_RESOURCES[sender._meta.label], -1)
@@ -0,0 +1,103 @@
+# apps/tenants/tasks.py
+from celery import shared_task
+from apps.tenants.models import Tenant
+from apps.tenants.utils import reconcile_tenant_usage
+from shared.services.storage import reconcile_tenant_storage
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_tenant_usage_task(tenant_id=None):
+    """
+    Reconcilia os contadores do TenantUsage com as contagens reais do banco
+    """
+    tenants = Tenant.objects.filter(is_active=True)
+    if tenant_id:
+        tenants = Tenant.objects.filter(pk=tenant_id)
+    
+    reconciled = 0
+    for tenant in tenants.iterator():
+        try:
+            reconcile_tenant_usage(tenant)
+            reconciled += 1
+        except Exception as e:
+            logger.error(f"Error reconciling usage for tenant {tenant.id}: {str(e)}")
+    
+    logger.info(f"Tenant usage reconciled for {reconciled} tenants")
+    return reconciled
+
+
+@shared_task
+def reconcile_tenant_storage_task(tenant_id=None):
+    """
+    Reconcilia o ledger de storage listando os prefixos dos tenants em lotes
+    """
+    if tenant_id:
+        tenant_ids = [tenant_id]
+    else:
+        tenant_ids = Tenant.objects.filter(is_active=True).values_list('id', flat=True).iterator()
+    
+    reconciled = 0
+    for current_id in tenant_ids:
+        try:
+            reconcile_tenant_storage(current_id)
+            reconciled += 1
+        except Exception as e:
+            logger.error(f"Error reconciling storage for tenant {current_id}: {str(e)}")
+    
+    logger.info(f"Tenant storage reconciled for {reconciled} tenants")
+    return reconciled
+
+
+@shared_task
+def provision_tenants_task(specs):
+    """
+    Provisiona tenants a partir do schema modelo fora do worker web
+    """
+    from apps.tenants.provisioning import provision_tenants
+    
+    tenants = provision_tenants(specs)
+    return [str(tenant.id) for tenant in tenants]
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def export_tenant_data_task(self, tenant_id, export_id=None, compression='gzip'):
+    """
+    Exporta os dados do tenant em NDJSON comprimido.
+    
+    Em caso de falha a tarefa é reenfileirada com o mesmo export_id, e a
+    exportação continua a partir do manifesto em vez de recomeçar.
+    """
+    from apps.tenants.backup import TenantExporter
+    
+    tenant = Tenant.objects.get(id=tenant_id)
+    exporter = TenantExporter(tenant, export_id=export_id, compression=compression)
+    
+    try:
+        manifest = exporter.run()
+    except Exception as e:
+        logger.error(f"Error exporting tenant {tenant_id}: {str(e)}")
+        raise self.retry(exc=e, kwargs={
+            'tenant_id': tenant_id,
+            'export_id': exporter.export_id,
+            'compression': compression,
+        })
+    
+    return {
+        'export_id': manifest['export_id'],
+        'prefix': exporter.prefix,
+        'rows': sum(section['rows'] for section in manifest['sections']),
+    }
+
+
+@shared_task
+def import_tenant_data_task(prefix, slug=None, name=None, remap_ids=True):
+    """
+    Importa um pacote de exportação como um novo tenant fora do worker web
+    """
+    from apps.tenants.backup import import_tenant
+    
+    tenant = import_tenant(prefix, slug=slug, name=name, remap_ids=remap_ids)
+    return str(tenant.id)
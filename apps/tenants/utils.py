@@ -3,55 +3,380 @@ from django.core.cache import cache
 from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from apps.tenants.models import Tenant, TenantDomain
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from apps.core.models import LIVE_ROWS
+from apps.tenants.models import Tenant, TenantDomain, TenantSettings
+from apps.tenants.context import get_settings_bundles
+from contextlib import contextmanager
+from types import MappingProxyType
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import re
 import json
+import time
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Versão global da tabela de roteamento host -> tenant
+ROUTING_VERSION_KEY = 'tenant_routing:version'
+ROUTING_TABLE_KEY = 'tenant_routing:table'
+
+# Geração do namespace de cache de cada tenant
+TENANT_GENERATION_KEY = 'tenant_gen'
+
+# Campos do TenantUsage por tipo de recurso
+USAGE_FIELDS = {
+    'users': 'users_count',
+    'patients': 'patients_count',
+}
+
+GB = 1024 ** 3
+
+# Com a invalidação por geração os TTLs podem ser longos
+TENANT_CACHE_TIMEOUT = getattr(settings, 'TENANT_CACHE_TIMEOUT', 60 * 60 * 24)
+
 
 def get_tenant_from_request(request):
     """
-    Obtém o tenant a partir da requisição HTTP
+    Obtém o tenant (TenantSnapshot) a partir da requisição HTTP
     """
     host = request.get_host().lower()
+    return tenant_routing_table.resolve(host)
+
+
+class TenantSnapshot:
+    """
+    Representação compacta e imutável de um tenant para o caminho quente.
     
-    # Tentar cache primeiro
-    cache_key = f"tenant_lookup:{host}"
-    tenant = cache.get(cache_key)
-    if tenant:
-        return tenant
+    Guarda apenas os campos usados por requisição, com o contexto de template
+    e a URL do logo já calculados. Não substitui o modelo: para escrita ou
+    relacionamentos use get_model().
+    """
     
-    tenant = None
+    _fields = (
+        'id', 'name', 'slug', 'is_active', 'subscription_plan', 'subscription_status',
+        'max_users', 'max_patients', 'max_storage_gb',
+        'logo_url', 'primary_color', 'secondary_color', 'enabled_modules',
+        'timezone', 'language', 'currency',
+        'session_timeout_minutes', 'two_factor_required',
+    )
+    __slots__ = _fields + ('context',)
     
-    # 1. Buscar por domínio customizado
-    try:
-        domain = TenantDomain.objects.select_related('tenant').get(
-            domain=host,
-            is_verified=True,
-            tenant__is_active=True
+    def __init__(self, **fields):
+        for name in self._fields:
+            object.__setattr__(self, name, fields.get(name))
+        object.__setattr__(self, 'enabled_modules', tuple(self.enabled_modules or ()))
+        object.__setattr__(self, 'context', MappingProxyType({
+            'name': self.name,
+            'slug': self.slug,
+            'logo': self.logo_url,
+            'primary_color': self.primary_color,
+            'secondary_color': self.secondary_color,
+            'enabled_modules': self.enabled_modules,
+        }))
+    
+    @classmethod
+    def from_tenant(cls, tenant):
+        """
+        Cria o snapshot a partir do modelo Tenant (com settings já carregado, se possível)
+        """
+        try:
+            tenant_settings = tenant.settings
+        except TenantSettings.DoesNotExist:
+            tenant_settings = None
+        
+        return cls(
+            id=tenant.id,
+            name=tenant.name,
+            slug=tenant.slug,
+            is_active=tenant.is_active,
+            subscription_plan=tenant.subscription_plan,
+            subscription_status=tenant.subscription_status,
+            max_users=tenant.max_users,
+            max_patients=tenant.max_patients,
+            max_storage_gb=tenant.max_storage_gb,
+            # Calculado uma única vez: em storages remotos (S3) .url pode assinar a URL
+            logo_url=tenant.logo.url if tenant.logo else None,
+            primary_color=tenant.primary_color,
+            secondary_color=tenant.secondary_color,
+            enabled_modules=tenant.enabled_modules,
+            timezone=tenant.timezone,
+            language=tenant.language,
+            currency=tenant.currency,
+            session_timeout_minutes=getattr(tenant_settings, 'session_timeout_minutes', None),
+            two_factor_required=getattr(tenant_settings, 'two_factor_required', False),
         )
-        tenant = domain.tenant
-    except TenantDomain.DoesNotExist:
-        pass
     
-    # 2. Buscar por subdomínio
-    if not tenant and '.' in host:
-        subdomain = host.split('.')[0]
+    def __setattr__(self, name, value):
+        raise AttributeError('TenantSnapshot é imutável')
+    
+    def __delattr__(self, name):
+        raise AttributeError('TenantSnapshot é imutável')
+    
+    def __reduce__(self):
+        # O contexto (mappingproxy) não é serializável; é recriado no __init__
+        return (_restore_tenant_snapshot, ({name: getattr(self, name) for name in self._fields},))
+    
+    def __eq__(self, other):
+        return isinstance(other, TenantSnapshot) and other.id == self.id
+    
+    def __hash__(self):
+        return hash(self.id)
+    
+    def __str__(self):
+        return self.name
+    
+    def __repr__(self):
+        return f"<TenantSnapshot: {self.slug}>"
+    
+    @property
+    def pk(self):
+        return self.id
+    
+    @property
+    def is_trial(self):
+        return self.subscription_status == 'trial'
+    
+    @property
+    def is_subscription_active(self):
+        return self.subscription_status == 'active'
+    
+    def get_model(self):
+        """
+        Carrega a instância completa do Tenant (consulta ao banco)
+        """
+        return Tenant.objects.get(pk=self.id)
+    
+    def get_primary_domain(self):
+        return TenantDomain.objects.filter(tenant_id=self.id, is_primary=True).first()
+
+
+def _restore_tenant_snapshot(fields):
+    return TenantSnapshot(**fields)
+
+
+class TenantRoutingTable:
+    """
+    Tabela de roteamento host -> tenant mantida em memória em cada processo.
+    
+    É construída a partir de TenantDomain (domínios verificados) e de
+    Tenant.slug (subdomínios), com entradas negativas para hosts desconhecidos.
+    A tabela é versionada: a versão fica no cache compartilhado e só é
+    consultada a cada TENANT_ROUTING_CHECK_INTERVAL segundos, de modo que a
+    resolução usual acontece sem nenhum I/O de rede.
+    
+    Os tenants são guardados como TenantSnapshot. A tabela de cada versão é
+    publicada no cache como um único blob (ROUTING_TABLE_KEY), então apenas o
+    primeiro processo a ver uma versão nova consulta o banco.
+    """
+    
+    def __init__(self, check_interval=None, max_hosts=None, max_age=None):
+        self.check_interval = (
+            check_interval if check_interval is not None
+            else getattr(settings, 'TENANT_ROUTING_CHECK_INTERVAL', 5)
+        )
+        self.max_hosts = (
+            max_hosts if max_hosts is not None
+            else getattr(settings, 'TENANT_ROUTING_MAX_HOSTS', 10000)
+        )
+        # Idade máxima da tabela: mantém as URLs pré-calculadas dos logos
+        # abaixo da expiração de URLs assinadas (AWS_QUERYSTRING_EXPIRE)
+        self.max_age = (
+            max_age if max_age is not None
+            else getattr(settings, 'TENANT_ROUTING_MAX_AGE', 1800)
+        )
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._domains = {}
+        self._slugs = {}
+        self._hosts = {}
+        self._version = None
+        self._checked_at = None
+        self._built_at = None
+    
+    def resolve(self, host):
+        """
+        Resolve o host para um TenantSnapshot (ou None), reconstruindo a tabela se necessário
+        """
+        if self.is_stale():
+            self.refresh()
+        return self.lookup(host)
+    
+    def lookup(self, host):
+        """
+        Consulta apenas a memória local, sem verificar a versão
+        """
         try:
-            tenant = Tenant.objects.get(
-                slug=subdomain,
-                is_active=True
-            )
-        except Tenant.DoesNotExist:
+            return self._hosts[host]
+        except KeyError:
             pass
+        
+        # 1. Domínio exato, 2. subdomínio pelo slug
+        tenant = self._domains.get(host)
+        if tenant is None and '.' in host:
+            tenant = self._slugs.get(host.split('.')[0])
+        
+        # Hosts desconhecidos também são memorizados (entrada negativa),
+        # limitados para que bots com subdomínios aleatórios não esgotem a memória
+        if tenant is not None or len(self._hosts) < self.max_hosts:
+            self._hosts[host] = tenant
+        
+        return tenant
     
-    # Cache por 5 minutos
-    if tenant:
-        cache.set(cache_key, tenant, 300)
+    def is_stale(self):
+        """
+        Indica se o intervalo de verificação da versão já expirou
+        """
+        return (
+            self._checked_at is None or
+            time.monotonic() - self._checked_at >= self.check_interval
+        )
     
-    return tenant
+    def refresh(self, force=False):
+        """
+        Compara a versão local com a do cache e reconstrói a tabela se mudou
+        """
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            
+            now = time.monotonic()
+            expired = self._built_at is None or now - self._built_at >= self.max_age
+            version = get_routing_version()
+            if force or expired or version != self._version:
+                self._load(version, from_cache=not (force or expired))
+                self._version = version
+                self._built_at = now
+            self._checked_at = now
+    
+    def _load(self, version, from_cache=True):
+        """
+        Carrega a tabela da versão informada do cache, ou do banco se ausente
+        """
+        cache_key = f"{ROUTING_TABLE_KEY}:{version}"
+        data = cache.get(cache_key) if from_cache else None
+        if data is None:
+            data = self._build()
+            cache.set(cache_key, data, self.max_age)
+        
+        tenants, domains = data
+        by_id = {tenant.id: tenant for tenant in tenants}
+        
+        # Troca atômica das referências; leitores concorrentes veem a tabela antiga ou a nova
+        self._by_id = by_id
+        self._domains = {domain: by_id[tenant_id] for domain, tenant_id in domains.items()}
+        self._slugs = {tenant.slug: tenant for tenant in tenants}
+        self._hosts = {}
+    
+    def _build(self):
+        """
+        Carrega tenants ativos e domínios verificados do banco (duas consultas)
+        """
+        tenants = [
+            TenantSnapshot.from_tenant(tenant)
+            for tenant in Tenant.objects.filter(is_active=True).select_related('settings')
+        ]
+        active_ids = {tenant.id for tenant in tenants}
+        
+        domains = {}
+        verified = TenantDomain.objects.filter(
+            is_verified=True,
+            tenant__is_active=True
+        ).values_list('domain', 'tenant_id')
+        for domain, tenant_id in verified:
+            if tenant_id in active_ids:
+                domains[domain.lower()] = tenant_id
+        
+        logger.debug(f"Tenant routing table rebuilt: {len(domains)} domains, {len(tenants)} tenants")
+        
+        return tenants, domains
+    
+    def get(self, tenant_id):
+        """
+        Obtém o snapshot de um tenant pelo id, se ativo
+        """
+        if self.is_stale():
+            self.refresh()
+        return self._by_id.get(tenant_id)
+    
+    def clear(self):
+        """
+        Descarta a tabela local, forçando reconstrução na próxima resolução
+        """
+        with self._lock:
+            self._by_id = {}
+            self._domains = {}
+            self._slugs = {}
+            self._hosts = {}
+            self._version = None
+            self._checked_at = None
+            self._built_at = None
+
+
+# Tabela compartilhada por todas as requisições do processo
+tenant_routing_table = TenantRoutingTable()
+
+
+def _get_counter(key):
+    """
+    Obtém um contador de versão do cache, criando-o se necessário
+    """
+    value = cache.get(key)
+    if value is None:
+        # Valor inicial baseado no relógio para que uma chave despejada do
+        # cache nunca volte a uma versão já vista pelos processos
+        cache.add(key, int(time.time() * 1000), None)
+        value = cache.get(key)
+    return value
+
+
+def _incr_counter(key):
+    """
+    Incrementa um contador de versão do cache
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        _get_counter(key)
+        return cache.incr(key)
+
+
+def get_routing_version():
+    """
+    Obtém a versão atual da tabela de roteamento
+    """
+    return _get_counter(ROUTING_VERSION_KEY)
+
+
+def bump_routing_version():
+    """
+    Incrementa a versão da tabela de roteamento, invalidando-a em todos os processos
+    """
+    _incr_counter(ROUTING_VERSION_KEY)
+
+
+def get_tenant_generation(tenant):
+    """
+    Obtém a geração atual do namespace de cache do tenant
+    """
+    tenant_id = getattr(tenant, 'id', tenant)
+    return _get_counter(f"{TENANT_GENERATION_KEY}:{tenant_id}")
+
+
+def tenant_cache_key(tenant, name):
+    """
+    Monta uma chave de cache no namespace versionado do tenant.
+    
+    Toda chave com escopo de tenant deve passar por aqui: a geração embutida
+    na chave faz com que invalidate_tenant_cache descarte todas de uma vez,
+    sem varrer chaves; as entradas antigas apenas expiram pelo TTL.
+    """
+    tenant_id = getattr(tenant, 'id', tenant)
+    generation = get_tenant_generation(tenant_id)
+    return f"tenant:{tenant_id}:{generation}:{name}"
 
 
 def validate_tenant_slug(slug):
@@ -137,81 +462,278 @@ def check_tenant_limits(tenant, resource_type, additional=1):
 
 def get_tenant_usage(tenant):
     """
-    Obtém o uso atual de recursos do tenant
+    Obtém o uso atual de recursos do tenant a partir do TenantUsage (uma linha)
+    """
+    from apps.tenants.models import TenantUsage
+    
+    tenant_id = getattr(tenant, 'id', tenant)
+    ledger = TenantUsage.objects.filter(tenant_id=tenant_id).values(
+        'users_count', 'patients_count', 'storage_bytes'
+    ).first()
+    
+    if ledger is None:
+        # Primeiro acesso: o registro é criado a partir das contagens reais
+        ledger = reconcile_tenant_usage(tenant)
+        ledger = {
+            'users_count': ledger.users_count,
+            'patients_count': ledger.patients_count,
+            'storage_bytes': ledger.storage_bytes,
+        }
+    
+    return {
+        'users': ledger['users_count'],
+        'patients': ledger['patients_count'],
+        'storage_gb': bytes_to_gb(ledger['storage_bytes']),
+    }
+
+
+def adjust_tenant_usage(tenant, resource_type, delta):
+    """
+    Aplica um delta ao contador de uso do tenant.
+    
+    Executa um UPDATE atômico na mesma transação da alteração que o originou;
+    se o registro ainda não existir ele é criado já com as contagens reais.
+    """
+    from apps.tenants.models import TenantUsage
+    
+    tenant_id = getattr(tenant, 'id', tenant)
+    field = USAGE_FIELDS[resource_type]
+    
+    updated = TenantUsage.objects.filter(tenant_id=tenant_id).update(**{
+        field: Greatest(F(field) + delta, 0),
+        'updated_at': timezone.now(),
+    })
+    if not updated:
+        reconcile_tenant_usage(tenant)
+
+
+def reconcile_tenant_usage(tenant):
+    """
+    Recalcula os contadores do tenant a partir do banco (COUNT).
+    
+    Usuários e pacientes ficam no schema do tenant (TENANT_APPS), então a
+    contagem é feita com o schema dele ativo.
     """
-    cache_key = f"tenant_usage:{tenant.id}"
-    usage = cache.get(cache_key)
+    from apps.tenants.models import TenantUsage
+    from apps.users.models import User
+    from apps.patients.models import Patient
+    
+    if not isinstance(tenant, Tenant):
+        tenant = Tenant.objects.get(pk=tenant)
     
-    if not usage:
-        # Calcular uso atual
-        from apps.users.models import User
-        from apps.patients.models import Patient
+    with transaction.atomic():
+        # O lock na linha serializa a reconciliação com os deltas concorrentes
+        ledger, _ = TenantUsage.objects.select_for_update().get_or_create(tenant_id=tenant.id)
         
-        usage = {
-            'users': User.objects.filter(tenant=tenant, is_active=True).count(),
-            'patients': Patient.objects.filter(tenant=tenant, is_active=True).count(),
-            'storage_gb': calculate_tenant_storage(tenant),
+        with tenant_schema(tenant):
+            counts = {
+                'users_count': User.objects.filter(is_active=True).count(),
+                'patients_count': Patient.objects.count(),
+            }
+        drift = {
+            field: value - getattr(ledger, field)
+            for field, value in counts.items()
+            if value != getattr(ledger, field)
         }
+        if drift:
+            logger.warning(f"Tenant usage drift for {tenant.id}: {drift}")
         
-        # Cache por 10 minutos
-        cache.set(cache_key, usage, 600)
+        for field, value in counts.items():
+            setattr(ledger, field, value)
+        ledger.reconciled_at = timezone.now()
+        ledger.save()
     
-    return usage
+    return ledger
 
 
 def calculate_tenant_storage(tenant):
     """
-    Calcula o uso de storage do tenant em GB
+    Calcula o uso de storage do tenant em GB (lido do TenantUsage)
     """
-    # TODO: Implementar cálculo real de storage
-    # Por enquanto retorna 0
-    return 0
+    from apps.tenants.models import TenantUsage
+    
+    tenant_id = getattr(tenant, 'id', tenant)
+    storage_bytes = TenantUsage.objects.filter(tenant_id=tenant_id).values_list(
+        'storage_bytes', flat=True
+    ).first()
+    return bytes_to_gb(storage_bytes or 0)
 
 
-def invalidate_tenant_cache(tenant):
+def bytes_to_gb(size):
     """
-    Invalida todos os caches relacionados ao tenant
+    Converte bytes para GB
     """
-    cache_patterns = [
-        f"tenant_usage:{tenant.id}",
-        f"tenant_lookup:{tenant.slug}.*",
-        f"tenant_settings:{tenant.id}",
-        f"tenant_modules:{tenant.id}",
-    ]
+    return round(size / GB, 3)
+
+
+def reserve_tenant_storage(tenant, size):
+    """
+    Reserva bytes no ledger de storage respeitando max_storage_gb.
     
-    # Invalidar domínios associados
-    for domain in tenant.domains.all():
-        cache.delete(f"tenant_lookup:{domain.domain}")
+    O teste e o incremento acontecem no mesmo UPDATE condicional, então
+    uploads concorrentes não ultrapassam a cota. Retorna False se não couber.
+    """
+    from apps.tenants.models import TenantUsage
     
-    # Invalidar outros caches
-    for pattern in cache_patterns:
-        if '*' in pattern:
-            # Para padrões com wildcard, seria necessário usar Redis ou implementar lógica customizada
-            pass
-        else:
-            cache.delete(pattern)
+    tenant_id = getattr(tenant, 'id', tenant)
+    max_storage_gb = getattr(tenant, 'max_storage_gb', None)
+    if max_storage_gb is None:
+        # Só o id (ex.: extraído do caminho do arquivo): limite do snapshot
+        snapshot = tenant_routing_table.get(tenant_id)
+        max_storage_gb = snapshot.max_storage_gb if snapshot is not None else (
+            Tenant.objects.filter(pk=tenant_id).values_list('max_storage_gb', flat=True).get()
+        )
+    limit = max_storage_gb * GB
+    
+    for attempt in range(2):
+        updated = TenantUsage.objects.filter(
+            tenant_id=tenant_id,
+            storage_bytes__lte=limit - size
+        ).update(storage_bytes=F('storage_bytes') + size, updated_at=timezone.now())
+        if updated:
+            return True
+        
+        if attempt or TenantUsage.objects.filter(tenant_id=tenant_id).exists():
+            return False
+        # Sem registro ainda: cria já com as contagens reais e tenta novamente
+        reconcile_tenant_usage(tenant)
+    
+    return False
 
 
-def get_tenant_setting(tenant, key, default=None):
+def release_tenant_storage(tenant, size):
     """
-    Obtém uma configuração específica do tenant
+    Devolve bytes ao ledger de storage (exclusão ou upload que falhou)
     """
-    cache_key = f"tenant_setting:{tenant.id}:{key}"
-    value = cache.get(cache_key)
+    from apps.tenants.models import TenantUsage
     
-    if value is None:
-        from apps.core.models import Configuration
+    tenant_id = getattr(tenant, 'id', tenant)
+    TenantUsage.objects.filter(tenant_id=tenant_id).update(
+        storage_bytes=Greatest(F('storage_bytes') - size, 0),
+        updated_at=timezone.now()
+    )
+
+
+def invalidate_tenant_cache(tenant, routing=True):
+    """
+    Invalida todos os caches relacionados ao tenant.
+    
+    Com routing=False apenas o namespace do tenant é descartado: mudanças que
+    não afetam domínios nem snapshots (ex.: Configuration) não forçam todos
+    os processos a reconstruir a tabela de roteamento.
+    """
+    tenant_id = getattr(tenant, 'id', tenant)
+    
+    # Um único incremento descarta todas as chaves de tenant_cache_key (O(1))
+    _incr_counter(f"{TENANT_GENERATION_KEY}:{tenant_id}")
+    
+    # Domínios, subdomínios e snapshots são resolvidos pela tabela de roteamento
+    if routing:
+        bump_routing_version()
+
+
+class TenantSettingsBundle:
+    """
+    Todas as configurações de um tenant carregadas de uma vez.
+    
+    Reúne as linhas de Configuration (valores brutos e, quando válidos, já
+    convertidos de JSON no carregamento) e os campos de TenantSettings. É
+    guardado no cache como um único blob versionado e memorizado durante a
+    requisição, então ler várias configurações custa no máximo uma ida ao cache.
+    """
+    
+    __slots__ = ('tenant_id', 'values', 'json_values', 'settings')
+    
+    _missing = object()
+    
+    def __init__(self, tenant_id, values, settings=None):
+        self.tenant_id = tenant_id
+        self.values = values
+        self.settings = settings or {}
+        self.json_values = {}
+        for key, value in values.items():
+            try:
+                self.json_values[key] = json.loads(value)
+            except (json.JSONDecodeError, TypeError):
+                pass
+    
+    def __getstate__(self):
+        return (self.tenant_id, self.values, self.json_values, self.settings)
+    
+    def __setstate__(self, state):
+        self.tenant_id, self.values, self.json_values, self.settings = state
+    
+    def get(self, key, default=None):
+        """
+        Valor de Configuration, ou o campo de TenantSettings de mesmo nome
+        """
+        value = self.values.get(key, self._missing)
+        if value is self._missing:
+            value = self.settings.get(key, default)
+        return value
+    
+    def get_json(self, key, default=None):
+        """
+        Valor de Configuration convertido de JSON
+        """
+        return self.json_values.get(key, default)
+
+
+def load_tenant_settings_bundle(tenant):
+    """
+    Obtém o TenantSettingsBundle do tenant (memória da requisição, cache ou banco)
+    """
+    from apps.core.models import Configuration
+    
+    tenant_id = getattr(tenant, 'id', tenant)
+    
+    bundles = get_settings_bundles()
+    if bundles is not None and tenant_id in bundles:
+        return bundles[tenant_id]
+    
+    cache_key = tenant_cache_key(tenant_id, 'settings_bundle')
+    bundle = cache.get(cache_key)
+    
+    if bundle is None:
+        values = dict(
+            Configuration.objects.filter(tenant_id=tenant_id).values_list('key', 'value')
+        )
+        tenant_settings = TenantSettings.objects.filter(tenant_id=tenant_id).values().first() or {}
+        for field in ('id', 'tenant_id', 'created_at', 'updated_at', 'is_active', 'deleted_at'):
+            tenant_settings.pop(field, None)
         
-        try:
-            config = Configuration.objects.get(tenant=tenant, key=key)
-            value = config.value
-            
-            # Cache por 1 hora
-            cache.set(cache_key, value, 3600)
-        except Configuration.DoesNotExist:
-            value = default
+        bundle = TenantSettingsBundle(tenant_id, values, tenant_settings)
+        cache.set(cache_key, bundle, TENANT_CACHE_TIMEOUT)
     
-    return value
+    if bundles is not None:
+        bundles[tenant_id] = bundle
+    
+    return bundle
+
+
+def get_tenant_setting(tenant, key, default=None):
+    """
+    Obtém uma configuração específica do tenant
+    """
+    return load_tenant_settings_bundle(tenant).get(key, default)
+
+
+def tenant_timezone(tenant):
+    """
+    Fuso horário do tenant (Tenant.timezone) como ZoneInfo; o fuso padrão
+    do projeto se o tenant não tiver um válido
+    """
+    name = getattr(tenant, 'timezone', None)
+    if name is None:
+        tenant_id = getattr(tenant, 'id', tenant)
+        snapshot = tenant_routing_table.get(tenant_id)
+        name = snapshot.timezone if snapshot is not None else (
+            Tenant.objects.filter(pk=tenant_id).values_list('timezone', flat=True).first()
+        )
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return timezone.get_default_timezone()
 
 
 def set_tenant_setting(tenant, key, value, description=''):
@@ -221,7 +743,7 @@ def set_tenant_setting(tenant, key, value, description=''):
     from apps.core.models import Configuration
     
     config, created = Configuration.objects.get_or_create(
-        tenant=tenant,
+        tenant_id=tenant.id,
         key=key,
         defaults={'value': str(value), 'description': description}
     )
@@ -231,9 +753,11 @@ def set_tenant_setting(tenant, key, value, description=''):
         config.description = description
         config.save()
     
-    # Atualizar cache
-    cache_key = f"tenant_setting:{tenant.id}:{key}"
-    cache.set(cache_key, str(value), 3600)
+    # Descartar o bundle para que a próxima leitura o recarregue
+    cache.delete(tenant_cache_key(tenant, 'settings_bundle'))
+    bundles = get_settings_bundles()
+    if bundles:
+        bundles.pop(tenant.id, None)
     
     return config
 
@@ -252,16 +776,166 @@ def get_tenant_modules(tenant):
     """
     Retorna lista de módulos habilitados para o tenant
     """
-    cache_key = f"tenant_modules:{tenant.id}"
+    cache_key = tenant_cache_key(tenant, 'modules')
     modules = cache.get(cache_key)
     
     if modules is None:
-        modules = tenant.enabled_modules or []
-        cache.set(cache_key, modules, 3600)
+        modules = list(tenant.enabled_modules or [])
+        cache.set(cache_key, modules, TENANT_CACHE_TIMEOUT)
     
     return modules
 
 
+def tenant_schema_name(tenant):
+    """
+    Nome do schema Postgres do tenant (tenant_schemas)
+    """
+    schema_name = getattr(tenant, 'schema_name', None)
+    if schema_name:
+        return schema_name
+    return tenant.slug.replace('-', '_')
+
+
+@contextmanager
+def schema_context(schema_name):
+    """
+    Ativa o schema na conexão (tenant_schemas), se suportado, e restaura o
+    anterior na saída
+    """
+    if not schema_name or not hasattr(connection, 'set_schema'):
+        yield
+        return
+    
+    previous = getattr(connection, 'schema_name', None)
+    connection.set_schema(schema_name)
+    try:
+        yield
+    finally:
+        if previous:
+            connection.set_schema(previous)
+        else:
+            connection.set_schema_to_public()
+
+
+@contextmanager
+def tenant_schema(tenant):
+    """
+    Ativa o schema do tenant na conexão (tenant_schemas), se suportado
+    """
+    with schema_context(tenant_schema_name(tenant)):
+        yield
+
+
+# Assinaturas atendidas pelas tarefas periódicas (envios, lembretes)
+SERVING_SUBSCRIPTIONS = ('trial', 'active')
+
+# Último tenant visitado por cada tarefa que percorre os tenants
+TENANT_CURSOR_KEY = 'tenant_cursor'
+
+
+def serving_tenants(cursor=None, tenant_id=None):
+    """
+    Tenants ativos, com assinatura em trial ou ativa, em ordem de id
+    (só o `tenant_id`, se dado e ativo).
+    
+    Com `cursor` (nome da tarefa), a lista começa logo depois do último
+    tenant registrado em advance_tenant_cursor: uma execução interrompida
+    pelo prazo continua de onde parou na seguinte, em vez de recomeçar
+    sempre pelos mesmos tenants.
+    """
+    tenants = Tenant._base_manager.filter(LIVE_ROWS, subscription_status__in=SERVING_SUBSCRIPTIONS)
+    if tenant_id is not None:
+        tenants = tenants.filter(pk=tenant_id)
+    tenants = list(tenants.only('id', 'slug').order_by('id'))
+    if cursor is None or not tenants:
+        return tenants
+    
+    last = cache.get(f"{TENANT_CURSOR_KEY}:{cursor}")
+    if last is None:
+        return tenants
+    start = next((index for index, tenant in enumerate(tenants) if tenant.id > last), 0)
+    return tenants[start:] + tenants[:start]
+
+
+def advance_tenant_cursor(cursor, tenant):
+    """
+    Registra o tenant como o último visitado pela tarefa `cursor`
+    """
+    cache.set(f"{TENANT_CURSOR_KEY}:{cursor}", tenant.id, None)
+
+
+# Próximo vencimento do trabalho de cada tarefa por tenant
+TENANT_WORK_KEY = 'tenant_work'
+
+
+def _tenant_work_keys(task, tenant_id):
+    prefix = f"{TENANT_WORK_KEY}:{task}:{tenant_id}"
+    return f"{prefix}:version", f"{prefix}:due"
+
+
+def mark_tenant_work(task, tenant_id):
+    """
+    Avisa a tarefa, depois do commit, que o tenant ganhou trabalho: a marca
+    de vencimento gravada antes deixa de valer
+    """
+    version_key = _tenant_work_keys(task, tenant_id)[0]
+    transaction.on_commit(lambda: _incr_counter(version_key))
+
+
+def due_tenant_work(task, tenants, now):
+    """
+    Tenants com trabalho da tarefa vencido até `now`, com a versão lida
+    (para record_tenant_work).
+    
+    Uma única leitura (get_many) para todos os tenants. Sem marca, ou com
+    marca de uma versão anterior, o tenant é visitado.
+    """
+    keys = {tenant.id: _tenant_work_keys(task, tenant.id) for tenant in tenants}
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    
+    due = []
+    for tenant in tenants:
+        version_key, due_key = keys[tenant.id]
+        version = values.get(version_key)
+        mark = values.get(due_key)
+        if mark is None or mark[0] != version or (mark[1] is not None and mark[1] <= now):
+            due.append((tenant, version))
+    return due
+
+
+def record_tenant_work(task, tenant, version, next_due):
+    """
+    Grava o próximo vencimento (None: nada pendente) do trabalho do tenant,
+    calculado depois de lida a `version`: se o tenant ganhou trabalho no
+    meio tempo, a versão mudou e a marca é ignorada
+    """
+    cache.set(_tenant_work_keys(task, tenant.id)[1], (version, next_due), None)
+
+
+def tenant_from_connection():
+    """
+    Tenant do schema ativo na conexão, ou None no schema público
+    """
+    schema_name = getattr(connection, 'schema_name', None)
+    if not schema_name or schema_name == getattr(settings, 'PUBLIC_SCHEMA_NAME', 'public'):
+        return None
+    candidates = Tenant.objects.filter(slug__in={schema_name, schema_name.replace('_', '-')})
+    for tenant in candidates:
+        if tenant_schema_name(tenant) == schema_name:
+            return tenant
+    return None
+
+
+def tenant_app_labels():
+    """
+    Labels dos apps locais cujas tabelas ficam no schema de cada tenant
+    """
+    return {
+        app.split('.')[-1] for app in getattr(settings, 'TENANT_APPS', [])
+        if app.startswith('apps.')
+    }
+
+
 def tenant_url(tenant, path=''):
     """
     Gera URL completa para um tenant
@@ -331,23 +1005,14 @@ def create_tenant_with_defaults(name, slug=None, admin_email=None, **kwargs):
     return tenant
 
 
-def tenant_backup_data(tenant):
+def tenant_backup_data(tenant, export_id=None, compression='gzip'):
     """
-    Gera backup dos dados do tenant
+    Gera backup completo dos dados do tenant (NDJSON comprimido no storage
+    de exportações) e retorna o manifesto
     """
-    # TODO: Implementar backup completo
-    backup_data = {
-        'tenant_info': {
-            'id': str(tenant.id),
-            'name': tenant.name,
-            'slug': tenant.slug,
-            'created_at': tenant.created_at.isoformat(),
-        },
-        'timestamp': timezone.now().isoformat(),
-        'version': '1.0'
-    }
+    from apps.tenants.backup import export_tenant
     
-    return backup_data
+    return export_tenant(tenant, export_id=export_id, compression=compression)
 
 
 def validate_tenant_subscription(tenant):
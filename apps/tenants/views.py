@@ -6,6 +6,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from .models import Tenant, TenantConfiguration
 from .serializers import TenantSerializer, TenantConfigurationSerializer
+from .utils import get_tenant_usage
 
 
 class TenantViewSet(viewsets.ModelViewSet):
@@ -45,14 +46,14 @@ class TenantViewSet(viewsets.ModelViewSet):
         Endpoint para estatísticas de uso do tenant
         """
         tenant = self.get_object()
-        stats = tenant.get_usage_stats()
+        stats = get_tenant_usage(tenant)
         
         # Adicionar informações de limites
         stats.update({
             'limits': {
                 'max_users': tenant.max_users,
                 'max_patients': tenant.max_patients,
-                'max_storage_mb': tenant.max_storage_mb
+                'max_storage_gb': tenant.max_storage_gb
             },
             'usage_percentage': {
                 'users': (stats['users'] / tenant.max_users * 100) if tenant.max_users > 0 else 0,
@@ -2,6 +2,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
+from shared.services.storage import TenantUploadTo, tenant_file_storage
 
 
 class User(AbstractUser):
@@ -77,7 +78,13 @@ class User(AbstractUser):
     work_end_time = models.TimeField(blank=True, null=True, verbose_name='Horário de Fim')
     
     # Configurações
-    avatar = models.ImageField(upload_to='users/avatars/', blank=True, null=True, verbose_name='Foto')
+    avatar = models.ImageField(
+        upload_to=TenantUploadTo('users/avatars/'),
+        storage=tenant_file_storage,
+        blank=True,
+        null=True,
+        verbose_name='Foto'
+    )
     bio = models.TextField(blank=True, null=True, verbose_name='Biografia')
     is_active = models.BooleanField(default=True, verbose_name='Ativo')
     
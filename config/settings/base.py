@@ -190,6 +190,41 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Tarefas periódicas
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-tenant-usage': {
+        'task': 'apps.tenants.tasks.reconcile_tenant_usage_task',
+        'schedule': 60 * 60 * 6,
+    },
+    'reconcile-tenant-storage': {
+        'task': 'apps.tenants.tasks.reconcile_tenant_storage_task',
+        'schedule': 60 * 60 * 24,
+    },
+    'maintain-system-log-partitions': {
+        'task': 'shared.tasks.cleanup_tasks.maintain_system_log_partitions',
+        'schedule': 60 * 60 * 24,
+    },
+    'purge-soft-deleted-records': {
+        'task': 'shared.tasks.cleanup_tasks.purge_soft_deleted_records',
+        'schedule': 60 * 60 * 6,
+    },
+    'dispatch-notifications': {
+        'task': 'apps.communication.tasks.dispatch_notifications',
+        'schedule': 60,
+    },
+    'reconcile-unread-counts': {
+        'task': 'apps.communication.tasks.reconcile_unread_counts',
+        'schedule': 60 * 60,
+    },
+    'send-appointment-reminders': {
+        'task': 'apps.scheduling.tasks.send_appointment_reminders',
+        'schedule': 60 * 5,
+    },
+}
+
+# Retenção dos logs do sistema (partições mensais)
+SYSTEM_LOG_RETENTION_MONTHS = config('SYSTEM_LOG_RETENTION_MONTHS', default=12, cast=int)
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
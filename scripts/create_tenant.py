@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# scripts/create_tenant.py
+"""
+Cria tenants clonando o schema modelo.
+
+Uso:
+    python scripts/create_tenant.py "Clínica Exemplo" --email admin@exemplo.com
+    python scripts/create_tenant.py --bulk tenants.json
+    python scripts/create_tenant.py --bulk tenants.json --async
+
+O arquivo de --bulk contém uma lista de objetos com os argumentos de
+create_tenant_with_defaults (name, slug, admin_email, ...).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.base')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cria tenants a partir do schema modelo')
+    parser.add_argument('name', nargs='?', help='Nome da clínica')
+    parser.add_argument('--slug')
+    parser.add_argument('--email', dest='admin_email')
+    parser.add_argument('--bulk', help='Arquivo JSON com a lista de tenants')
+    parser.add_argument('--async', dest='run_async', action='store_true',
+                        help='Enfileira o provisionamento no Celery')
+    parser.add_argument('--refresh-template', action='store_true',
+                        help='Apenas cria/migra o schema modelo')
+    args = parser.parse_args()
+    
+    import django
+    django.setup()
+    
+    from apps.tenants.provisioning import ensure_template_schema, provision_tenants
+    from apps.tenants.tasks import provision_tenants_task
+    
+    if args.refresh_template:
+        migrated = ensure_template_schema()
+        print('Schema modelo migrado' if migrated else 'Schema modelo já está atualizado')
+        return
+    
+    if args.bulk:
+        with open(args.bulk) as f:
+            specs = json.load(f)
+    elif args.name:
+        specs = [{'name': args.name, 'slug': args.slug, 'admin_email': args.admin_email}]
+    else:
+        parser.error('Informe o nome da clínica ou --bulk')
+    
+    if args.run_async:
+        result = provision_tenants_task.delay(specs)
+        print(f"{len(specs)} tenants enfileirados (task {result.id})")
+        return
+    
+    started = time.monotonic()
+    tenants = provision_tenants(specs)
+    for tenant in tenants:
+        print(f"{tenant.slug} ({tenant.id})")
+    print(f"{len(tenants)} tenants criados em {time.monotonic() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# scripts/migrate_tenant.py
+"""
+Aplica as migrações nos schemas dos tenants em paralelo.
+
+Cada processo do pool abre sua própria conexão e migra um schema por vez.
+O progresso é gravado em um checkpoint após cada schema, então uma execução
+interrompida pode ser retomada com --resume sem repetir o que já terminou.
+
+Uso:
+    python scripts/migrate_tenant.py --workers 8
+    python scripts/migrate_tenant.py --only-behind
+    python scripts/migrate_tenant.py --resume --checkpoint migrate_checkpoint.json
+    python scripts/migrate_tenant.py --schema clinica_a --schema clinica_b
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.base')
+
+DEFAULT_CHECKPOINT = os.path.join(BASE_DIR, 'migrate_checkpoint.json')
+
+
+def setup_worker():
+    """
+    Inicializa o Django em cada processo do pool (conexões próprias)
+    """
+    import django
+    django.setup()
+    
+    from django.db import connections
+    connections.close_all()
+
+
+def migrate_schema(schema_name, only_behind=False, verbosity=0):
+    """
+    Migra um único schema; executado dentro de um processo do pool
+    """
+    from django.core.management import call_command
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+    
+    started = time.monotonic()
+    result = {'schema': schema_name, 'status': 'migrated', 'pending': None, 'error': None}
+    
+    try:
+        connection.set_schema(schema_name)
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        result['pending'] = len(plan)
+        
+        if not plan and only_behind:
+            result['status'] = 'skipped'
+        else:
+            call_command(
+                'migrate_schemas',
+                schema_name=schema_name,
+                interactive=False,
+                verbosity=verbosity
+            )
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    finally:
+        connection.close()
+    
+    result['seconds'] = round(time.monotonic() - started, 3)
+    return result
+
+
+def load_checkpoint(path):
+    """
+    Carrega o checkpoint de uma execução anterior
+    """
+    if not os.path.exists(path):
+        return {'completed': {}, 'failed': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    """
+    Grava o checkpoint de forma atômica
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def get_tenant_schemas(include_inactive=False):
+    """
+    Lista os schemas dos tenants a migrar
+    """
+    from apps.tenants.models import Tenant
+    from apps.tenants.utils import tenant_schema_name
+    
+    tenants = Tenant.objects.all() if include_inactive else Tenant.objects.filter(is_active=True)
+    return [tenant_schema_name(tenant) for tenant in tenants.order_by('created_at')]
+
+
+def print_report(results, elapsed):
+    """
+    Exibe o tempo por tenant e o resumo da execução
+    """
+    for result in sorted(results, key=lambda r: r['seconds'], reverse=True):
+        line = f"{result['schema']:<40} {result['status']:<9} {result['seconds']:>8.2f}s"
+        if result['error']:
+            line += f"  {result['error']}"
+        print(line)
+    
+    migrated = [r['seconds'] for r in results if r['status'] == 'migrated']
+    failed = [r for r in results if r['status'] == 'failed']
+    skipped = [r for r in results if r['status'] == 'skipped']
+    
+    print()
+    print(f"Schemas: {len(results)} | migrados: {len(migrated)} | "
+          f"pulados: {len(skipped)} | falhas: {len(failed)} | total: {elapsed:.1f}s")
+    if migrated:
+        migrated.sort()
+        p95 = migrated[min(len(migrated) - 1, int(len(migrated) * 0.95))]
+        print(f"Por schema: médio {sum(migrated) / len(migrated):.2f}s | "
+              f"p95 {p95:.2f}s | máximo {migrated[-1]:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migra os schemas dos tenants em paralelo')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4,
+                        help='Número de processos (cada um com sua conexão)')
+    parser.add_argument('--schema', action='append', dest='schemas',
+                        help='Migra apenas o(s) schema(s) informado(s)')
+    parser.add_argument('--only-behind', action='store_true',
+                        help='Executa migrate apenas nos schemas com migrações pendentes')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                        help='Arquivo de checkpoint do progresso')
+    parser.add_argument('--resume', action='store_true',
+                        help='Retoma a partir do checkpoint, pulando schemas concluídos')
+    parser.add_argument('--skip-shared', action='store_true',
+                        help='Não migra o schema público (SHARED_APPS)')
+    parser.add_argument('--include-inactive', action='store_true',
+                        help='Inclui tenants inativos')
+    parser.add_argument('--verbosity', type=int, default=0)
+    args = parser.parse_args()
+    
+    setup_worker()
+    
+    from django.core.management import call_command
+    from django.db import connections
+    
+    if not args.skip_shared and not args.resume:
+        print('Migrando schema público...')
+        call_command('migrate_schemas', shared=True, interactive=False, verbosity=args.verbosity)
+    
+    schemas = args.schemas or get_tenant_schemas(args.include_inactive)
+    
+    # O schema modelo do provisionamento por clonagem acompanha os tenants
+    if not args.schemas:
+        from apps.tenants.provisioning import TEMPLATE_SCHEMA, schema_exists
+        if schema_exists(TEMPLATE_SCHEMA):
+            schemas.insert(0, TEMPLATE_SCHEMA)
+    
+    checkpoint = load_checkpoint(args.checkpoint) if args.resume else {'completed': {}, 'failed': {}}
+    pending = [schema for schema in schemas if schema not in checkpoint['completed']]
+    checkpoint['failed'] = {}
+    save_checkpoint(args.checkpoint, checkpoint)
+    
+    print(f"{len(pending)} schemas a processar "
+          f"({len(schemas) - len(pending)} já concluídos) com {args.workers} processos")
+    
+    # Conexões do processo principal não podem ser herdadas pelos workers
+    connections.close_all()
+    
+    started = time.monotonic()
+    results = []
+    context = multiprocessing.get_context('spawn')
+    
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context,
+                             initializer=setup_worker) as pool:
+        futures = {
+            pool.submit(migrate_schema, schema, args.only_behind, args.verbosity): schema
+            for schema in pending
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+            
+            if result['status'] == 'failed':
+                checkpoint['failed'][result['schema']] = result['error']
+            else:
+                checkpoint['completed'][result['schema']] = result['seconds']
+            save_checkpoint(args.checkpoint, checkpoint)
+            
+            print(f"[{done}/{len(pending)}] {result['schema']} {result['status']} "
+                  f"({result['seconds']:.2f}s)", flush=True)
+    
+    print()
+    print_report(results, time.monotonic() - started)
+    
+    if checkpoint['failed']:
+        print(f"\nFalhas registradas em {args.checkpoint}; execute novamente com --resume")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+# shared/exceptions/custom.py
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class StorageQuotaExceeded(APIException):
+    """
+    Upload recusado por ultrapassar o limite de storage do tenant
+    """
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _('Limite de armazenamento do plano atingido.')
+    default_code = 'storage_quota_exceeded'
+
+
+class AppointmentConflict(APIException):
+    """
+    Agendamento sobreposto a outro do mesmo terapeuta ou da mesma sala
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _('Horário indisponível: já existe um agendamento neste período.')
+    default_code = 'appointment_conflict'
@@ -0,0 +1,241 @@
+# shared/services/email.py
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template import Context, Template
+from django.template.loader import get_template
+from contextlib import contextmanager
+import os
+import queue
+import smtplib
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Conexões SMTP mantidas abertas por processo e por quanto tempo ociosas
+EMAIL_POOL_SIZE = getattr(settings, 'EMAIL_POOL_SIZE', 4)
+EMAIL_POOL_MAX_IDLE = getattr(settings, 'EMAIL_POOL_MAX_IDLE', 60)
+
+# Mensagens enviadas por conexão antes de devolvê-la ao pool
+EMAIL_BATCH_SIZE = getattr(settings, 'EMAIL_BATCH_SIZE', 100)
+
+
+class BatchReport:
+    """
+    Resultado de um envio em lote
+    """
+    __slots__ = ('sent', 'failed', 'seconds')
+    
+    def __init__(self, sent=0, failed=0, seconds=0.0):
+        self.sent = sent
+        self.failed = failed
+        self.seconds = seconds
+    
+    @property
+    def rate(self):
+        """Mensagens enviadas por segundo"""
+        return self.sent / self.seconds if self.seconds else 0.0
+    
+    def merge(self, other):
+        self.sent += other.sent
+        self.failed += other.failed
+        self.seconds += other.seconds
+    
+    def __repr__(self):
+        return f"<BatchReport sent={self.sent} failed={self.failed} {self.rate:.1f}/s>"
+
+
+class SMTPConnectionPool:
+    """
+    Pool de conexões persistentes do backend de e-mail.
+    
+    Cada conexão mantém a sessão SMTP (e o handshake TLS) aberta entre
+    lotes; conexões ociosas por mais de `max_idle` segundos ou que não
+    respondem ao NOOP são reabertas. Os argumentos extras são repassados a
+    get_connection (host, port, use_tls...), o que permite apontar o pool
+    para um servidor SMTP local nos testes.
+    """
+    
+    def __init__(self, size=None, max_idle=None, backend=None, **backend_kwargs):
+        self.size = size or EMAIL_POOL_SIZE
+        self.max_idle = max_idle if max_idle is not None else EMAIL_POOL_MAX_IDLE
+        self.backend = backend
+        self.backend_kwargs = backend_kwargs
+        self._reset()
+    
+    def _reset(self):
+        # Conexões não são compartilhadas entre processos (fork dos workers)
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+    
+    @contextmanager
+    def connection(self):
+        """
+        Empresta uma conexão aberta; ela volta ao pool ao final do bloco
+        """
+        if self._pid != os.getpid():
+            self._reset()
+        
+        self._slots.acquire()
+        connection = None
+        try:
+            connection = self._checkout()
+            yield connection
+        except Exception:
+            self._discard(connection)
+            connection = None
+            raise
+        finally:
+            if connection is not None:
+                connection.pool_released_at = time.monotonic()
+                self._idle.put(connection)
+            self._slots.release()
+    
+    def _checkout(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - connection.pool_released_at < self.max_idle and self._alive(connection):
+                return connection
+            self._discard(connection)
+        
+        connection = get_connection(self.backend, fail_silently=False, **self.backend_kwargs)
+        connection.open()
+        return connection
+    
+    def _alive(self, connection):
+        smtp = getattr(connection, 'connection', None)
+        if smtp is None:
+            # Backends sem sessão (locmem, console) estão sempre disponíveis
+            return not hasattr(connection, 'connection')
+        try:
+            return smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+    
+    def _discard(self, connection):
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except Exception:
+            pass
+    
+    def close(self):
+        """
+        Fecha todas as conexões ociosas
+        """
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_email_pool():
+    """
+    Pool padrão do processo, criado no primeiro uso
+    """
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = SMTPConnectionPool()
+    return _default_pool
+
+
+def _send_one(connection, message):
+    """
+    Envia uma mensagem, reabrindo a sessão uma vez se o servidor a encerrou
+    """
+    try:
+        return bool(connection.send_messages([message]))
+    except smtplib.SMTPServerDisconnected:
+        connection.close()
+        connection.open()
+        return bool(connection.send_messages([message]))
+
+
+def send_messages(messages, pool=None, batch_size=None):
+    """
+    Envia mensagens (EmailMessage) em lotes, cada lote por uma conexão do pool.
+    
+    Retorna (relatório, índices das mensagens enviadas). Falhas individuais
+    são registradas e não interrompem o lote.
+    """
+    pool = pool or get_email_pool()
+    batch_size = batch_size or EMAIL_BATCH_SIZE
+    messages = list(messages)
+    
+    report = BatchReport()
+    sent_indexes = []
+    for start in range(0, len(messages), batch_size):
+        batch = messages[start:start + batch_size]
+        batch_report = BatchReport()
+        started = time.monotonic()
+        
+        with pool.connection() as connection:
+            for offset, message in enumerate(batch):
+                try:
+                    if _send_one(connection, message):
+                        batch_report.sent += 1
+                        sent_indexes.append(start + offset)
+                    else:
+                        batch_report.failed += 1
+                except Exception as e:
+                    # BadHeaderError, erros de codificação etc. afetam só a mensagem
+                    batch_report.failed += 1
+                    logger.error(f"Error sending email to {message.to}: {str(e)}")
+        
+        batch_report.seconds = time.monotonic() - started
+        logger.info(
+            f"Email batch: {batch_report.sent} sent, {batch_report.failed} failed "
+            f"in {batch_report.seconds:.2f}s ({batch_report.rate:.1f}/s)"
+        )
+        report.merge(batch_report)
+    
+    return report, sent_indexes
+
+
+class EmailTemplate:
+    """
+    Assunto e corpos compilados uma única vez e renderizados por destinatário
+    """
+    
+    def __init__(self, subject, text_template=None, html_template=None):
+        self.subject = Template(subject)
+        self.text = get_template(text_template) if text_template else None
+        self.html = get_template(html_template) if html_template else None
+    
+    def render(self, context, to, from_email=None, **kwargs):
+        subject = ' '.join(self.subject.render(Context(context)).split())
+        body = self.text.render(context) if self.text else ''
+        message = EmailMultiAlternatives(
+            subject=subject,
+            body=body,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            to=[to] if isinstance(to, str) else list(to),
+            **kwargs
+        )
+        if self.html:
+            message.attach_alternative(self.html.render(context), 'text/html')
+        return message
+
+
+def send_templated_email(template, recipients, from_email=None, pool=None, batch_size=None):
+    """
+    Renderiza `template` (EmailTemplate) para cada (email, contexto) e envia em lotes
+    """
+    messages = [
+        template.render(context, to=email, from_email=from_email)
+        for email, context in recipients
+    ]
+    return send_messages(messages, pool=pool, batch_size=batch_size)
@@ -0,0 +1,318 @@
+# shared/services/sms.py
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from collections import defaultdict
+import asyncio
+import math
+import random
+import time
+import uuid
+import logging
+
+try:
+    import httpx
+except ImportError:  # necessário apenas para o HTTPSMSProvider
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# Limite padrão por tenant: mensagens por segundo e rajada máxima
+SMS_TENANT_RATE = getattr(settings, 'SMS_TENANT_RATE', 5)
+SMS_TENANT_BURST = getattr(settings, 'SMS_TENANT_BURST', 20)
+
+SMS_MAX_RETRIES = getattr(settings, 'SMS_MAX_RETRIES', 3)
+SMS_BACKOFF_BASE = getattr(settings, 'SMS_BACKOFF_BASE', 0.5)
+SMS_BACKOFF_MAX = getattr(settings, 'SMS_BACKOFF_MAX', 30)
+
+# Resultados entregues ao callback de relatório a cada N mensagens concluídas
+SMS_REPORT_BATCH_SIZE = getattr(settings, 'SMS_REPORT_BATCH_SIZE', 100)
+
+
+class SMSTemporaryError(Exception):
+    """Falha transitória (limite do provedor, timeout, 5xx): a mensagem é reenviada"""
+
+
+class SMSPermanentError(Exception):
+    """Falha definitiva (número inválido, 4xx): a mensagem não é reenviada"""
+
+
+class SMSMessage:
+    __slots__ = ('tenant_id', 'to', 'body', 'reference')
+    
+    def __init__(self, tenant_id, to, body, reference=None):
+        self.tenant_id = tenant_id
+        self.to = to
+        self.body = body
+        self.reference = reference
+    
+    def __repr__(self):
+        return f"<SMSMessage {self.to} tenant={self.tenant_id}>"
+
+
+class SMSResult:
+    __slots__ = ('message', 'ok', 'provider_id', 'error', 'attempts')
+    
+    def __init__(self, message, ok, provider_id=None, error=None, attempts=1):
+        self.message = message
+        self.ok = ok
+        self.provider_id = provider_id
+        self.error = error
+        self.attempts = attempts
+
+
+class SMSProvider:
+    """
+    Interface de provedor de SMS.
+    
+    `max_concurrency` limita as requisições simultâneas ao provedor. open()
+    e close() envolvem um envio em lote (pool de conexões); send() retorna o
+    id da mensagem no provedor ou levanta SMSTemporaryError/SMSPermanentError.
+    """
+    name = 'base'
+    max_concurrency = 10
+    
+    async def open(self):
+        pass
+    
+    async def close(self):
+        pass
+    
+    async def send(self, message):
+        raise NotImplementedError
+
+
+class HTTPSMSProvider(SMSProvider):
+    """
+    Provedor HTTP genérico (POST JSON) sobre um pool de conexões keep-alive
+    """
+    name = 'http'
+    
+    def __init__(self, url, token=None, sender=None, max_concurrency=20, timeout=10):
+        if httpx is None:
+            raise ImproperlyConfigured('HTTPSMSProvider requer o pacote httpx')
+        self.url = url
+        self.token = token
+        self.sender = sender
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._client = None
+    
+    async def open(self):
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        self._client = httpx.AsyncClient(
+            headers=headers,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+    
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def send(self, message):
+        payload = {'to': message.to, 'body': message.body}
+        if self.sender:
+            payload['from'] = self.sender
+        try:
+            response = await self._client.post(self.url, json=payload)
+        except httpx.TransportError as e:
+            raise SMSTemporaryError(str(e))
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            raise SMSTemporaryError(f'HTTP {response.status_code}')
+        if response.status_code >= 400:
+            raise SMSPermanentError(f'HTTP {response.status_code}: {response.text[:200]}')
+        try:
+            return response.json().get('id')
+        except (ValueError, AttributeError):
+            # 2xx sem corpo JSON (ou sem objeto): enviado, mas sem id do provedor
+            logger.warning(f"SMS provider returned HTTP {response.status_code} without a JSON id")
+            return None
+
+
+class FakeSMSProvider(SMSProvider):
+    """
+    Provedor local para testes e benchmarks: simula latência e falhas
+    """
+    name = 'fake'
+    
+    def __init__(self, latency=0.05, failure_rate=0.0, max_concurrency=50):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.max_concurrency = max_concurrency
+        self.sent = []
+    
+    async def send(self, message):
+        await asyncio.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise SMSTemporaryError('simulated failure')
+        self.sent.append(message)
+        return uuid.uuid4().hex
+
+
+class TokenBucket:
+    """
+    Limite de `rate` envios por segundo, com rajada de até `capacity`,
+    compartilhado por todos os processos através do cache.
+    
+    O tempo é dividido em janelas de capacity/rate segundos e cada envio
+    incrementa o contador da janela atual no cache (add + incr, atômicos no
+    Redis/Memcached); esgotada a janela, o envio espera a seguinte. Assim
+    vários workers e chamadas de send_many dividem a mesma cota do tenant.
+    """
+    
+    def __init__(self, key, rate, capacity):
+        self.key = key
+        self.capacity = max(int(capacity), 1)
+        self.window = self.capacity / rate
+    
+    def _take(self):
+        """
+        Reserva um envio na janela atual; retorna 0 ou os segundos até a próxima
+        """
+        now = time.time()
+        window = int(now // self.window)
+        key = f"{self.key}:{window}"
+        cache.add(key, 0, math.ceil(self.window) + 1)
+        try:
+            used = cache.incr(key)
+        except ValueError:
+            # Contador expirou entre o add e o incr: tenta de novo
+            return 0.001
+        if used <= self.capacity:
+            return 0
+        return (window + 1) * self.window - now
+    
+    async def acquire(self):
+        # add/incr síncronos (os métodos async do cache não são atômicos),
+        # fora do event loop
+        while True:
+            wait = await asyncio.to_thread(self._take)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class SMSSender:
+    """
+    Envio assíncrono de SMS em massa.
+    
+    Cada tenant tem sua fila de mensagens, consumida por um número limitado
+    de workers (no máximo a rajada do tenant), e um token bucket guardado no
+    cache e comum a todos os processos: um tenant com milhares de lembretes
+    não consome a cota dos demais. Só um worker por tenant consulta o bucket
+    de cada vez; os outros esperam a vez sem acessar o cache. As requisições
+    simultâneas ao provedor são limitadas pela concorrência dele. Falhas
+    transitórias são reenviadas com backoff exponencial e jitter.
+    `on_report` recebe os resultados em lotes conforme as mensagens terminam.
+    """
+    
+    def __init__(self, provider=None, tenant_rate=None, tenant_burst=None, tenant_rates=None,
+                 max_retries=None, report_batch_size=None):
+        self.provider = provider or get_sms_provider()
+        self.tenant_rate = tenant_rate or SMS_TENANT_RATE
+        self.tenant_burst = tenant_burst or SMS_TENANT_BURST
+        self.tenant_rates = tenant_rates or {}
+        self.max_retries = max_retries if max_retries is not None else SMS_MAX_RETRIES
+        self.report_batch_size = report_batch_size or SMS_REPORT_BATCH_SIZE
+    
+    async def send_many(self, messages, on_report=None):
+        """
+        Envia as mensagens e retorna a lista de SMSResult (na ordem de conclusão)
+        """
+        semaphore = asyncio.Semaphore(self.provider.max_concurrency)
+        queues = defaultdict(asyncio.Queue)
+        for message in messages:
+            queues[message.tenant_id].put_nowait(message)
+        
+        async def deliver(message, bucket, gate):
+            for attempt in range(1, self.max_retries + 2):
+                async with gate:
+                    await bucket.acquire()
+                try:
+                    async with semaphore:
+                        provider_id = await self.provider.send(message)
+                    return SMSResult(message, True, provider_id=provider_id, attempts=attempt)
+                except SMSPermanentError as e:
+                    return SMSResult(message, False, error=str(e), attempts=attempt)
+                except SMSTemporaryError as e:
+                    if attempt > self.max_retries:
+                        return SMSResult(message, False, error=str(e), attempts=attempt)
+                    delay = min(SMS_BACKOFF_MAX, SMS_BACKOFF_BASE * 2 ** (attempt - 1))
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                except Exception as e:
+                    return SMSResult(message, False, error=str(e), attempts=attempt)
+        
+        started = time.monotonic()
+        results = []
+        pending = []
+        
+        async def worker(queue, bucket, gate):
+            nonlocal pending
+            while not queue.empty():
+                result = await deliver(queue.get_nowait(), bucket, gate)
+                results.append(result)
+                pending.append(result)
+                if len(pending) >= self.report_batch_size:
+                    self._report(pending, started, on_report)
+                    pending = []
+        
+        workers = []
+        for tenant_id, queue in queues.items():
+            rate = self.tenant_rates.get(tenant_id, self.tenant_rate)
+            bucket = TokenBucket(f"sms:rate:{tenant_id}", rate, self.tenant_burst)
+            gate = asyncio.Lock()
+            count = min(queue.qsize(), bucket.capacity, self.provider.max_concurrency)
+            workers.extend(worker(queue, bucket, gate) for _ in range(count))
+        
+        await self.provider.open()
+        try:
+            await asyncio.gather(*workers)
+            if pending:
+                self._report(pending, started, on_report)
+        finally:
+            await self.provider.close()
+        
+        return results
+    
+    def _report(self, batch, started, on_report):
+        sent = sum(1 for result in batch if result.ok)
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"SMS batch via {self.provider.name}: {sent} sent, {len(batch) - sent} failed "
+            f"({elapsed:.1f}s elapsed)"
+        )
+        if on_report is not None:
+            on_report(batch)
+    
+    def send(self, messages, on_report=None):
+        """
+        Versão síncrona (Celery, scripts): roda o envio em um event loop próprio
+        """
+        return asyncio.run(self.send_many(list(messages), on_report=on_report))
+
+
+def get_sms_provider():
+    """
+    Provedor configurado em SMS_PROVIDER (caminho da classe) e SMS_PROVIDER_OPTIONS
+    """
+    path = getattr(settings, 'SMS_PROVIDER', None)
+    if not path:
+        raise ImproperlyConfigured('SMS_PROVIDER não configurado')
+    return import_string(path)(**getattr(settings, 'SMS_PROVIDER_OPTIONS', {}))
+
+
+def summarize_results(results):
+    """
+    Contagem de enviadas/falhas por tenant
+    """
+    summary = defaultdict(lambda: {'sent': 0, 'failed': 0})
+    for result in results:
+        summary[result.message.tenant_id]['sent' if result.ok else 'failed'] += 1
+    return dict(summary)
@@ -0,0 +1,317 @@
+# shared/services/storage.py
+from django.conf import settings
+from django.core.files.storage import Storage, default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+from shared.exceptions.custom import StorageQuotaExceeded
+import os
+import posixpath
+import re
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def tenant_storage_prefix(tenant):
+    """
+    Prefixo de storage dos arquivos do tenant
+    """
+    tenant_id = getattr(tenant, 'id', tenant)
+    return f"tenant_files/{tenant_id}/"
+
+
+_TENANT_PATH_RE = re.compile(r'^tenant_files/([^/]+)/')
+
+
+def tenant_id_from_path(name):
+    """
+    Id do tenant dono de um caminho do storage (None fora de tenant_files/)
+    """
+    match = _TENANT_PATH_RE.match(name.replace('\\', '/'))
+    if not match:
+        return None
+    try:
+        return uuid.UUID(match.group(1))
+    except ValueError:
+        return None
+
+
+@deconstructible
+class TenantUploadTo:
+    """
+    upload_to que grava o arquivo no prefixo do tenant (tenant_files/<id>/).
+    
+    O tenant vem da própria instância (campo tenant, ou o Tenant em si) e,
+    para modelos do schema do tenant, do tenant atual ou do schema ativo na
+    conexão.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def __call__(self, instance, filename):
+        from apps.tenants.models import Tenant
+        from apps.tenants.context import get_current_tenant
+        from apps.tenants.utils import tenant_from_connection
+        
+        if isinstance(instance, Tenant):
+            tenant_id = instance.id
+        else:
+            tenant_id = getattr(instance, 'tenant_id', None)
+        if tenant_id is None:
+            tenant_id = getattr(get_current_tenant() or tenant_from_connection(), 'id', None)
+        
+        path = timezone.now().strftime(self.path)
+        if tenant_id is None:
+            logger.warning(f"Upload {filename} outside a tenant: not counted in storage usage")
+            return posixpath.join(path, filename)
+        return tenant_storage_prefix(tenant_id) + posixpath.join(path, filename)
+    
+    def __eq__(self, other):
+        return isinstance(other, TenantUploadTo) and self.path == other.path
+
+
+@deconstructible
+class TenantFileStorage(Storage):
+    """
+    Storage dos FileFields de tenant: delega ao storage padrão e passa os
+    arquivos de tenant_files/<id>/ pelo TenantStorageService, que reserva a
+    cota no upload e devolve os bytes na exclusão
+    """
+    
+    def __init__(self, storage=None):
+        self.backend = storage or default_storage
+    
+    def _open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+    
+    def _save(self, name, content):
+        tenant_id = tenant_id_from_path(name)
+        if tenant_id is None:
+            return self.backend.save(name, content)
+        return TenantStorageService(tenant_id, storage=self.backend).save(name, content)
+    
+    def delete(self, name):
+        tenant_id = tenant_id_from_path(name)
+        if tenant_id is None:
+            return self.backend.delete(name)
+        TenantStorageService(tenant_id, storage=self.backend).delete(name)
+    
+    def exists(self, name):
+        return self.backend.exists(name)
+    
+    def get_available_name(self, name, max_length=None):
+        return self.backend.get_available_name(name, max_length=max_length)
+    
+    def listdir(self, path):
+        return self.backend.listdir(path)
+    
+    def size(self, name):
+        return self.backend.size(name)
+    
+    def url(self, name):
+        return self.backend.url(name)
+    
+    def path(self, name):
+        return self.backend.path(name)
+    
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+    
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+    
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+tenant_file_storage = TenantFileStorage()
+
+
+class TenantStorageService:
+    """
+    Acesso ao storage com contabilidade de uso por tenant.
+    
+    Todo upload e exclusão de arquivos do tenant deve passar por aqui para
+    que o ledger (TenantUsage.storage_bytes) continue exato e a verificação
+    de cota seja O(1), sem listar o storage no momento do upload.
+    """
+    
+    def __init__(self, tenant, storage=None):
+        self.tenant = tenant
+        self.storage = storage or default_storage
+        self.prefix = tenant_storage_prefix(tenant)
+    
+    def path(self, *parts):
+        """
+        Caminho completo dentro do prefixo do tenant
+        """
+        return self.prefix + '/'.join(part.strip('/') for part in parts)
+    
+    def save(self, name, content, max_length=None):
+        """
+        Salva um arquivo no prefixo do tenant, reservando a cota antes do upload
+        """
+        from apps.tenants.utils import reserve_tenant_storage, release_tenant_storage
+        
+        if not name.startswith(self.prefix):
+            name = self.path(name)
+        size = content.size
+        
+        if not reserve_tenant_storage(self.tenant, size):
+            raise StorageQuotaExceeded()
+        
+        try:
+            saved_name = self.storage.save(name, content, max_length=max_length)
+        except Exception:
+            release_tenant_storage(self.tenant, size)
+            raise
+        
+        return saved_name
+    
+    def delete(self, name, size=None):
+        """
+        Remove um arquivo do tenant e devolve seu tamanho ao ledger
+        """
+        from apps.tenants.utils import release_tenant_storage
+        
+        if not name.startswith(self.prefix):
+            raise ValueError(f"File {name} does not belong to tenant storage {self.prefix}")
+        
+        if size is None:
+            try:
+                size = self.storage.size(name)
+            except (FileNotFoundError, OSError):
+                return
+        
+        self.storage.delete(name)
+        release_tenant_storage(self.tenant, size)
+    
+    def iter_size_pages(self, page_size=1000):
+        """
+        Lista os tamanhos dos arquivos do prefixo, uma página por vez
+        """
+        bucket = getattr(self.storage, 'bucket', None)
+        if bucket is not None:
+            yield from self._iter_s3_pages(bucket, page_size)
+        else:
+            yield from self._iter_walk_pages(page_size)
+    
+    def _iter_s3_pages(self, bucket, page_size):
+        """
+        Paginação nativa do S3 (list_objects_v2), sem HEAD por arquivo
+        """
+        location = getattr(self.storage, 'location', '').strip('/')
+        prefix = f"{location}/{self.prefix}" if location else self.prefix
+        
+        paginator = bucket.meta.client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
+            Bucket=bucket.name,
+            Prefix=prefix,
+            PaginationConfig={'PageSize': page_size}
+        )
+        for page in pages:
+            yield [obj['Size'] for obj in page.get('Contents', [])]
+    
+    def _iter_walk_pages(self, page_size):
+        """
+        Percorre o diretório do tenant em storages locais (FileSystemStorage)
+        """
+        try:
+            root = self.storage.path(self.prefix)
+        except NotImplementedError:
+            logger.warning(f"Storage {type(self.storage).__name__} cannot be listed for reconciliation")
+            return
+        
+        page = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                try:
+                    page.append(os.path.getsize(os.path.join(dirpath, filename)))
+                except OSError:
+                    continue
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
+
+
+def reconcile_tenant_storage(tenant, storage=None, page_size=None, pause=None):
+    """
+    Recalcula TenantUsage.storage_bytes listando o prefixo do tenant.
+    
+    A listagem é paginada (e opcionalmente espaçada por `pause` segundos) para
+    não sobrecarregar o storage. Deltas aplicados pelos uploads durante a
+    listagem são preservados.
+    """
+    from apps.tenants.models import TenantUsage
+    from apps.tenants.utils import reconcile_tenant_usage
+    
+    page_size = page_size or getattr(settings, 'STORAGE_RECONCILE_PAGE_SIZE', 1000)
+    pause = pause if pause is not None else getattr(settings, 'STORAGE_RECONCILE_PAUSE', 0)
+    tenant_id = getattr(tenant, 'id', tenant)
+    service = TenantStorageService(tenant_id, storage=storage)
+    
+    ledger = TenantUsage.objects.filter(tenant_id=tenant_id).first()
+    if ledger is None:
+        # Sem ledger: criado com as contagens reais (como em get_tenant_usage)
+        ledger = reconcile_tenant_usage(tenant)
+    started_with = ledger.storage_bytes
+    
+    total = 0
+    files = 0
+    for page in service.iter_size_pages(page_size=page_size):
+        total += sum(page)
+        files += len(page)
+        if pause:
+            time.sleep(pause)
+    
+    with transaction.atomic():
+        ledger = TenantUsage.objects.select_for_update().get(tenant_id=tenant_id)
+        concurrent_delta = ledger.storage_bytes - started_with
+        storage_bytes = max(0, total + concurrent_delta)
+        
+        if storage_bytes != ledger.storage_bytes:
+            logger.warning(
+                f"Tenant storage drift for {tenant_id}: "
+                f"ledger={ledger.storage_bytes} listed={storage_bytes}"
+            )
+        
+        ledger.storage_bytes = storage_bytes
+        ledger.storage_reconciled_at = timezone.now()
+        ledger.save(update_fields=['storage_bytes', 'storage_reconciled_at', 'updated_at'])
+    
+    logger.info(f"Tenant storage reconciled for {tenant_id}: {files} files, {storage_bytes} bytes")
+    return storage_bytes
+
+
+def get_export_storage():
+    """
+    Storage usado para exportações e backups de tenants
+    """
+    backend = getattr(settings, 'TENANT_EXPORT_STORAGE', None)
+    if backend:
+        return import_string(backend)()
+    return default_storage
+
+
+def tenant_export_prefix(tenant, export_id):
+    """
+    Prefixo de uma exportação do tenant (fora da cota de arquivos do tenant)
+    """
+    tenant_id = getattr(tenant, 'id', tenant)
+    return f"exports/{tenant_id}/{export_id}/"
+
+
+def overwrite_file(storage, name, content):
+    """
+    Grava um arquivo substituindo o existente (storage.save renomearia)
+    """
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, content)
@@ -0,0 +1,282 @@
+# shared/tasks/cleanup_tasks.py
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from collections import defaultdict
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Meses de logs do sistema mantidos e partições criadas com antecedência
+SYSTEM_LOG_RETENTION_MONTHS = getattr(settings, 'SYSTEM_LOG_RETENTION_MONTHS', 12)
+SYSTEM_LOG_PARTITIONS_AHEAD = getattr(settings, 'SYSTEM_LOG_PARTITIONS_AHEAD', 3)
+
+# Prazo padrão (dias) antes da exclusão definitiva de registros soft-deleted;
+# tenants usam TenantSettings.deleted_retention_days
+SOFT_DELETE_GRACE_DAYS = getattr(settings, 'SOFT_DELETE_GRACE_DAYS', 30)
+
+# Lotes pequenos e pausas entre eles mantêm locks curtos e a replicação em dia
+SOFT_DELETE_PURGE_BATCH_SIZE = getattr(settings, 'SOFT_DELETE_PURGE_BATCH_SIZE', 500)
+SOFT_DELETE_PURGE_PAUSE = getattr(settings, 'SOFT_DELETE_PURGE_PAUSE', 0.2)
+SOFT_DELETE_PURGE_MAX_LAG = getattr(settings, 'SOFT_DELETE_PURGE_MAX_LAG', 10)
+SOFT_DELETE_PURGE_MAX_SECONDS = getattr(settings, 'SOFT_DELETE_PURGE_MAX_SECONDS', 60 * 30)
+
+# Ponto de retomada da purga interrompida pelo limite de tempo
+SOFT_DELETE_PURGE_CURSOR_KEY = 'soft_delete_purge:cursor'
+
+# Tenants têm ciclo de vida próprio e os logs são removidos por partição
+SOFT_DELETE_PURGE_EXCLUDE = getattr(
+    settings, 'SOFT_DELETE_PURGE_EXCLUDE', ['tenants.tenant', 'core.systemlog']
+)
+
+
+@shared_task
+def maintain_system_log_partitions(retention_months=None, months_ahead=None):
+    """
+    Cria as partições futuras do SystemLog e remove as que saíram da retenção
+    """
+    from apps.core.models import SystemLog
+    from apps.core.partitions import drop_expired_partitions, ensure_partitions, is_partitioned
+    
+    table = SystemLog._meta.db_table
+    if not is_partitioned(table):
+        logger.warning(
+            f"{table} is not partitioned; run 'manage.py partition_system_log' to convert it"
+        )
+        return {'created': [], 'dropped': []}
+    
+    created = ensure_partitions(
+        table, 'created_at',
+        months_ahead=months_ahead if months_ahead is not None else SYSTEM_LOG_PARTITIONS_AHEAD
+    )
+    dropped = drop_expired_partitions(
+        table,
+        retention_months if retention_months is not None else SYSTEM_LOG_RETENTION_MONTHS
+    )
+    
+    logger.info(f"System log partitions: {len(created)} created, {len(dropped)} dropped")
+    return {'created': created, 'dropped': dropped}
+
+
+def get_soft_delete_models():
+    """
+    Subclasses concretas de SoftDeleteModel, com os filhos antes dos pais
+    """
+    from apps.core.models import SoftDeleteModel
+    
+    selected = [
+        model for model in apps.get_models()
+        if issubclass(model, SoftDeleteModel)
+        and not model._meta.proxy and model._meta.managed
+        and model._meta.label_lower not in SOFT_DELETE_PURGE_EXCLUDE
+    ]
+    
+    depth = {}
+    
+    def dependency_depth(model, path=()):
+        if model not in depth:
+            targets = [
+                field.related_model for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model in selected
+                and field.related_model is not model and field.related_model not in path
+            ]
+            depth[model] = max(
+                (dependency_depth(target, path + (model,)) + 1 for target in targets), default=0
+            )
+        return depth[model]
+    
+    # Purgar os filhos primeiro libera os pais na mesma execução
+    return sorted(selected, key=lambda model: (-dependency_depth(model), model._meta.label))
+
+
+def _retained_children_guards(model, cutoff):
+    """
+    Condições que excluem registros com filhos retidos apagados em cascata.
+    
+    Um registro excluído cujos filhos (soft delete) continuam ativos, ou
+    foram excluídos depois de `cutoff` e ainda estão no prazo de retenção,
+    fica para depois: apagá-lo levaria junto dados que ainda podem ser
+    usados ou restaurados. Os filhos são purgados antes dos pais
+    (get_soft_delete_models) com o mesmo prazo.
+    """
+    from apps.core.models import SoftDeleteModel
+    
+    guards = []
+    for relation in model._meta.related_objects:
+        child = relation.related_model
+        if relation.many_to_many or relation.on_delete is not models.CASCADE:
+            continue
+        if not issubclass(child, SoftDeleteModel) or relation.parent_link:
+            continue
+        retained = models.Q(is_active=True) | models.Q(deleted_at__isnull=True) | models.Q(deleted_at__gte=cutoff)
+        guards.append(~Exists(child._base_manager.filter(
+            retained, **{relation.field.name: OuterRef('pk')}
+        )))
+    return guards
+
+
+def _replication_lag():
+    """
+    Maior atraso de replay das réplicas, em segundos (0 se indisponível)
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COALESCE(MAX(EXTRACT(EPOCH FROM replay_lag)), 0) FROM pg_stat_replication'
+            )
+            return float(cursor.fetchone()[0])
+    except Exception:
+        return 0
+
+
+def _throttle(deadline):
+    """
+    Pausa entre lotes, esperando as réplicas quando o atraso passa do limite
+    """
+    time.sleep(SOFT_DELETE_PURGE_PAUSE)
+    while time.monotonic() < deadline and _replication_lag() > SOFT_DELETE_PURGE_MAX_LAG:
+        time.sleep(max(SOFT_DELETE_PURGE_PAUSE, 1))
+
+
+def purge_queryset(model, queryset, cutoff, deadline, batch_size=None):
+    """
+    Apaga definitivamente os registros do queryset em lotes ordenados por pk.
+    
+    Cada lote é uma transação curta e o delete() do Django trata as cascatas
+    (CASCADE, SET_NULL, signals); registros com filhos retidos até `cutoff`
+    ficam de fora. Lotes bloqueados por PROTECT/RESTRICT são registrados e
+    pulados. Retorna (apagados, concluído).
+    """
+    from django.db.models.deletion import ProtectedError, RestrictedError
+    
+    batch_size = batch_size or SOFT_DELETE_PURGE_BATCH_SIZE
+    queryset = queryset.filter(*_retained_children_guards(model, cutoff)).order_by('pk')
+    
+    purged = 0
+    last_pk = None
+    while True:
+        if time.monotonic() >= deadline:
+            return purged, False
+        
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return purged, True
+        last_pk = pks[-1]
+        
+        try:
+            with transaction.atomic():
+                model._base_manager.filter(pk__in=pks).delete()
+            purged += len(pks)
+        except (ProtectedError, RestrictedError) as e:
+            logger.warning(f"Purge of {model._meta.label} batch skipped: {str(e)}")
+        
+        _throttle(deadline)
+
+
+def _expired(model, cutoff):
+    return model._base_manager.filter(is_active=False, deleted_at__lt=cutoff)
+
+
+@shared_task
+def purge_soft_deleted_records(max_seconds=None):
+    """
+    Remove definitivamente registros soft-deleted após o prazo de retenção.
+    
+    Modelos das tabelas de cada tenant (TENANT_APPS com tenant_schemas) são
+    processados schema a schema com o prazo do tenant; modelos
+    compartilhados com FK de tenant são agrupados por prazo; os demais usam
+    SOFT_DELETE_GRACE_DAYS. A execução é limitada a `max_seconds`; o modelo
+    (e o tenant) em andamento fica no cache e a próxima execução continua
+    dali em vez de recomeçar pelos primeiros.
+    """
+    from apps.tenants.utils import tenant_schema
+    from apps.tenants.models import Tenant, TenantSettings
+    from apps.tenants.utils import tenant_app_labels
+    
+    started = time.monotonic()
+    deadline = started + (max_seconds or SOFT_DELETE_PURGE_MAX_SECONDS)
+    now = timezone.now()
+    
+    retention = dict(TenantSettings.objects.values_list('tenant_id', 'deleted_retention_days'))
+    tenants = list(Tenant._base_manager.only('id', 'slug').order_by('id'))
+    
+    def cutoff(days):
+        return now - timezone.timedelta(days=days)
+    
+    tenants_by_days = defaultdict(list)
+    for tenant in tenants:
+        tenants_by_days[retention.get(tenant.id, SOFT_DELETE_GRACE_DAYS)].append(tenant.id)
+    
+    schema_mode = hasattr(connection, 'set_schema')
+    tenant_apps = tenant_app_labels()
+    purge_models = get_soft_delete_models()
+    schema_models = [m for m in purge_models if schema_mode and m._meta.app_label in tenant_apps]
+    shared_models = [m for m in purge_models if m not in schema_models]
+    
+    # Retomada: {'model': label, 'tenant': id ou None (modelos compartilhados)}
+    cursor = cache.get(SOFT_DELETE_PURGE_CURSOR_KEY)
+    if cursor is not None and cursor['tenant'] is not None:
+        shared_models = []
+        start = next((index for index, tenant in enumerate(tenants) if tenant.id >= cursor['tenant']), len(tenants))
+        tenants = tenants[start:]
+    
+    def resume_models(models_list, tenant_id=None):
+        if cursor is None or cursor['tenant'] != tenant_id:
+            return models_list
+        labels = [model._meta.label for model in models_list]
+        if cursor['model'] not in labels:
+            return models_list
+        return models_list[labels.index(cursor['model']):]
+    
+    purged = defaultdict(int)
+    complete = True
+    
+    def purge(model, queryset, model_cutoff, tenant_id=None):
+        nonlocal complete
+        count, done = purge_queryset(model, queryset, model_cutoff, deadline)
+        purged[model._meta.label] += count
+        if not done:
+            complete = False
+            cache.set(SOFT_DELETE_PURGE_CURSOR_KEY, {'model': model._meta.label, 'tenant': tenant_id}, None)
+        return done
+    
+    for model in resume_models(shared_models):
+        if any(field.name == 'tenant' for field in model._meta.concrete_fields):
+            querysets = [
+                (_expired(model, cutoff(days)).filter(tenant_id__in=tenant_ids), cutoff(days))
+                for days, tenant_ids in tenants_by_days.items()
+            ]
+        else:
+            querysets = [(_expired(model, cutoff(SOFT_DELETE_GRACE_DAYS)), cutoff(SOFT_DELETE_GRACE_DAYS))]
+        
+        if not all(purge(model, queryset, model_cutoff) for queryset, model_cutoff in querysets):
+            break
+    
+    for tenant in tenants:
+        if not complete or not schema_models:
+            break
+        if time.monotonic() >= deadline:
+            complete = False
+            cache.set(SOFT_DELETE_PURGE_CURSOR_KEY, {'model': None, 'tenant': tenant.id}, None)
+            break
+        tenant_cutoff = cutoff(retention.get(tenant.id, SOFT_DELETE_GRACE_DAYS))
+        with tenant_schema(tenant):
+            for model in resume_models(schema_models, tenant.id):
+                if not purge(model, _expired(model, tenant_cutoff), tenant_cutoff, tenant.id):
+                    break
+    
+    if complete:
+        cache.delete(SOFT_DELETE_PURGE_CURSOR_KEY)
+    
+    total = sum(purged.values())
+    logger.info(
+        f"Soft-deleted purge: {total} rows in {time.monotonic() - started:.1f}s"
+        + ('' if complete else ' (time budget reached, will resume on next run)')
+    )
+    return {'purged': dict(purged), 'complete': complete}
@@ -0,0 +1,21 @@
+# tests/conftest.py
+import os
+
+import django
+from django.conf import settings
+
+
+def pytest_configure():
+    """
+    Configuração mínima para os testes unitários (lógica pura, sem banco)
+    quando nenhum DJANGO_SETTINGS_MODULE foi informado
+    """
+    if settings.configured or os.environ.get('DJANGO_SETTINGS_MODULE'):
+        return
+    settings.configure(
+        USE_TZ=True,
+        TIME_ZONE='America/Sao_Paulo',
+        INSTALLED_APPS=[],
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    )
+    django.setup()
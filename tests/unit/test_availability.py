@@ -0,0 +1,55 @@
+# tests/unit/test_availability.py
+from datetime import datetime, timedelta, timezone
+
+from apps.scheduling.services import split_slots, subtract_intervals
+
+
+def at(hour, minute=0):
+    return datetime(2026, 3, 2, hour, minute, tzinfo=timezone.utc)
+
+
+class TestSubtractIntervals:
+    
+    def test_without_busy_returns_free(self):
+        assert subtract_intervals([(at(8), at(12))], []) == [(at(8), at(12))]
+    
+    def test_busy_inside_splits_window(self):
+        free = subtract_intervals([(at(8), at(12))], [(at(9), at(10))])
+        assert free == [(at(8), at(9)), (at(10), at(12))]
+    
+    def test_overlapping_busy_intervals_are_merged(self):
+        busy = [(at(9), at(10, 30)), (at(10), at(11)), (at(10, 15), at(10, 45))]
+        free = subtract_intervals([(at(8), at(12))], busy)
+        assert free == [(at(8), at(9)), (at(11), at(12))]
+    
+    def test_adjacent_busy_intervals_leave_no_gap(self):
+        busy = [(at(9), at(10)), (at(10), at(11))]
+        free = subtract_intervals([(at(8), at(12))], busy)
+        assert free == [(at(8), at(9)), (at(11), at(12))]
+    
+    def test_busy_touching_window_edges(self):
+        busy = [(at(7), at(8)), (at(12), at(13))]
+        assert subtract_intervals([(at(8), at(12))], busy) == [(at(8), at(12))]
+    
+    def test_busy_covering_whole_window(self):
+        assert subtract_intervals([(at(8), at(12))], [(at(7), at(13))]) == []
+    
+    def test_busy_spanning_several_windows(self):
+        free = [(at(8), at(10)), (at(11), at(13)), (at(14), at(16))]
+        busy = [(at(9), at(15))]
+        assert subtract_intervals(free, busy) == [(at(8), at(9)), (at(15), at(16))]
+    
+    def test_busy_between_windows_is_ignored(self):
+        free = [(at(8), at(10)), (at(14), at(16))]
+        assert subtract_intervals(free, [(at(11), at(13))]) == free
+
+
+class TestSplitSlots:
+    
+    def test_splits_in_consecutive_slots(self):
+        slots = split_slots([(at(8), at(10))], timedelta(minutes=50))
+        assert slots == [(at(8), at(8, 50)), (at(8, 50), at(9, 40))]
+    
+    def test_not_before_moves_first_slot(self):
+        slots = split_slots([(at(8), at(10))], timedelta(hours=1), not_before=at(8, 30))
+        assert slots == [(at(8, 30), at(9, 30))]
@@ -0,0 +1,119 @@
+# tests/unit/test_conflicts.py
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+import uuid
+
+from apps.scheduling.recurrence import Occurrence
+from apps.scheduling.services import (
+    _overlapping_pairs, match_booked_conflicts, match_virtual_conflicts, room_slot_key, therapist_slot_key,
+)
+
+TENANT = uuid.uuid4()
+
+
+def at(hour, minute=0):
+    return datetime(2026, 3, 2, hour, minute, tzinfo=timezone.utc)
+
+
+def proposal(therapist, start, end, room='', plan=None, occurrence_date=None, tenant=TENANT):
+    return SimpleNamespace(
+        pk=uuid.uuid4(), tenant_id=tenant, therapist_id=therapist, room=room,
+        start_time=start, end_time=end, treatment_plan_id=plan, occurrence_date=occurrence_date,
+    )
+
+
+def therapist_key(item):
+    return item.therapist_id
+
+
+class TestOverlappingPairs:
+    
+    def test_overlap_in_batch(self):
+        items = [(0, proposal(1, at(9), at(10))), (1, proposal(1, at(9, 30), at(10, 30)))]
+        assert _overlapping_pairs(items, therapist_key) == [(0, 1)]
+    
+    def test_adjacent_sessions_do_not_overlap(self):
+        items = [(0, proposal(1, at(9), at(10))), (1, proposal(1, at(10), at(11)))]
+        assert _overlapping_pairs(items, therapist_key) == []
+    
+    def test_different_therapists_do_not_conflict(self):
+        items = [(0, proposal(1, at(9), at(10))), (1, proposal(2, at(9), at(10)))]
+        assert _overlapping_pairs(items, therapist_key) == []
+    
+    def test_long_session_overlaps_every_later_one(self):
+        items = [
+            (0, proposal(1, at(8), at(12))),
+            (1, proposal(1, at(9), at(10))),
+            (2, proposal(1, at(10), at(11))),
+        ]
+        assert sorted(_overlapping_pairs(items, therapist_key)) == [(0, 1), (0, 2)]
+    
+    def test_empty_key_is_ignored(self):
+        items = [(0, proposal(1, at(9), at(10))), (1, proposal(2, at(9), at(10)))]
+        assert _overlapping_pairs(items, room_slot_key) == []
+    
+    def test_same_room_in_another_tenant_does_not_conflict(self):
+        items = [
+            (0, proposal(1, at(9), at(10), room='Sala 1')),
+            (1, proposal(2, at(9), at(10), room='Sala 1', tenant=uuid.uuid4())),
+        ]
+        assert _overlapping_pairs(items, room_slot_key) == []
+    
+    def test_same_room_in_same_tenant_conflicts(self):
+        items = [(0, proposal(1, at(9), at(10), room='Sala 1')), (1, proposal(2, at(9), at(10), room='Sala 1'))]
+        assert _overlapping_pairs(items, room_slot_key) == [(0, 1)]
+    
+    def test_therapist_key_is_scoped_by_tenant(self):
+        items = [(0, proposal(1, at(9), at(10))), (1, proposal(1, at(9), at(10), tenant=uuid.uuid4()))]
+        assert _overlapping_pairs(items, therapist_slot_key) == []
+
+
+class TestMatchBookedConflicts:
+    
+    def row(self, therapist, start, end, room=''):
+        return (uuid.uuid4(), TENANT, therapist, room, start, end)
+    
+    def test_therapist_overlap(self):
+        booked = self.row(1, at(9), at(10))
+        conflicts = match_booked_conflicts([(0, proposal(1, at(9, 30), at(10, 30)))], [booked])
+        assert conflicts == [{'index': 0, 'reason': 'therapist', 'appointment': booked[0]}]
+    
+    def test_adjacent_booking_is_free(self):
+        rows = [self.row(1, at(9), at(10)), self.row(1, at(11), at(12))]
+        assert match_booked_conflicts([(0, proposal(1, at(10), at(11)))], rows) == []
+    
+    def test_room_overlap_with_other_therapist(self):
+        booked = self.row(2, at(9), at(10), room='Sala 1')
+        conflicts = match_booked_conflicts([(0, proposal(1, at(9), at(10), room='Sala 1'))], [booked])
+        assert conflicts == [{'index': 0, 'reason': 'room', 'appointment': booked[0]}]
+    
+    def test_other_tenant_is_ignored(self):
+        row = (uuid.uuid4(), uuid.uuid4(), 1, '', at(9), at(10))
+        assert match_booked_conflicts([(0, proposal(1, at(9), at(10)))], [row]) == []
+
+
+class TestMatchVirtualConflicts:
+    
+    def occurrence(self, therapist, start, end, plan=10, day=date(2026, 3, 2)):
+        return Occurrence(plan, 100, therapist, day, start, end)
+    
+    def test_overlap_with_virtual_session(self):
+        occurrence = self.occurrence(1, at(9), at(10))
+        conflicts = match_virtual_conflicts([(0, proposal(1, at(9, 30), at(10, 30)))], [occurrence])
+        assert conflicts == [{
+            'index': 0, 'reason': 'recurrence',
+            'treatment_plan': 10, 'occurrence_date': date(2026, 3, 2),
+        }]
+    
+    def test_adjacent_virtual_session_is_free(self):
+        occurrence = self.occurrence(1, at(9), at(10))
+        assert match_virtual_conflicts([(0, proposal(1, at(10), at(11)))], [occurrence]) == []
+    
+    def test_session_replaced_by_the_appointment_is_ignored(self):
+        occurrence = self.occurrence(1, at(9), at(10))
+        moved = proposal(1, at(9, 30), at(10, 30), plan=10, occurrence_date=date(2026, 3, 2))
+        assert match_virtual_conflicts([(0, moved)], [occurrence]) == []
+    
+    def test_other_therapist_is_ignored(self):
+        occurrence = self.occurrence(2, at(9), at(10))
+        assert match_virtual_conflicts([(0, proposal(1, at(9), at(10)))], [occurrence]) == []
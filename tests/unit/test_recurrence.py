@@ -0,0 +1,90 @@
+# tests/unit/test_recurrence.py
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+from apps.scheduling.recurrence import rule_dates, rule_weekdays, session_bounds
+
+NEW_YORK = ZoneInfo('America/New_York')
+
+
+def plan(start_date, end_date=None, sessions_per_week=1, session_duration=50):
+    return SimpleNamespace(
+        start_date=start_date, end_date=end_date or start_date + timedelta(weeks=8),
+        sessions_per_week=sessions_per_week, session_duration=session_duration,
+    )
+
+
+def rule(weekdays=(), interval_weeks=1, start_time=time(10)):
+    return SimpleNamespace(weekdays=list(weekdays), interval_weeks=interval_weeks, start_time=start_time)
+
+
+class TestRuleWeekdays:
+    
+    def test_explicit_weekdays(self):
+        assert rule_weekdays(rule([1, 3]), plan(date(2026, 3, 2))) == {1, 3}
+    
+    def test_sessions_spread_from_start_weekday(self):
+        # 2026-03-02 é segunda-feira
+        assert rule_weekdays(rule(), plan(date(2026, 3, 2), sessions_per_week=3)) == {0, 2, 4}
+    
+    def test_spread_wraps_around_the_week(self):
+        # 2026-03-06 é sexta-feira
+        assert rule_weekdays(rule(), plan(date(2026, 3, 6), sessions_per_week=2)) == {4, 0}
+    
+    def test_sessions_per_week_is_clamped(self):
+        assert rule_weekdays(rule(), plan(date(2026, 3, 2), sessions_per_week=9)) == set(range(7))
+
+
+class TestRuleDates:
+    
+    def test_weekly(self):
+        dates = list(rule_dates(rule([0]), plan(date(2026, 3, 2)), date(2026, 3, 1), date(2026, 3, 22)))
+        assert dates == [date(2026, 3, 2), date(2026, 3, 9), date(2026, 3, 16)]
+    
+    def test_every_other_week(self):
+        dates = list(rule_dates(
+            rule([0, 3], interval_weeks=2), plan(date(2026, 3, 2)), date(2026, 3, 1), date(2026, 3, 29)
+        ))
+        assert dates == [date(2026, 3, 2), date(2026, 3, 5), date(2026, 3, 16), date(2026, 3, 19)]
+    
+    def test_interval_anchored_on_week_of_plan_start(self):
+        # Plano começa na quarta: a segunda da semana inicial já passou
+        dates = list(rule_dates(
+            rule([0, 3], interval_weeks=2), plan(date(2026, 3, 4)), date(2026, 3, 1), date(2026, 3, 29)
+        ))
+        assert dates == [date(2026, 3, 5), date(2026, 3, 16), date(2026, 3, 19)]
+    
+    def test_window_inside_interval(self):
+        dates = list(rule_dates(
+            rule([0], interval_weeks=3), plan(date(2026, 3, 2)), date(2026, 3, 10), date(2026, 4, 30)
+        ))
+        assert dates == [date(2026, 3, 23), date(2026, 4, 13)]
+    
+    def test_clipped_to_plan_period(self):
+        dates = list(rule_dates(
+            rule([0]), plan(date(2026, 3, 2), end_date=date(2026, 3, 10)), date(2026, 2, 1), date(2026, 4, 30)
+        ))
+        assert dates == [date(2026, 3, 2), date(2026, 3, 9)]
+
+
+class TestSessionBounds:
+    
+    def test_local_time_kept_across_dst_start(self):
+        # Horário de verão em Nova York começa em 2026-03-08
+        before = session_bounds(rule(), plan(date(2026, 3, 2)), date(2026, 3, 6), NEW_YORK)
+        after = session_bounds(rule(), plan(date(2026, 3, 2)), date(2026, 3, 9), NEW_YORK)
+        assert before[0].astimezone(ZoneInfo('UTC')).hour == 15
+        assert after[0].astimezone(ZoneInfo('UTC')).hour == 14
+    
+    def test_duration_is_absolute_on_dst_day(self):
+        start, end = session_bounds(
+            rule(start_time=time(1, 30)), plan(date(2026, 3, 2), session_duration=60), date(2026, 3, 8), NEW_YORK
+        )
+        assert end - start == timedelta(minutes=60)
+        assert end.timestamp() - start.timestamp() == 60 * 60
+    
+    def test_uses_given_timezone(self):
+        start, end = session_bounds(rule(), plan(date(2026, 3, 2)), date(2026, 3, 2), ZoneInfo('America/Sao_Paulo'))
+        assert start == datetime(2026, 3, 2, 13, tzinfo=ZoneInfo('UTC'))
+        assert end == datetime(2026, 3, 2, 13, 50, tzinfo=ZoneInfo('UTC'))
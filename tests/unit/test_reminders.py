@@ -0,0 +1,127 @@
+# tests/unit/test_reminders.py
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+from apps.scheduling.tasks import (
+    REMINDER_BUCKET_SECONDS, REMINDER_MAX_ATTEMPTS, reminder_bucket, reminder_change, reminder_retry_bucket,
+)
+
+NEW_YORK = ZoneInfo('America/New_York')
+NOW = datetime(2026, 3, 2, 12, tzinfo=timezone.utc)
+
+
+class TestReminderBucket:
+    
+    def test_aligned_to_bucket_width(self):
+        bucket = reminder_bucket(datetime(2026, 3, 2, 12, 7, 31, 500, tzinfo=timezone.utc))
+        assert bucket == datetime(2026, 3, 2, 12, 5, tzinfo=timezone.utc)
+        assert int(bucket.timestamp()) % REMINDER_BUCKET_SECONDS == 0
+    
+    def test_bucket_start_is_its_own_bucket(self):
+        moment = datetime(2026, 3, 2, 12, 5, tzinfo=timezone.utc)
+        assert reminder_bucket(moment) == moment
+    
+    def test_keeps_timezone(self):
+        bucket = reminder_bucket(datetime(2026, 3, 2, 9, 7, tzinfo=NEW_YORK))
+        assert bucket.tzinfo is NEW_YORK
+        assert bucket == datetime(2026, 3, 2, 9, 5, tzinfo=NEW_YORK)
+    
+    def test_dst_start(self):
+        # 2026-03-08: 02:00 EST pula para 03:00 EDT
+        moment = datetime(2026, 3, 8, 3, 2, tzinfo=NEW_YORK)
+        bucket = reminder_bucket(moment)
+        assert bucket == datetime(2026, 3, 8, 3, 0, tzinfo=NEW_YORK)
+        assert moment - bucket == timedelta(minutes=2)
+    
+    def test_repeated_hour_at_dst_end(self):
+        # 2026-11-01: 01:00-02:00 acontece duas vezes; fold=1 é a segunda (EST)
+        moment = datetime(2026, 11, 1, 1, 32, fold=1, tzinfo=NEW_YORK)
+        bucket = reminder_bucket(moment)
+        assert moment.timestamp() - bucket.timestamp() == 2 * 60
+        assert bucket.utcoffset() == timedelta(hours=-5)
+
+
+def appointment(start_time):
+    return SimpleNamespace(start_time=start_time)
+
+
+def reminder(send_at, appointment_start, sent_at=None, failed_at=None, send_attempts=0):
+    return SimpleNamespace(
+        send_at=send_at, appointment_start=appointment_start, sent_at=sent_at,
+        failed_at=failed_at, send_attempts=send_attempts,
+    )
+
+
+class TestReminderChange:
+    start = NOW + timedelta(days=2)
+    send_at = NOW + timedelta(days=1)
+    
+    def test_new_appointment_gets_reminder(self):
+        assert reminder_change(appointment(self.start), None, self.send_at, NOW) == 'upsert'
+    
+    def test_unchanged_appointment_keeps_reminder(self):
+        existing = reminder(self.send_at, self.start)
+        assert reminder_change(appointment(self.start), existing, self.send_at, NOW) is None
+    
+    def test_sent_reminder_is_not_resent(self):
+        existing = reminder(self.send_at, self.start, sent_at=NOW)
+        assert reminder_change(appointment(self.start), existing, self.send_at, NOW) is None
+    
+    def test_reschedule_replaces_pending_reminder(self):
+        existing = reminder(self.send_at, self.start)
+        moved = self.start + timedelta(hours=3)
+        assert reminder_change(appointment(moved), existing, self.send_at + timedelta(hours=3), NOW) == 'upsert'
+    
+    def test_reschedule_requeues_sent_reminder(self):
+        existing = reminder(self.send_at, self.start, sent_at=NOW)
+        moved = self.start + timedelta(days=1)
+        assert reminder_change(appointment(moved), existing, self.send_at + timedelta(days=1), NOW) == 'upsert'
+    
+    def test_new_send_time_for_same_session(self):
+        # reminder_hours_before do tenant mudou
+        existing = reminder(self.send_at, self.start)
+        assert reminder_change(appointment(self.start), existing, self.send_at - timedelta(hours=1), NOW) == 'upsert'
+    
+    def test_due_reminder_is_not_moved(self):
+        existing = reminder(NOW - timedelta(minutes=1), self.start)
+        assert reminder_change(appointment(self.start), existing, self.send_at, NOW) is None
+    
+    def test_given_up_reminder_is_not_refiled(self):
+        existing = reminder(self.send_at, self.start, failed_at=NOW)
+        assert reminder_change(appointment(self.start), existing, self.send_at + timedelta(hours=1), NOW) is None
+    
+    def test_moved_session_refiles_given_up_reminder(self):
+        existing = reminder(self.send_at, self.start, failed_at=NOW)
+        moved = self.start + timedelta(days=1)
+        assert reminder_change(appointment(moved), existing, self.send_at + timedelta(days=1), NOW) == 'upsert'
+    
+    def test_cancel_drops_pending_reminder(self):
+        existing = reminder(self.send_at, self.start)
+        assert reminder_change(appointment(self.start), existing, None, NOW) == 'drop'
+    
+    def test_cancel_keeps_sent_reminder(self):
+        existing = reminder(self.send_at, self.start, sent_at=NOW)
+        assert reminder_change(appointment(self.start), existing, None, NOW) is None
+    
+    def test_cancel_without_reminder(self):
+        assert reminder_change(appointment(self.start), None, None, NOW) is None
+
+
+class TestReminderRetryBucket:
+    
+    def test_first_failure_retries_next_bucket(self):
+        failed = reminder(NOW, NOW + timedelta(days=1), send_attempts=1)
+        assert reminder_retry_bucket(failed, NOW) == NOW + timedelta(seconds=REMINDER_BUCKET_SECONDS)
+    
+    def test_backoff_grows_with_attempts(self):
+        failed = reminder(NOW, NOW + timedelta(days=1), send_attempts=2)
+        assert reminder_retry_bucket(failed, NOW) == NOW + timedelta(seconds=2 * REMINDER_BUCKET_SECONDS)
+    
+    def test_gives_up_after_max_attempts(self):
+        failed = reminder(NOW, NOW + timedelta(days=1), send_attempts=REMINDER_MAX_ATTEMPTS)
+        assert reminder_retry_bucket(failed, NOW) is None
+    
+    def test_gives_up_when_session_starts_before_retry(self):
+        failed = reminder(NOW, NOW + timedelta(seconds=REMINDER_BUCKET_SECONDS), send_attempts=1)
+        assert reminder_retry_bucket(failed, NOW) is None
@@ -0,0 +1,111 @@
+# tests/unit/test_sms.py
+import time
+import uuid
+from collections import defaultdict
+
+import pytest
+
+from shared.services import sms
+from shared.services.sms import (
+    FakeSMSProvider, SMSMessage, SMSPermanentError, SMSSender, SMSTemporaryError, TokenBucket,
+)
+
+
+class FlakyProvider(FakeSMSProvider):
+    """Falha (transitória) as `failures` primeiras tentativas de cada mensagem"""
+    
+    def __init__(self, failures, error=SMSTemporaryError, **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.failures = failures
+        self.error = error
+        self.attempts = defaultdict(int)
+    
+    async def send(self, message):
+        self.attempts[message.reference] += 1
+        if self.attempts[message.reference] <= self.failures:
+            raise self.error('simulated failure')
+        return await super().send(message)
+
+
+def messages(count, tenant_id=None):
+    tenant_id = tenant_id or uuid.uuid4().hex
+    return [SMSMessage(tenant_id, f'+55119{index:08d}', 'Lembrete', reference=index) for index in range(count)]
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(sms, 'SMS_BACKOFF_BASE', 0.001)
+
+
+class TestRateLimit:
+    
+    def test_delivers_every_message(self):
+        provider = FakeSMSProvider(latency=0)
+        results = SMSSender(provider, tenant_rate=1000, tenant_burst=100).send(messages(30))
+        assert len(results) == 30
+        assert all(result.ok and result.attempts == 1 for result in results)
+        assert len(provider.sent) == 30
+    
+    def test_burst_then_waits_for_next_window(self):
+        # Janela de 0,25s com 5 envios: 15 mensagens ocupam três janelas
+        sender = SMSSender(FakeSMSProvider(latency=0), tenant_rate=20, tenant_burst=5)
+        started = time.monotonic()
+        results = sender.send(messages(15))
+        assert len(results) == 15
+        assert time.monotonic() - started >= 0.25
+    
+    def test_tenants_have_separate_quotas(self):
+        sender = SMSSender(FakeSMSProvider(latency=0), tenant_rate=1, tenant_burst=5)
+        started = time.monotonic()
+        results = sender.send(messages(5) + messages(5))
+        assert all(result.ok for result in results)
+        assert time.monotonic() - started < 1
+    
+    def test_only_one_waiting_worker_polls_the_bucket(self, monkeypatch):
+        calls = []
+        take = TokenBucket._take
+        
+        def counting_take(bucket):
+            calls.append(bucket.key)
+            return take(bucket)
+        
+        monkeypatch.setattr(TokenBucket, '_take', counting_take)
+        SMSSender(FakeSMSProvider(latency=0), tenant_rate=50, tenant_burst=5).send(messages(15))
+        # Um consumo por mensagem mais uma espera por troca de janela
+        assert len(calls) <= 15 + 3
+
+
+class TestRetry:
+    
+    def test_temporary_failures_are_retried(self, fast_backoff):
+        provider = FlakyProvider(failures=2)
+        results = SMSSender(provider, tenant_rate=1000, tenant_burst=100, max_retries=3).send(messages(10))
+        assert all(result.ok and result.attempts == 3 for result in results)
+        assert len(provider.sent) == 10
+    
+    def test_gives_up_after_max_retries(self, fast_backoff):
+        provider = FlakyProvider(failures=10)
+        results = SMSSender(provider, tenant_rate=1000, tenant_burst=100, max_retries=2).send(messages(4))
+        assert all(not result.ok and result.attempts == 3 for result in results)
+        assert provider.sent == []
+    
+    def test_permanent_failure_is_not_retried(self, fast_backoff):
+        provider = FlakyProvider(failures=1, error=SMSPermanentError)
+        results = SMSSender(provider, tenant_rate=1000, tenant_burst=100, max_retries=3).send(messages(4))
+        assert all(not result.ok and result.attempts == 1 for result in results)
+        assert all(attempts == 1 for attempts in provider.attempts.values())
+    
+    def test_backoff_grows_between_attempts(self, monkeypatch):
+        monkeypatch.setattr(sms, 'SMS_BACKOFF_BASE', 0.05)
+        monkeypatch.setattr(sms.random, 'uniform', lambda low, high: 1)
+        started = time.monotonic()
+        results = SMSSender(FlakyProvider(failures=2), tenant_rate=1000, tenant_burst=100).send(messages(1))
+        # 0,05s + 0,1s de espera antes da terceira tentativa
+        assert results[0].ok and results[0].attempts == 3
+        assert time.monotonic() - started >= 0.15
+    
+    def test_reports_in_batches(self):
+        reports = []
+        sender = SMSSender(FakeSMSProvider(latency=0), tenant_rate=1000, tenant_burst=100, report_batch_size=4)
+        sender.send(messages(10), on_report=lambda batch: reports.append(len(batch)))
+        assert reports == [4, 4, 2]